@@ -1,12 +1,36 @@
+import hashlib
+import io
+
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import pycountry
 import streamlit as st
 from streamlit_extras.metric_cards import style_metric_cards
 
+from utils.cache import cached_snapshot, data_version, load_snapshot, save_snapshot, snapshot_key
+from utils.chart_data import SAMPLE_POINTS, box_stats, histogram_bins, sample_points
+from utils.compact import join_list_fields, read_compact_csv
 from utils.data_quality_checks import run_quality_checks
-from utils.scoring import calculate_quality_score
-from utils.utils import (check_for_timestamp, fetch_data_from_db,
-                         format_dataframe, get_display_name, iso2_to_iso3)
+from utils.db_quality import (fetch_quality_rollup, fetch_quality_scores,
+                              iter_quality_scores, refresh_volatile_checks)
+from utils.explorer import FramePager, ViewPager, page_keys
+from utils.export import EXPORT_FORMATS, ReportFile, cached_report, filter_report, iter_frame_chunks
+from utils.history import record_history, score_trend
+from utils.incremental import run_incremental_checks
+from utils.near_duplicates import PAIR_COLUMNS, fetch_near_duplicates, near_duplicate_pairs
+from utils.parallel import PARALLEL_WORKERS, run_parallel_checks
+from utils.rollup import build_rollup, country_rollup, score_distribution, score_summary
+from utils.rules import result_columns
+from utils.scoring import LABEL_BINS, LABELS, calculate_quality_score
+from utils.search import cached_search_index, display_names
+from utils.streaming import STREAM_MIN_BYTES, read_csv_row, stream_csv_snapshot
+from utils.tracing import recording, span, tracing_enabled
+from utils.utils import (dashboard_columns, fetch_data_from_db, fetch_record,
+                         format_column, format_dataframe)
+
+REGISTRATION_STATUSES = ["ISSUED", "LAPSED", "PENDING_TRANSFER", "PENDING_ARCHIVAL",
+                         "RETIRED", "DUPLICATE", "ANNULLED", "MERGED", "CANCELLED"]
 
 st.set_page_config(
     page_title="LEI Data Quality Analyzer",
@@ -14,6 +38,9 @@ st.set_page_config(
     page_icon="🔍"
 )
 
+# Every stage of this run is timed into one recording, shown in the Performance panel
+run = recording("dashboard run").start()
+
 # Custom CSS for styling
 st.markdown("""
 <style>
@@ -94,35 +121,140 @@ source_option = st.radio("Select data source:",
                          horizontal=True)
 
 df = None
+incremental = st.toggle("Incremental re-scoring",
+                        help="Only re-run the checks of records that changed since the last run")
+workers = st.number_input("Worker processes", min_value=1, max_value=max(PARALLEL_WORKERS, 1),
+                          value=1, disabled=incremental,
+                          help="Evaluate the checks over shards of the data in parallel processes")
+score_in_db = False
+score_range = (0, 100)
+countries = []
+list_table = None
+# Scoring runs are recorded in the history of their dataset, whose daily aggregates feed the
+# trend charts: the database table, or each uploaded file by its content
+history_name = "test"
+# Runs over every record of the dataset retire the LEIs it no longer holds from the history
+complete_run = True
+
+
+def score_frame(df):
+    """Run the checks in the selected mode, score the records and record the run's history."""
+    if incremental:
+        df = run_incremental_checks(df)
+    elif workers > 1:
+        df = run_parallel_checks(df, workers)
+    else:
+        df = run_quality_checks(df)
+    return record_history(calculate_quality_score(df), history_name, complete=complete_run)
+
+
+def label_help(label):
+    """Score range of `label`, from the configured bins (each bin includes its upper edge)."""
+    i = LABELS.index(label)
+    return f"Records with {max(LABEL_BINS[i] + 1, 0)}-{LABEL_BINS[i + 1]}% quality score"
 
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_search_index(key, _df):
+    """Search index of snapshot `key`, shared by every session of this process."""
+    return cached_search_index(key, _df)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_frame_pager(key, score_range, _df):
+    """Data Explorer pager over snapshot `key`, sorted once per process."""
+    return FramePager(_df)
+
+
+# Scored frames are cached on disk per data version and rule set, so reruns skip the analysis
 if source_option == "Upload CSV":
     uploaded_file = st.file_uploader("Upload LEI CSV File", type=["csv"])
+    stream_upload = st.toggle("Stream upload in chunks",
+                              value=uploaded_file is not None and uploaded_file.size >= STREAM_MIN_BYTES,
+                              help="Read only the columns the dashboard needs, chunk by chunk, "
+                                   "so large files are analyzed in constant memory. Record details "
+                                   "are then read back from the file")
     if uploaded_file:
-        df = pd.read_csv(uploaded_file)
+        content = uploaded_file.getvalue()
+        digest = hashlib.sha1(content).hexdigest()
+        history_name = f"upload-{digest}"
+        key = snapshot_key(source="csv", digest=digest, streamed=stream_upload)
+        if stream_upload:
+            df = load_snapshot(key)
+            if df is None:
+                progress = st.progress(0.0, text="Analyzing data quality...")
+                cube = stream_csv_snapshot(io.BytesIO(content), key, progress=progress.progress)
+                # The cube of the unfiltered records, as the analysis below looks it up
+                save_snapshot(f"{key}.rollup.0-100", cube)
+                progress.empty()
+                df = record_history(load_snapshot(key), history_name, complete=True)
+        with st.spinner("Analyzing data quality..."):
+            if not stream_upload:
+                # Every column, compacted as it is read; list fields are kept in a side table
+                df, list_table = load_snapshot(key), load_snapshot(f"{key}.lists")
+                if df is None or list_table is None:
+                    df, list_table = read_compact_csv(io.BytesIO(content), keep=dashboard_columns())
+                    df = score_frame(df)
+                    save_snapshot(key, df)
+                    save_snapshot(f"{key}.lists", list_table)
+            search_index = get_search_index(key, df)
         
 elif source_option == "Fetch from Database":
+    with st.expander("Filters"):
+        countries = st.multiselect("Legal address country",
+                                   sorted(c.alpha_2 for c in pycountry.countries))
+        statuses = st.multiselect("Registration status", REGISTRATION_STATUSES)
+        score_range = st.slider("Quality score", 0, 100, (0, 100))
+    score_in_db = st.toggle("Score in database",
+                            help="Read checks and scores from the materialized quality view, "
+                                 "refreshed after each load")
+    complete_run = not countries and not statuses and (not score_in_db or score_range == (0, 100))
+
+    if score_in_db:
+        # Expiry in the view is as of its last refresh: recompute it once a day
+        refresh_volatile_checks()
     # if st.button("Fetch Data", type="primary"):
+    key = snapshot_key(source="db", version=data_version(), countries=sorted(countries),
+                       statuses=sorted(statuses), score_in_db=score_in_db,
+                       score_range=score_range if score_in_db else None)
     with st.spinner("Fetching data from database..."):
-        df = fetch_data_from_db()
-        df = check_for_timestamp(df)
+        if score_in_db:
+            df = cached_snapshot(key, lambda: record_history(fetch_quality_scores(
+                countries=countries, statuses=statuses, score_range=score_range), history_name,
+                complete=complete_run))
+        else:
+            df = cached_snapshot(key, lambda: score_frame(fetch_data_from_db(
+                columns=dashboard_columns(), countries=countries, statuses=statuses)))
+        search_index = get_search_index(key, df)
 
 if df is not None:
     with st.spinner("Analyzing data quality..."):
-        df = run_quality_checks(df)
-        df = calculate_quality_score(df)
-        df = format_dataframe(df)
+        if not score_in_db:
+            scored_frame = df
+            df = df[df["QualityScore"].between(*score_range)]
+            explorer_pager = get_frame_pager(key, score_range, df)
+            report_frame = df
+            cube = cached_snapshot(f"{key}.rollup.{score_range[0]}-{score_range[1]}",
+                                   lambda: build_rollup(report_frame))
+        else:
+            explorer_pager = ViewPager(countries=countries, statuses=statuses,
+                                       score_range=score_range)
+            report_frame = None
+            cube = cached_snapshot(f"{key}.rollup", lambda: fetch_quality_rollup(
+                countries=countries, statuses=statuses, score_range=score_range))
+        # Columns keep their flattened names; display names are applied when rendering
         
         # Store in session state
         st.session_state.df = df
-        st.session_state.score_counts = df["QualityLabel"].value_counts().reindex(
-            ["Good", "Moderate", "Poor"], fill_value=0
+        # Metrics and charts are answered from the rollup cube, computed once per snapshot
+        summary = score_summary(cube)
+        st.session_state.score_counts = pd.Series(
+            {label: summary[label] for label in ["Good", "Moderate", "Poor"]}
         )
-        
-        # Additional metrics for new visualizations
-        st.session_state.avg_score = df["QualityScore"].mean()
-        st.session_state.median_score = df["QualityScore"].median()
-        st.session_state.min_score = df["QualityScore"].min()
-        st.session_state.max_score = df["QualityScore"].max()
+        st.session_state.avg_score = summary["avg_score"]
+        st.session_state.median_score = summary["median_score"]
+        st.session_state.min_score = summary["min_score"]
+        st.session_state.max_score = summary["max_score"]
     
     # ====================== Enhanced Visualization Section ======================
     st.subheader("📊 Data Quality Metrics")
@@ -145,13 +277,13 @@ if df is not None:
     
     with col1:
         st.metric("Good", st.session_state.score_counts["Good"], 
-                 help="Records with 80-100% quality score")
+                 help=label_help("Good"))
     with col2:
         st.metric("Moderate", st.session_state.score_counts["Moderate"], 
-                 help="Records with 50-79% quality score")
+                 help=label_help("Moderate"))
     with col3:
         st.metric("Poor", st.session_state.score_counts["Poor"], 
-                 help="Records with 0-49% quality score")
+                 help=label_help("Poor"))
     
     # Apply custom styling to metric cards
     style_metric_cards(background_color="#FFFFFF", border_left_color="#2c3e50")
@@ -159,20 +291,12 @@ if df is not None:
     # Visualization tabs
     tab1, tab2, tab3 = st.tabs(["Geospatial", "Distribution", "Score Analysis"])
  
-    with tab1:  # Geospatial tab (if location data exists)
-        country = 'Legal Address → Country'
-        if country in df.columns:
+    with tab1, span("render.geospatial"):  # Geospatial tab (if location data exists)
+        country_data = country_rollup(cube).rename(
+            columns={"records": "Count", "avg_score": "QualityScore", "iso3": "Country"})
+        if len(country_data):
             st.subheader("Geospatial Analysis")
             
-            country_counts = df[country].value_counts().reset_index()
-            country_counts.columns = [country, 'Count']
-            
-            # Country quality scores
-            country_quality = df.groupby(country)['QualityScore'].mean().reset_index()
-            country_data = country_counts.merge(country_quality, on=country)
-            country_data.rename(columns = {country: 'country'}, inplace=True)
-            country_data["Country"] = country_data["country"].apply(iso2_to_iso3)
-            
             fig = px.choropleth(
                 country_data,
                 locations='Country',
@@ -189,7 +313,7 @@ if df is not None:
         else:
             st.info("No geographic data available for mapping.")
     
-    with tab2:  # Distribution tab
+    with tab2, span("render.distribution"):  # Distribution tab
         col1, col2 = st.columns(2)
         with col1:
             # Bar chart
@@ -227,92 +351,137 @@ if df is not None:
             )
             st.plotly_chart(fig, use_container_width=True)
     
-    with tab3:  # Score Analysis tab
+    with tab3, span("render.score_analysis"):  # Score Analysis tab
         col1, col2 = st.columns(2)
         with col1:
-            # Histogram
-            fig = px.histogram(
-                st.session_state.df, 
-                x="QualityScore",
-                nbins=20,
+            # Histogram, binned on the server from the score counts of the cube
+            bins = histogram_bins(score_distribution(cube))
+            fig = px.bar(
+                bins,
+                x=(bins["start"] + bins["end"]) / 2,
+                y="count",
                 color_discrete_sequence=["#3498db"],
                 height=400,
                 title="QualityScore Distribution"
             )
+            fig.update_traces(width=(bins["end"] - bins["start"]) * 0.9)
             fig.update_layout(
                 xaxis_title="QualityScore",
-                yaxis_title="Count",
-                bargap=0.1
+                yaxis_title="Count"
             )
             st.plotly_chart(fig, use_container_width=True)
             
         with col2:
-            # Box plot
-            fig = px.box(
-                st.session_state.df, 
-                y="QualityScore",
-                points="all",
+            # Box plot from precomputed statistics; only sampled outliers and points are sent
+            stats = box_stats(score_distribution(cube))
+            show_points = st.toggle("Show sampled points", value=False,
+                                    help=f"Overlay a random sample of up to {SAMPLE_POINTS} scores")
+            fig = go.Figure()
+            if stats is not None:
+                fig.add_trace(go.Box(
+                    name="QualityScore",
+                    q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+                    mean=[stats["mean"]], lowerfence=[stats["lowerfence"]],
+                    upperfence=[stats["upperfence"]],
+                    marker_color="#3498db"
+                ))
+                points = sample_points(st.session_state.df["QualityScore"]) if show_points else stats["outliers"]
+                fig.add_trace(go.Scatter(
+                    x=["QualityScore"] * len(points), y=points, mode="markers",
+                    marker=dict(color="#3498db", size=4, opacity=0.5)
+                ))
+            fig.update_layout(
                 height=400,
                 title="QualityScore Spread",
-                color_discrete_sequence=["#3498db"]
-            )
-            fig.update_layout(
                 yaxis_title="QualityScore",
                 showlegend=False
             )
             st.plotly_chart(fig, use_container_width=True)
-            
-            # Trend line (if time-based data exists)
-            if 'timestamp' in df.columns:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                time_df = df.set_index('timestamp').resample('D')['QualityScore'].mean().reset_index()
-                fig = px.line(
-                    time_df, 
-                    x='timestamp', 
-                    y='QualityScore',
-                    title="QualityScore Trend Over Time",
-                    markers=True
-                )
-                fig.update_layout(
-                    xaxis_title="Date",
-                    yaxis_title="Average QualityScore"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+
+        # Trends are read from the daily aggregates of the scoring history, a row per day and value
+        trend = score_trend(history_name)
+        if len(trend):
+            fig = px.line(
+                trend,
+                x="date",
+                y="avg_score",
+                title="QualityScore Trend Over Time",
+                markers=True
+            )
+            fig.update_layout(
+                xaxis_title="Date",
+                yaxis_title="Average QualityScore"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+            # The filtered countries, else the five with the most records on the last day
+            latest = score_trend(history_name, "country")
+            latest = latest[latest["date"] == latest["date"].max()]
+            trend_countries = countries or latest.nlargest(5, "records")["value"].dropna().tolist()
+            country_trend = score_trend(history_name, "country", trend_countries)
+            fig = px.line(
+                country_trend,
+                x="date",
+                y="avg_score",
+                color="value",
+                title="QualityScore Trend by Country",
+                markers=True
+            )
+            fig.update_layout(
+                xaxis_title="Date",
+                yaxis_title="Average QualityScore",
+                legend_title="Country"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.caption("The trend appears once the data has been scored.")
     
     # ====================== Data Explorer Section ======================
     st.subheader("🔍 Data Explorer")
     
-    # Create summary table
-    summary_df = df[["LEI", "QualityScore", "QualityLabel"]].copy()
-    
-    # Add row numbers
-    summary_df.insert(0, "#", range(1, len(summary_df) + 1))
-    
-    # Pagination settings
+    # Pages are read by (score, LEI) keyset from the quality view or the sorted snapshot
+    col1, col2, col3 = st.columns([2, 3, 3])
+    with col1:
+        descending = st.selectbox("Sort by score", ["Ascending", "Descending"]) == "Descending"
+    with col2:
+        explorer_labels = st.multiselect("Label", ["Good", "Moderate", "Poor"])
+    with col3:
+        explorer_countries = st.multiselect("Country", countries or sorted(c.alpha_2 for c in pycountry.countries))
     page_size = st.slider("Rows per page", 5, 50, 10)
-    total_pages = (len(summary_df) - 1) // page_size + 1
-    
-    if "page" not in st.session_state:
+
+    pager = explorer_pager.filter(countries=explorer_countries, labels=explorer_labels)
+    total_pages = max((pager.count() - 1) // page_size + 1, 1)
+
+    # Any change of order, filter, page size or data starts again from the first page
+    signature = (key, descending, tuple(explorer_labels), tuple(explorer_countries), page_size)
+    if st.session_state.get("explorer_signature") != signature:
+        st.session_state.explorer_signature = signature
         st.session_state.page = 0
+        st.session_state.page_cursor = {}
+        st.session_state.page_keys = (None, None)
     
     # Navigation
     col1, col2, col3, col4 = st.columns([2, 2, 4, 2])
     with col1:
         if st.button("◀ Previous", disabled=st.session_state.page == 0):
-            st.session_state.page = max(0, st.session_state.page - 1)
+            st.session_state.page -= 1
+            first_key = st.session_state.page_keys[0]
+            st.session_state.page_cursor = {"before": first_key} if st.session_state.page else {}
     with col2:
         if st.button("Next ▶", disabled=st.session_state.page >= total_pages - 1):
-            st.session_state.page = min(total_pages - 1, st.session_state.page + 1)
+            st.session_state.page += 1
+            st.session_state.page_cursor = {"after": st.session_state.page_keys[1]}
     with col4:
         st.caption(f"Page {st.session_state.page + 1} of {total_pages}")
     
-    # Paginate data
-    start_idx = st.session_state.page * page_size
-    end_idx = start_idx + page_size
-    paginated_df = summary_df.iloc[start_idx:end_idx]
+    with span("explorer.page", page_size=page_size) as current:
+        page = pager.page(page_size=page_size, descending=descending, **st.session_state.page_cursor)
+        current.set(rows=len(page))
+    st.session_state.page_keys = page_keys(page)
+    paginated_df = format_dataframe(page.reset_index(drop=True))
+    paginated_df.insert(0, "#", range(st.session_state.page * page_size + 1,
+                                      st.session_state.page * page_size + len(paginated_df) + 1))
     paginated_df['LEI'] = paginated_df['LEI'].astype('string')
-    # Debug code line
-    # paginated_df.astype('string')
     
     # Display table with custom styling
     st.dataframe(
@@ -322,29 +491,113 @@ if df is not None:
     )
 
     
-    # Download button
-    st.download_button(
-        label="📥 Download Report",
-        data=df.to_csv(index=False).encode('utf-8'),
-        file_name='lei_quality_report.csv',
-        mime='text/csv'
-    )
+    # Export: the report is only built when the download is clicked, in chunks, and reused
+    # until the data or rules change
+    with st.expander("📥 Export report"):
+        export_format = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+        report_columns = (list(report_frame.columns) if report_frame is not None
+                          else dashboard_columns() + result_columns())
+        if list_table is not None:
+            report_columns += list(list_table["field"].cat.categories)
+        export_columns = st.multiselect("Columns", report_columns, default=report_columns,
+                                        format_func=format_column)
+        col1, col2 = st.columns(2)
+        with col1:
+            export_labels = st.multiselect("Label", ["Good", "Moderate", "Poor"], key="export_labels")
+        with col2:
+            export_countries = st.multiselect("Country", countries or sorted(c.alpha_2 for c in pycountry.countries),
+                                              key="export_countries")
+
+        def build_report():
+            def chunks():
+                if report_frame is None:
+                    source = iter_quality_scores(columns=export_columns,
+                                                 countries=export_countries or countries,
+                                                 statuses=statuses, score_range=score_range,
+                                                 labels=export_labels)
+                else:
+                    rows = filter_report(report_frame, export_countries, export_labels)
+                    source = (join_list_fields(chunk, list_table, export_columns)
+                              for chunk in iter_frame_chunks(rows))
+                for chunk in source:
+                    yield format_dataframe(chunk.copy(deep=False))
+
+            options = {"columns": export_columns, "labels": export_labels,
+                       "countries": export_countries, "score_range": score_range}
+            # The download reads the file itself, which closes it at the end
+            return ReportFile(cached_report(key, export_format, chunks, options))
+
+        extension, mime = EXPORT_FORMATS[export_format]
+        st.download_button(
+            label="📥 Download Report",
+            data=build_report,
+            file_name=f'lei_quality_report.{extension}',
+            mime=mime
+        )
     
+    # Pairs behind the NoNearDuplicate penalty, kept with the snapshot like the rollup
+    with st.expander("🧬 Duplicate candidates"):
+        if report_frame is None:
+            pairs = cached_snapshot(f"{key}.near_duplicates",
+                                    lambda: fetch_near_duplicates(countries=countries))
+        else:
+            # Searched over every scored record, as for the penalty, then limited to the pairs
+            # with a record in the score range
+            pairs = cached_snapshot(f"{key}.near_duplicates",
+                                    lambda: near_duplicate_pairs(scored_frame)[PAIR_COLUMNS])
+            shown = df["lei"].dropna().unique()
+            pairs = pairs[pairs["lei_a"].isin(shown) | pairs["lei_b"].isin(shown)]
+        st.caption(f"{len(pairs):,} pairs of records with different LEIs whose names and legal "
+                   f"addresses look like the same entity. Both records of a pair lose the "
+                   f"NoNearDuplicate points.")
+        st.dataframe(
+            pairs,
+            column_config={
+                "lei_a": st.column_config.TextColumn("LEI"),
+                "name_a": st.column_config.TextColumn("Entity Name"),
+                "lei_b": st.column_config.TextColumn("Candidate LEI"),
+                "name_b": st.column_config.TextColumn("Candidate Name"),
+                "country": st.column_config.TextColumn("Country"),
+                "postal_code": st.column_config.TextColumn("Postal Code"),
+                "similarity": st.column_config.ProgressColumn("Similarity", format="%.2f",
+                                                              min_value=0, max_value=1),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
     # Drill-down details
     st.subheader("🔬 Record Details")
-    df['Display Name'] = df.apply(get_display_name, axis=1)
-
-    # Streamlit selectbox with search
-    selected_lei = st.selectbox(
-        "🔍 Search or Select LEI Record", 
-        options=df['Display Name'].tolist(),
-        index=0,
-        key="select_lei"
+
+    # Typeahead over the prebuilt index; options are row labels, so equal names stay apart
+    query = st.text_input("🔍 Search LEI or entity name", key="lei_query")
+    with span("search") as current:
+        matches = search_index.search(query, k=50, rows=df.index)
+        current.set(rows=len(matches))
+    names = display_names(df.loc[matches])
+    selected_row = st.selectbox(
+        "Select LEI Record",
+        options=matches.tolist(),
+        format_func=lambda row: f"{names[row]} ({df.at[row, 'lei']})",
+        index=0 if len(matches) else None,
+        # A new query gives a new widget, which starts at the best match
+        key=f"select_lei_{query}"
     )
 
-    if selected_lei:
-        record_details = df[df['Display Name'] == selected_lei]
-        record_details = (record_details.dropna(axis=1, how='all')).T
+    if selected_row is not None:
+        record_details = df.loc[[selected_row]]
+        if source_option == "Fetch from Database":
+            # The dashboard frame only holds the projected columns, so read the full record
+            record = fetch_record(record_details['lei'].iloc[0])
+            checks = record_details[result_columns()].reset_index(drop=True)
+            record_details = pd.concat([record, checks], axis=1)
+        elif list_table is not None:
+            record_details = join_list_fields(record_details, list_table)
+        else:
+            # Streamed uploads only kept the dashboard columns: read the record from the file
+            record = read_csv_row(io.BytesIO(content), selected_row)
+            record_details = pd.concat([record, record_details[result_columns()]], axis=1)
+        record_details = format_dataframe(record_details.dropna(axis=1, how='all')).T.astype(str)
         record_details.columns = ["Value"]
         
         # Display as a table with key-value pairs
@@ -394,4 +647,25 @@ else:
                 </tr>
             </table>
         </div>
-        """, unsafe_allow_html=True)
\ No newline at end of file
+        """, unsafe_allow_html=True)
+
+# ====================== Performance ======================
+run.stop()
+if tracing_enabled():
+    st.session_state.performance = run.breakdown()
+with st.expander("⏱️ Performance"):
+    if not tracing_enabled():
+        st.caption("Tracing is off (LEI_TRACING=0).")
+    elif "performance" in st.session_state:
+        st.caption("Wall time, rows processed and resident memory change of each stage of the "
+                   "last run. Stages run repeatedly, such as per-rule checks, are summed.")
+        st.dataframe(
+            st.session_state.performance,
+            column_config={
+                "time_ms": st.column_config.NumberColumn("Time (ms)", format="%.1f"),
+                "rows": st.column_config.NumberColumn("Rows", format="%d"),
+                "rss_delta_mb": st.column_config.NumberColumn("Memory Δ (MB)", format="%.1f"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
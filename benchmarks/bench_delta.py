@@ -0,0 +1,93 @@
+"""
+Cost of a delta sync against a full load, on a local stub of the lei-records API.
+
+    python -m benchmarks.bench_delta --records 100000 --changes 100 1000 10000
+
+Loads every record of the stub into a scratch table, then for each change count updates that
+many records (and adds a tenth as many new ones) and syncs only what changed since the
+watermark. Reports the pages requested, the time and the upsert counts of each sync, and
+checks that the changed records in the table match the stub. Needs the database.
+"""
+import argparse
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from benchmarks.bench_suite import _reset_table
+from benchmarks.stub_api import StubLeiApi
+from utils.db import get_engine, quote
+from utils.delta_sync import SYNC_WATERMARK_TABLE, crawl_updated_records, read_watermark, sync_batches
+from utils.fetch_data import crawl_lei_batches
+
+BENCH_TABLE = "lei_bench_delta"
+
+
+def _sync(api, url, engine, page_size, workers):
+    watermark = read_watermark(BENCH_TABLE, engine)
+    requests = api.requests
+    start = time.perf_counter()
+    if watermark is None:
+        batches = crawl_lei_batches(base_url=url, page_size=page_size, workers=workers)
+    else:
+        batches = crawl_lei_batches(crawl=crawl_updated_records, since=watermark, base_url=url,
+                                    page_size=page_size)
+    counts = sync_batches(batches, engine, BENCH_TABLE, watermark)
+    return time.perf_counter() - start, api.requests - requests, counts
+
+
+def _mismatches(api, engine, leis):
+    """Changed LEIs whose status, renewal date or second address line differ from the stub."""
+    records = {record["lei"]: record for record in api.records}
+    with engine.connect() as conn:
+        stored = pd.read_sql_query(text(
+            f"SELECT lei, {quote('registration.status')} AS status, "
+            f"{quote('registration.nextRenewalDate')} AS renewal, "
+            f"{quote('entity.legalAddress.addressLines.2')} AS line2 "
+            f"FROM {quote(BENCH_TABLE)} WHERE lei = ANY(:leis)"), conn, params={"leis": leis})
+    wrong = len(leis) - len(stored)
+    for row in stored.itertuples():
+        registration = records[row.lei]["registration"]
+        lines = records[row.lei]["entity"]["legalAddress"]["addressLines"]
+        if (row.status != registration["status"]
+                or row.renewal != pd.Timestamp(registration["nextRenewalDate"])
+                or (None if pd.isna(row.line2) else row.line2) != (lines[1] if len(lines) > 1 else None)):
+            wrong += 1
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    api = StubLeiApi(args.records, args.seed)
+    server, url = api.serve()
+    _reset_table(engine, BENCH_TABLE)
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": SYNC_WATERMARK_TABLE}).scalar():
+            conn.execute(text(f"DELETE FROM {SYNC_WATERMARK_TABLE} WHERE table_name = :table"),
+                         {"table": BENCH_TABLE})
+
+    print(f"{'sync':<12} {'pages':>6} {'time s':>8} {'inserted':>9} {'updated':>8} {'unchanged':>10} {'mismatched':>11}")
+    try:
+        seconds, pages, counts = _sync(api, url, engine, args.page_size, args.workers)
+        print(f"{'full':<12} {pages:>6} {seconds:>8.2f} {counts['inserted']:>9} {counts['updated']:>8} "
+              f"{counts['unchanged']:>10} {'':>11}")
+        for n in args.changes:
+            changed = api.update(n, new=n // 10)
+            seconds, pages, counts = _sync(api, url, engine, args.page_size, args.workers)
+            print(f"{f'delta {n}':<12} {pages:>6} {seconds:>8.2f} {counts['inserted']:>9} {counts['updated']:>8} "
+                  f"{counts['unchanged']:>10} {_mismatches(api, engine, changed):>11}")
+    finally:
+        server.shutdown()
+        _reset_table(engine, BENCH_TABLE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Incremental re-scoring (`run_incremental_checks`) against a full pass of the checks.
+
+    python -m benchmarks.bench_incremental --records 300000 1000000 --changed 0.001 0.01 0.1
+
+Each size is checked once into an empty results store, then again unchanged and with a share
+of the records renamed. Every incremental result is compared with `run_quality_checks`.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import flattened_frame
+from utils.data_quality_checks import run_quality_checks
+from utils.incremental import run_incremental_checks
+from utils.rules import active_rules
+
+NAME = "entity.legalName.name"
+
+
+def _timed(func, df):
+    start = time.perf_counter()
+    result = func(df.copy())
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[300000, 1000000])
+    parser.add_argument("--changed", type=float, nargs="+", default=[0.001, 0.01, 0.1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    names = [r.name for r in active_rules()]
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'records':>9} {'run':>14} {'full s':>7} {'incremental s':>14}")
+    for n in args.records:
+        df = flattened_frame(n, args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "results.parquet")
+            runs = [("first", df), ("unchanged", df)]
+            for share in args.changed:
+                changed = df.copy()
+                rows = rng.choice(n, int(n * share), replace=False)
+                changed.loc[rows, NAME] = changed.loc[rows, NAME].fillna("") + " Holding"
+                runs.append((f"{share:.1%} changed", changed))
+
+            for label, frame in runs:
+                full, expected = _timed(run_quality_checks, frame)
+                incremental, actual = _timed(lambda d: run_incremental_checks(d, store_path), frame)
+                for name in names:
+                    assert np.array_equal(actual[name].to_numpy(), expected[name].to_numpy()), name
+                print(f"{n:>9} {label:>14} {full:>7.2f} {incremental:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput of the vectorized ISO 17442 LEI check (`lei_valid`) against a per-row Python
+check that builds each LEI's integer.
+
+    python -m benchmarks.bench_lei_check --records 1000000 5000000
+
+LEIs are drawn from a pool of valid ones, with a share `--invalid` damaged: a character
+replaced, two neighbours swapped, lower case or missing. The Python check runs on a sample
+only, to confirm both agree; its time is scaled to the full record count.
+"""
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from benchmarks.synthetic import lei_check_digits
+from utils.data_quality_checks import lei_valid
+
+ALPHABET = np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype=np.uint8)
+LEI_PATTERN = re.compile(r"[0-9A-Z]{18}[0-9]{2}")
+
+
+def python_lei_valid(lei):
+    """The per-row reference: the LEI as an up-to-40-digit integer, modulo 97."""
+    if not isinstance(lei, str) or not LEI_PATTERN.fullmatch(lei):
+        return False
+    return int("".join(str(int(char, 36)) for char in lei)) % 97 == 1
+
+
+def make_leis(n, invalid=0.05, seed=0, pool_size=100000):
+    """`n` LEIs as an Arrow string array, a share `invalid` of them damaged."""
+    rng = np.random.default_rng(seed)
+    pick = random.Random(seed)
+    pool = []
+    for _ in range(min(n, pool_size)):
+        base = "".join(pick.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(18))
+        pool.append(base + lei_check_digits(base))
+    pool = np.frombuffer("".join(pool).encode(), dtype=np.uint8).reshape(-1, 20)
+    chars = pool[rng.integers(0, len(pool), n)]
+
+    damage = rng.choice(4, n) + 1
+    damage[rng.random(n) >= invalid] = 0
+    replaced = np.flatnonzero(damage == 1)
+    positions = rng.integers(0, 20, len(replaced))
+    chars[replaced, positions] = ALPHABET[(np.searchsorted(ALPHABET, chars[replaced, positions])
+                                           + rng.integers(1, 36, len(replaced))) % 36]
+    swapped = np.flatnonzero(damage == 2)
+    positions = rng.integers(0, 19, len(swapped))
+    chars[swapped, positions], chars[swapped, positions + 1] = (chars[swapped, positions + 1].copy(),
+                                                                chars[swapped, positions].copy())
+    lowered = damage == 3
+    chars[lowered] = np.where(chars[lowered] >= ord("A"), chars[lowered] + 32, chars[lowered])
+
+    offsets = pa.py_buffer(np.arange(0, 20 * n + 1, 20, dtype=np.int64))
+    leis = pa.Array.from_buffers(pa.large_string(), n, [None, offsets, pa.py_buffer(chars)])
+    return pc.if_else(pa.array(damage == 4), pa.scalar(None, pa.large_string()), leis)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[1000000, 5000000])
+    parser.add_argument("--invalid", type=float, default=0.05, help="share of damaged LEIs")
+    parser.add_argument("--sample", type=int, default=100000, help="records checked in Python")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'input':<14} {'time s':>8} {'records/s':>12} {'valid':>7}")
+    for n in args.records:
+        leis = make_leis(n, args.invalid, args.seed)
+        inputs = {"arrow strings": leis.to_pandas(types_mapper={pa.large_string(): "string[pyarrow]"}.get),
+                  "object": leis.to_pandas()}
+        for name, series in inputs.items():
+            start = time.perf_counter()
+            valid = lei_valid(series)
+            seconds = time.perf_counter() - start
+            print(f"{n:>9} {name:<14} {seconds:>8.3f} {n / seconds:>12,.0f} {valid.mean():>7.1%}")
+
+        sample = inputs["object"].iloc[:args.sample]
+        start = time.perf_counter()
+        expected = np.array([python_lei_valid(lei) for lei in sample])
+        seconds = (time.perf_counter() - start) * n / len(sample)
+        agree = (expected == valid[:len(sample)]).all()
+        print(f"{n:>9} {'python, scaled':<14} {seconds:>8.3f} {n / seconds:>12,.0f} {expected.mean():>7.1%}"
+              f"   agrees on {len(sample):,}: {agree}")
+
+
+if __name__ == "__main__":
+    main()
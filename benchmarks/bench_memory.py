@@ -0,0 +1,88 @@
+"""
+Peak memory of loading a wide flattened LEI file: pandas' default dtypes versus the compact
+representation (categorical codes, Arrow strings, parsed dates, list fields in a side table).
+
+    python -m benchmarks.bench_memory --records 1000000
+
+Each load runs in a fresh process and reports its peak resident set size (Linux) and the
+in-memory size of the loaded data.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import rss_mb, write_csv
+from benchmarks.synthetic import flattened_frame
+
+# List fields of a flattened record, each filled in a small share of the records
+LIST_FIELDS = (
+    [f"entity.otherNames.{i}.name" for i in range(1, 6)]
+    + [f"entity.otherNames.{i}.type" for i in range(1, 6)]
+    + [f"entity.legalAddress.addressLines.{i}" for i in range(1, 5)]
+    + [f"entity.headquartersAddress.addressLines.{i}" for i in range(1, 5)]
+    + [f"entity.otherAddresses.{i}.{leaf}" for i in range(1, 4)
+       for leaf in ("addressLines.1", "city", "country", "postalCode")]
+)
+
+
+def wide_frame(n, seed=0):
+    """Records as flattened from the API: codes, names, dates and mostly-empty list fields."""
+    rng = np.random.default_rng(seed)
+    df = flattened_frame(n, seed)
+    for i, col in enumerate(LIST_FIELDS):
+        if col in df.columns:
+            continue
+        fill = 0.9 if col.endswith("addressLines.1") and "legal" in col else 0.3 / (1 + i % 5)
+        present = rng.random(n) < fill
+        df[col] = np.where(present, f"value of {col.rsplit('.', 2)[-2]}", None)
+    return df
+
+
+def _measure(mode, path):
+    from utils.compact import read_compact_csv
+    from utils.data_quality_checks import run_quality_checks
+    from utils.scoring import calculate_quality_score
+    from utils.utils import dashboard_columns, format_dataframe
+
+    start = time.perf_counter()
+    if mode == "default":
+        # The whole file with pandas' inferred dtypes, renamed for display
+        df = format_dataframe(calculate_quality_score(run_quality_checks(pd.read_csv(path))))
+        size = df.memory_usage(deep=True).sum()
+    else:
+        df, side = read_compact_csv(path, keep=dashboard_columns())
+        df = calculate_quality_score(run_quality_checks(df))
+        size = df.memory_usage(deep=True).sum() + side.memory_usage(deep=True).sum()
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.2f} {rss_mb():.0f} {size / 1024 ** 2:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        _measure(*args.measure)
+        return
+
+    print(f"{'records':>9} {'file MB':>8} {'dtypes':>8} {'time s':>7} {'peak RSS MB':>12} {'data MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.records:
+            path = os.path.join(tmp, f"{n}.csv")
+            write_csv(path, n, wide_frame)
+            size = os.path.getsize(path) / 1024 ** 2
+            for mode in ("default", "compact"):
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_memory", "--measure", mode, path],
+                                     check=True, capture_output=True, text=True).stdout.split()
+                print(f"{n:>9} {size:>8.0f} {mode:>8} {float(out[0]):>7.2f} {float(out[1]):>12.0f} {float(out[2]):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
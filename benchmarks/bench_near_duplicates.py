@@ -0,0 +1,100 @@
+"""
+Time and recall of the near-duplicate search (`near_duplicate_pairs`) as the record count grows.
+
+    python -m benchmarks.bench_near_duplicates --records 100000 1000000 2500000
+
+Records get random names and street addresses spread over countries and postal codes, like
+the GLEIF population. A share `--planted` of them is a copy of another record under a new
+LEI, with the kind of edits registrations of the same entity show: case, punctuation, a
+misspelt character, an abbreviated street or a transliterated name instead of the legal one.
+Recall is the share of those copies found paired with their original. Frames are compacted
+and concatenated in chunks, as an uploaded file is, so their text columns are chunked Arrow
+strings and their codes categoricals.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.compact import COMPACT_CHUNK_ROWS, compact_frame
+from utils.near_duplicates import (ADDRESS_LINE, CITY, COUNTRY, LEGAL_NAME, POSTAL_CODE,
+                                   TRANSLITERATED_NAME, near_duplicate_pairs)
+from utils.utils import _concat_chunks
+
+COUNTRIES = np.array(["DE", "US", "GB", "FR", "NL", "LU", "IT", "ES", "CH", "JP", "CN", "IN", "CA", "KY", "IE"],
+                     dtype=object)
+SUFFIXES = np.array(["GmbH", "AG", "Ltd", "LLC", "S.A.", "B.V.", "S.p.A.", "Inc.", "SE", "KG"], dtype=object)
+SYLLABLES = ["ka", "lo", "mi", "ne", "ro", "sa", "tu", "vi", "ber", "dan", "gor", "hal", "lin", "mar",
+             "nor", "por", "stein", "ton", "wick", "burg"]
+
+
+def _words(rng, count):
+    parts = np.array(SYLLABLES, dtype=object)
+    words = parts[rng.integers(0, len(parts), count)] + parts[rng.integers(0, len(parts), count)]
+    return pd.Series(words).str.capitalize().to_numpy(dtype=object)
+
+
+def make_frame(n, planted=0.02, seed=0):
+    """Flattened records, a share `planted` of them edited copies of earlier ones. Returns the
+    frame and the (original, copy) positions of the planted pairs."""
+    rng = np.random.default_rng(seed)
+    vocabulary = _words(rng, 5000)
+    names = (vocabulary[rng.integers(0, len(vocabulary), n)] + " " + vocabulary[rng.integers(0, len(vocabulary), n)]
+             + " " + SUFFIXES[rng.integers(0, len(SUFFIXES), n)])
+    streets = (pd.Series(rng.integers(1, 999, n)).astype(str).to_numpy(dtype=object) + " "
+               + vocabulary[rng.integers(0, len(vocabulary), n)] + " Street")
+    df = pd.DataFrame({
+        "lei": pd.Series(np.arange(n)).map("{:018d}00".format),
+        LEGAL_NAME: names,
+        TRANSLITERATED_NAME: None,
+        ADDRESS_LINE: streets,
+        CITY: vocabulary[rng.integers(0, len(vocabulary), n)] + "ville",
+        POSTAL_CODE: pd.Series(rng.integers(0, 100000, n)).map("{:05d}".format),
+        COUNTRY: COUNTRIES[rng.integers(0, len(COUNTRIES), n)],
+    })
+
+    copied = rng.random(n) < planted
+    copies, sources = np.flatnonzero(copied), np.flatnonzero(~copied)
+    originals = sources[rng.integers(0, len(sources), len(copies))]
+    fields = [LEGAL_NAME, ADDRESS_LINE, CITY, POSTAL_CODE, COUNTRY]
+    df.loc[copies, fields] = df.loc[originals, fields].to_numpy()
+    names = df.loc[copies, LEGAL_NAME].astype(str)
+    edit = rng.integers(0, 5, len(copies))
+    names = names.where(edit != 0, names.str.upper())
+    names = names.where(edit != 1, names.str.replace(".", "", regex=False).str.replace(" ", "  "))
+    typo = rng.integers(1, 6, len(copies))
+    names = names.where(edit != 2, [name[:i] + "x" + name[i + 1:] for name, i in zip(names, typo)])
+    df.loc[copies, LEGAL_NAME] = names.to_numpy()
+    streets = df.loc[copies, ADDRESS_LINE].astype(str)
+    df.loc[copies, ADDRESS_LINE] = streets.where(edit != 3, streets.str.replace(" Street", " St.")).to_numpy()
+    # A copy registered under a local-script legal name with the original as its transliteration
+    transliterated = copies[edit == 4]
+    df.loc[transliterated, TRANSLITERATED_NAME] = df.loc[transliterated, LEGAL_NAME].to_numpy()
+    df.loc[transliterated, LEGAL_NAME] = "Юридическое лицо"
+    # The dtypes and chunks read_compact_csv gives an upload of this many records
+    df = _concat_chunks([compact_frame(df.iloc[start:start + COMPACT_CHUNK_ROWS].reset_index(drop=True))
+                         for start in range(0, n, COMPACT_CHUNK_ROWS)])
+    return df, np.column_stack([originals, copies])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--planted", type=float, default=0.02, help="share of records copied from another")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'time s':>8} {'records/s':>10} {'pairs':>8} {'planted':>8} {'recall':>7}")
+    for n in args.records:
+        df, planted = make_frame(n, args.planted, args.seed)
+        start = time.perf_counter()
+        pairs = near_duplicate_pairs(df)
+        seconds = time.perf_counter() - start
+        found = pd.MultiIndex.from_arrays([pairs[["row_a", "row_b"]].min(axis=1), pairs[["row_a", "row_b"]].max(axis=1)])
+        recall = pd.MultiIndex.from_arrays([planted.min(axis=1), planted.max(axis=1)]).isin(found).mean()
+        print(f"{n:>9} {seconds:>8.2f} {n / seconds:>10,.0f} {len(pairs):>8} {len(planted):>8} {recall:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
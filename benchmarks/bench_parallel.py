@@ -0,0 +1,45 @@
+"""
+Speedup of the sharded process-pool quality checks over the serial path.
+
+    python -m benchmarks.bench_parallel --records 2000000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import flattened_frame
+from utils.data_quality_checks import run_quality_checks
+from utils.parallel import DEFAULT_SHARD_ROWS, run_parallel_checks
+from utils.rules import active_rules
+from utils.scoring import calculate_quality_score
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=2000000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, os.cpu_count() or 1])
+    parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = flattened_frame(args.records, args.seed)
+    columns = [r.name for r in active_rules()] + ["QualityScore", "QualityLabel"]
+
+    start = time.perf_counter()
+    expected = calculate_quality_score(run_quality_checks(df.copy()))
+    serial = time.perf_counter() - start
+    print(f"{args.records} records, {os.cpu_count()} CPUs")
+    print(f"serial:    {serial:.2f}s")
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        actual = calculate_quality_score(run_parallel_checks(df.copy(), workers, args.shard_rows))
+        elapsed = time.perf_counter() - start
+        pd.testing.assert_frame_equal(actual[columns], expected[columns])
+        print(f"{workers} workers: {elapsed:.2f}s (speedup {serial / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Peak memory of analyzing an uploaded CSV: streamed in chunks versus read whole.
+
+    python -m benchmarks.bench_streaming --records 250000 500000 1000000
+
+Each measurement runs in a fresh process and reports its peak resident set size (Linux).
+Every active rule runs, the near-duplicate search included, so the streamed peak shows the
+memory of its per-bucket second pass too.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.common import rss_mb, write_csv
+from benchmarks.synthetic import flattened_frame
+from utils.rules import active_rules
+
+# Columns of a flattened golden-copy record the dashboard does not read
+FILLER_COLUMNS = 40
+
+
+def padded_frame(n, seed=0):
+    """Flattened records as wide as a golden-copy extract."""
+    df = flattened_frame(n, seed)
+    for i in range(FILLER_COLUMNS):
+        df[f"entity.otherAddresses.{i}.addressLines.1"] = f"Street {i} with some address text"
+    return df
+
+
+def _measure(mode, path, chunk_rows):
+    from utils.data_quality_checks import run_quality_checks
+    from utils.scoring import calculate_quality_score
+    from utils.streaming import stream_csv_snapshot
+
+    start = time.perf_counter()
+    if mode == "stream":
+        with tempfile.TemporaryDirectory() as cache_dir, open(path, "rb") as f:
+            stream_csv_snapshot(f, "bench", chunk_rows=chunk_rows, cache_dir=cache_dir)
+    else:
+        calculate_quality_score(run_quality_checks(pd.read_csv(path)))
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.2f} {rss_mb():.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[250000, 500000, 1000000])
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        _measure(*args.measure, args.chunk_rows)
+        return
+
+    print(f"rules: {', '.join(r.name for r in active_rules())}")
+    print(f"{'records':>9} {'file MB':>8} {'mode':>7} {'time s':>7} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.records:
+            path = os.path.join(tmp, f"{n}.csv")
+            write_csv(path, n, padded_frame)
+            size = os.path.getsize(path) / 1024 ** 2
+            for mode in ("whole", "stream"):
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_streaming",
+                                      "--chunk-rows", str(args.chunk_rows), "--measure", mode, path],
+                                     check=True, capture_output=True, text=True).stdout.split()
+                print(f"{n:>9} {size:>8.0f} {mode:>7} {float(out[0]):>7.2f} {float(out[1]):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Time and peak memory of each pipeline stage on synthetic records, stored as JSON.
+
+    python -m benchmarks.bench_suite --records 10000 100000 1000000 3000000
+    python -m benchmarks.bench_suite --records 100000 --compare benchmarks/results/abc1234.json
+
+Stages: extract_leaf_nodes (flattening API pages into a frame), db_load (COPY upsert into a
+scratch table), fetch_data_from_db, run_quality_checks, calculate_quality_score and
+format_dataframe. Each record count runs in a fresh process; peak RSS is reset before every
+stage (Linux). Without a database the two database stages are skipped and the checks run on
+the flattened frame. Results go to benchmarks/results/<commit>.json unless --output is given.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from benchmarks.common import rss_mb
+from benchmarks.synthetic import DEFAULT_RATES, generate_pages
+
+STAGES = ["extract_leaf_nodes", "db_load", "fetch_data_from_db", "run_quality_checks",
+          "calculate_quality_score", "format_dataframe"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BENCH_TABLE = "lei_bench"
+
+
+class Stage:
+    """Wall time, starting RSS and peak RSS of a stage, which may be entered several times."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rss_before = None
+        self.peak = 0.0
+
+    def __enter__(self):
+        if self.rss_before is None:
+            self.rss_before = rss_mb("VmRSS")
+        # Writing 5 to clear_refs resets the peak RSS (VmHWM) of the process
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self.start
+        self.peak = max(self.peak, rss_mb())
+
+    def result(self, records, **extra):
+        return dict(records=records, stage=self.name, seconds=round(self.seconds, 4),
+                    peak_rss_mb=round(self.peak, 1), rss_before_mb=round(self.rss_before, 1),
+                    records_per_second=round(records / self.seconds) if self.seconds else None, **extra)
+
+
+def _reset_table(engine, table_name):
+    """Drop the scratch table with its quality view, registry entries and load watermark."""
+    from sqlalchemy import text
+
+    from utils.loader import DATA_VERSION_TABLE
+    from utils.schema import SCHEMA_REGISTRY_TABLE
+
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{table_name}" CASCADE'))
+        for registry in (SCHEMA_REGISTRY_TABLE, DATA_VERSION_TABLE):
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": registry}).scalar():
+                conn.execute(text(f"DELETE FROM {registry} WHERE table_name = :table"), {"table": table_name})
+
+
+def run_stages(n, seed=0, rates=None, page_records=10000, table_name=BENCH_TABLE, use_db=True):
+    """Run every stage over `n` synthetic records and return one result dict per stage."""
+    from utils.data_quality_checks import run_quality_checks
+    from utils.fetch_data import flatten_page
+    from utils.scoring import calculate_quality_score
+    from utils.utils import format_dataframe
+
+    results = []
+    # Only flattening is timed, not generating the records
+    flatten = Stage("extract_leaf_nodes")
+    frames = []
+    for page in generate_pages(n, seed, rates, page_records):
+        with flatten:
+            frames.append(pd.DataFrame(flatten_page(page)))
+        del page
+    with flatten:
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        del frames
+    results.append(flatten.result(n, columns=df.shape[1]))
+
+    engine = None
+    if use_db:
+        try:
+            from utils.db import get_engine
+            engine = get_engine()
+            engine.connect().close()
+        except Exception as e:
+            engine = None
+            reason = f"no database: {type(e).__name__}"
+    else:
+        reason = "disabled"
+    if engine is not None:
+        from utils.loader import copy_upsert
+        from utils.utils import fetch_data_from_db
+
+        _reset_table(engine, table_name)
+        with Stage("db_load") as load:
+            counts = copy_upsert(df, engine, table_name)
+        results.append(load.result(n, **counts))
+        del df
+        with Stage("fetch_data_from_db") as fetch:
+            df = fetch_data_from_db(table_name)
+        results.append(fetch.result(len(df)))
+        _reset_table(engine, table_name)
+    else:
+        results += [dict(records=n, stage=stage, skipped=reason) for stage in ("db_load", "fetch_data_from_db")]
+
+    with Stage("run_quality_checks") as checks:
+        df = run_quality_checks(df)
+    results.append(checks.result(len(df)))
+    with Stage("calculate_quality_score") as score:
+        df = calculate_quality_score(df)
+    results.append(score.result(len(df)))
+    with Stage("format_dataframe") as fmt:
+        df = format_dataframe(df)
+    results.append(fmt.result(len(df)))
+    return results
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy
+    import pyarrow
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    return {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": numpy.__version__,
+        "pyarrow": pyarrow.__version__,
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(results, baseline):
+    """Print the time and peak memory of `results` relative to the `baseline` results."""
+    old = {(r["records"], r["stage"]): r for r in baseline["results"] if "seconds" in r}
+    print(f"\nagainst {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')})")
+    print(f"{'records':>9} {'stage':<24} {'time':>8} {'peak RSS':>9}")
+    for r in results:
+        before = old.get((r["records"], r["stage"]))
+        if before is None or "seconds" not in r:
+            continue
+        print(f"{r['records']:>9} {r['stage']:<24} {r['seconds'] / max(before['seconds'], 1e-9):>7.2f}x "
+              f"{r['peak_rss_mb'] / max(before['peak_rss_mb'], 1e-9):>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, nargs="+", default=[10000, 100000, 1000000, 3000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--page-records", type=int, default=10000)
+    parser.add_argument("--no-db", action="store_true", help="skip the database stages")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    for name, rate in DEFAULT_RATES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=rate,
+                            help=f"share of records with {name.replace('_', ' ')} (default {rate})")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    rates = {name: getattr(args, name) for name in DEFAULT_RATES}
+
+    if args.run is not None:
+        # Child process: one record count, results as JSON on stdout
+        print(json.dumps(run_stages(args.run, args.seed, rates, args.page_records, use_db=not args.no_db)))
+        return
+
+    results = []
+    print(f"{'records':>9} {'stage':<24} {'time s':>8} {'records/s':>10} {'peak RSS MB':>12}")
+    for n in args.records:
+        command = [sys.executable, "-m", "benchmarks.bench_suite", "--run", str(n), "--seed", str(args.seed),
+                   "--page-records", str(args.page_records)] + (["--no-db"] if args.no_db else [])
+        command += [f"--{name.replace('_', '-')}={rate}" for name, rate in rates.items()]
+        child = subprocess.run(command, capture_output=True, text=True)
+        if child.returncode != 0:
+            # Typically killed for running out of memory at the larger sizes
+            error = child.stderr.strip().splitlines()[-1:] or [f"exit status {child.returncode}"]
+            results.append({"records": n, "error": error[0], "returncode": child.returncode})
+            print(f"{n:>9} failed: {error[0]} (exit status {child.returncode})")
+            continue
+        for r in json.loads(child.stdout.strip().splitlines()[-1]):
+            results.append(r)
+            if "seconds" in r:
+                print(f"{n:>9} {r['stage']:<24} {r['seconds']:>8.2f} {r['records_per_second'] or 0:>10,} "
+                      f"{r['peak_rss_mb']:>12.0f}")
+            else:
+                print(f"{n:>9} {r['stage']:<24} skipped ({r['skipped']})")
+
+    report = {"environment": environment(), "generator": dict(seed=args.seed, **rates), "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['environment']['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Helpers shared by the benchmarks: memory readings of the running process and synthetic CSV
+files written in pieces.
+"""
+from benchmarks.synthetic import flattened_frame
+
+
+def rss_mb(field="VmHWM"):
+    """
+    A memory figure of this process from /proc/self/status in MB (Linux): the peak resident
+    set size by default, `VmRSS` for the current one. VmHWM starts over at exec, unlike
+    ru_maxrss, which a child inherits from its parent.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+
+
+def write_csv(path, n, make_frame=flattened_frame, seed=0, piece_rows=250000):
+    """A flattened CSV of `n` records from `make_frame(rows, seed)`, written in pieces."""
+    for start in range(0, n, piece_rows):
+        make_frame(min(piece_rows, n - start), seed + start).to_csv(
+            path, index=False, header=start == 0, mode="w" if start == 0 else "a")
@@ -0,0 +1,164 @@
+"""
+Local stand-in for the GLEIF lei-records API, serving synthetic records, for testing and
+timing the crawler and delta sync without the network.
+
+    python -m benchmarks.stub_api --records 100000 --port 8080
+    python -m utils.fetch_data --all --base-url http://127.0.0.1:8080/api/v1/lei-records
+    curl 'http://127.0.0.1:8080/admin/update?count=500&new=50'
+    python -m utils.fetch_data --delta --base-url http://127.0.0.1:8080/api/v1/lei-records
+
+Pages follow `page[size]` and `page[number]`. `filter[registration.lastUpdateDate]=>=<date>`
+returns only the records updated at or after the date, in last update order. The
+/admin/update endpoint changes the status, renewal date and address lines of random records
+and adds new ones, all with the current time as their last update date. Statuses queued with
+`fail` are answered, in turn, before any further page, to exercise the crawler's retries.
+"""
+import argparse
+import bisect
+import json
+import random
+import threading
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import generate_records
+from utils.delta_sync import LAST_UPDATE_FILTER
+
+API_PATH = "/api/v1/lei-records"
+
+
+def _isoformat(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class StubLeiApi:
+    """`n` synthetic records, kept in last update order, and the number of pages served."""
+
+    def __init__(self, n, seed=0):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        # Synthetic update dates can lie in the future; those move to some time in the past year
+        yesterday = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+        self.records = []
+        for record in generate_records(n, seed, {"duplicates": 0}):
+            registration = record["registration"]
+            if registration["lastUpdateDate"] > _isoformat(yesterday):
+                registration["lastUpdateDate"] = _isoformat(
+                    yesterday - timedelta(seconds=self.rng.randrange(365 * 86400)))
+            self.records.append(record)
+        self.requests = 0
+        self.failures = deque()
+        self._lock = threading.Lock()
+        self._sort()
+
+    def _sort(self):
+        # As moments, so that dates with fractions of a second sort and filter by time
+        updated = [datetime.fromisoformat(record["registration"]["lastUpdateDate"]) for record in self.records]
+        self.order = sorted(range(len(self.records)), key=lambda i: (updated[i], i))
+        self.keys = [updated[i] for i in self.order]
+
+    def update(self, count, new=0):
+        """Change `count` random records and add `new` ones, as of now. Returns the changed LEIs."""
+        with self._lock:
+            now = _isoformat(datetime.now(timezone.utc))
+            changed = self.rng.sample(range(len(self.records)), min(count, len(self.records)))
+            for i in changed:
+                record = self.records[i]
+                registration = record["registration"]
+                registration["status"] = "LAPSED" if registration["status"] == "ISSUED" else "ISSUED"
+                renewal = datetime.strptime(registration["nextRenewalDate"], "%Y-%m-%dT%H:%M:%SZ")
+                registration["nextRenewalDate"] = _isoformat(renewal + timedelta(days=365))
+                registration["lastUpdateDate"] = now
+                address = record["entity"]["legalAddress"]
+                address["addressLines"] = address["addressLines"][:1]
+            added = list(generate_records(new, self.seed + 1, {"duplicates": 0}, start=len(self.records)))
+            for record in added:
+                record["registration"]["lastUpdateDate"] = now
+            self.records.extend(added)
+            self._sort()
+            return [self.records[i]["lei"] for i in changed] + [record["lei"] for record in added]
+
+    def fail(self, *statuses):
+        """Answer the next lei-records requests with `statuses`, one each, instead of a page."""
+        with self._lock:
+            self.failures.extend(statuses)
+
+    def _next_failure(self):
+        with self._lock:
+            if not self.failures:
+                return None
+            self.requests += 1
+            return self.failures.popleft()
+
+    def page(self, size, number, since=None):
+        """One lei-records response body: page `number` of the records updated at or after `since`."""
+        with self._lock:
+            self.requests += 1
+            first = bisect.bisect_left(self.keys, datetime.fromisoformat(since)) if since else 0
+            total = len(self.order) - first
+            start = first + (number - 1) * size
+            data = [{"type": "lei-records", "id": self.records[i]["lei"], "attributes": self.records[i]}
+                    for i in self.order[start:min(start + size, len(self.order))]]
+            return json.dumps({
+                "meta": {"pagination": {"currentPage": number, "perPage": size, "total": total,
+                                        "lastPage": max((total - 1) // size + 1, 1)}},
+                "data": data,
+            }).encode()
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Serve the API from a background thread. Returns the server and the lei-records URL."""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path == "/admin/update":
+                    body = json.dumps({"changed": api.update(int(query.get("count", 100)),
+                                                             int(query.get("new", 0)))}).encode()
+                elif url.path == API_PATH and (status := api._next_failure()) is not None:
+                    self.send_response(status)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                elif url.path == API_PATH:
+                    since = query.get(LAST_UPDATE_FILTER, "").removeprefix(">=") or None
+                    body = api.page(int(query.get("page[size]", 10)), int(query.get("page[number]", 1)), since)
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.api+json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://{host}:{server.server_address[1]}{API_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server, url = StubLeiApi(args.records, args.seed).serve(args.host, args.port)
+    print(f"serving {args.records} records at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Synthetic GLEIF-style LEI records, shaped like the `attributes` of the lei-records API.
+
+Records have variable-length name, address line and other address lists, and a configurable
+share of defects: invalid legal address countries, renewal dates before the registration
+date, expired registrations and LEIs repeated from earlier records. `flattened_frame` draws
+the same kind of records, already flattened, with numpy, for benchmarks of millions of rows.
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+COUNTRIES = ["DE", "US", "GB", "FR", "NL", "LU", "IT", "ES", "CH", "JP", "CN", "IN", "CA", "KY", "IE"]
+INVALID_COUNTRIES = ["XX", "UK", "EU", "ZZ", "", "D"]
+JURISDICTIONS = {"US": ["US-DE", "US-NY", "US-CA"], "CA": ["CA-ON", "CA-QC"]}
+LOUS = ["5299000J2N45DDNE4Y28", "EVK05KS7XY1DEII3R011", "529900T8BM49AURSDO55", "213800WAVVOPS85N2205"]
+LEGAL_FORMS = ["2HBR", "6QQB", "8Z6G", "XTIQ", "H1UM", "8888"]
+CATEGORIES = ["GENERAL", "FUND", "BRANCH", "SOLE_PROPRIETOR"]
+WORDS = ["Global", "Capital", "Holdings", "Trading", "Invest", "Partners", "Energy", "Logistics",
+         "Finance", "Industries", "Nordic", "Pacific", "Alpha", "Union", "Atlantic", "Systems"]
+SUFFIXES = ["GmbH", "AG", "Ltd", "LLC", "S.A.", "B.V.", "S.p.A.", "Inc.", "SE", "KG"]
+
+DEFAULT_RATES = {"invalid_countries": 0.03, "inverted_dates": 0.02, "expired": 0.15, "duplicates": 0.01}
+
+
+def lei_check_digits(base):
+    """ISO 17442 check digits of an 18-character LEI prefix (ISO 7064 MOD 97-10)."""
+    digits = "".join(str(int(char, 36)) for char in base)
+    return f"{98 - int(digits + '00') % 97:02d}"
+
+
+def _lei(i, rng):
+    base = f"{rng.choice(LOUS)[:4]}00{i:012X}"
+    return base + lei_check_digits(base)
+
+
+def _name(rng):
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}"
+
+
+def _address(i, rng, country):
+    return {
+        "language": "en",
+        "addressLines": [f"{rng.randint(1, 999)} {rng.choice(WORDS)} Street", f"Floor {rng.randint(1, 40)}",
+                         f"Suite {rng.randint(1, 900)}", "c/o Registered Agent"][: rng.randint(1, 4)],
+        "addressNumber": None,
+        "addressNumberWithinBuilding": None,
+        "mailRouting": None,
+        "city": rng.choice(WORDS) + "ville",
+        "region": rng.choice(JURISDICTIONS.get(country, [None])),
+        "country": country,
+        "postalCode": f"{(i * 7919) % 99999:05d}",
+    }
+
+
+def make_record(i, rng, rates=None, today=None):
+    """The attributes of the `i`th synthetic record, drawn from `rng` (a random.Random)."""
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    today = today or date.today()
+    country = rng.choice(INVALID_COUNTRIES) if rng.random() < rates["invalid_countries"] else rng.choice(COUNTRIES)
+    legal_address = _address(i, rng, country)
+
+    initial = date(2012, 6, 1) + timedelta(days=rng.randint(0, 4500))
+    if rng.random() < rates["inverted_dates"]:
+        renewal = initial - timedelta(days=rng.randint(1, 700))
+    elif rng.random() < rates["expired"]:
+        renewal = today - timedelta(days=rng.randint(1, 1500))
+    else:
+        renewal = today + timedelta(days=rng.randint(1, 365))
+    status = "ISSUED" if renewal >= today else rng.choice(["LAPSED", "ISSUED", "RETIRED"])
+
+    return {
+        "lei": _lei(i, rng),
+        "entity": {
+            "legalName": {"name": _name(rng), "language": "en"},
+            "otherNames": [{"name": _name(rng), "language": "en", "type": "TRADING_OR_OPERATING_NAME"}
+                           for _ in range(rng.choice([0, 0, 0, 1, 1, 2, 3]))],
+            "transliteratedOtherNames": [{"name": _name(rng), "language": "en",
+                                          "type": "AUTO_ASCII_TRANSLITERATED_LEGAL_NAME"}
+                                         for _ in range(rng.choice([0, 0, 0, 0, 1]))],
+            "legalAddress": legal_address,
+            "headquartersAddress": dict(legal_address) if rng.random() < 0.7 else _address(i + 1, rng, country),
+            "otherAddresses": [dict(_address(i + 2, rng, country), type="AUTO_ASCII_TRANSLITERATED_LEGAL_ADDRESS")
+                               for _ in range(rng.choice([0, 0, 0, 0, 0, 1, 2]))],
+            "registeredAt": {"id": f"RA{rng.randint(1, 999):06d}", "other": None},
+            "registeredAs": f"HRB {rng.randint(1000, 999999)}",
+            "jurisdiction": legal_address["region"] or country,
+            "category": rng.choice(CATEGORIES),
+            "legalForm": {"id": rng.choice(LEGAL_FORMS), "other": None},
+            "associatedEntity": {"lei": None, "name": None},
+            "status": "ACTIVE" if status == "ISSUED" else rng.choice(["ACTIVE", "INACTIVE"]),
+            "expiration": {"date": None, "reason": None},
+            "successorEntity": {"lei": None, "name": None},
+            "creationDate": (initial - timedelta(days=rng.randint(0, 9000))).isoformat() + "T00:00:00Z",
+            "subCategory": None,
+        },
+        "registration": {
+            "initialRegistrationDate": initial.isoformat() + "T00:00:00Z",
+            "lastUpdateDate": (initial + timedelta(days=rng.randint(0, 3000))).isoformat() + "T00:00:00Z",
+            "status": status,
+            "nextRenewalDate": renewal.isoformat() + "T00:00:00Z",
+            "managingLou": rng.choice(LOUS),
+            "corroborationLevel": rng.choice(["FULLY_CORROBORATED", "PARTIALLY_CORROBORATED", "ENTITY_SUPPLIED_ONLY"]),
+            "validatedAt": {"id": f"RA{rng.randint(1, 999):06d}", "other": None},
+            "validatedAs": f"HRB {rng.randint(1000, 999999)}",
+            "otherValidationAuthorities": [],
+        },
+        "bic": None,
+        "mic": None,
+        "ocid": None,
+        "spglobal": [f"{rng.randint(10 ** 8, 10 ** 9)}"],
+        "conformityFlag": rng.choice(["CONFORMING", "NON_CONFORMING", None]),
+    }
+
+
+def generate_records(n, seed=0, rates=None, start=0):
+    """
+    Yield `n` synthetic records, the same ones for the same `seed`. A share `duplicates` of
+    them reuses the LEI of an earlier record; `start` continues the numbering of a previous
+    batch so LEIs stay distinct across batches.
+    """
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    rng = random.Random(f"{seed}:{start}")
+    today = date.today()
+    earlier = []
+    for i in range(start, start + n):
+        record = make_record(i, rng, rates, today)
+        if earlier and rng.random() < rates["duplicates"]:
+            record["lei"] = rng.choice(earlier)
+        elif len(earlier) < 10000:
+            earlier.append(record["lei"])
+        yield record
+
+
+def generate_pages(n, seed=0, rates=None, page_records=10000):
+    """`n` records as lists of lei-records API items of at most `page_records` records."""
+    for start in range(0, n, page_records):
+        yield [{"type": "lei-records", "attributes": record}
+               for record in generate_records(min(page_records, n - start), seed, rates, start)]
+
+
+def flattened_frame(n, seed=0, rates=None):
+    """
+    `n` flattened records with the columns the dashboard reads, drawn column by column rather
+    than record by record. Defects come at the shares of `rates`, plus 2% missing names and
+    dates; LEIs have valid check digits.
+    """
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(date.today())
+
+    def pick(values, size=n):
+        return np.array(values, dtype=object)[rng.integers(0, len(values), size)]
+
+    def missing(values):
+        return values.where(rng.random(n) >= 0.02, None)
+
+    def timestamps(days):
+        return pd.Series(np.datetime_as_string(days, unit="D").astype(object) + "T00:00:00Z")
+
+    # An LOU prefix, "00" and 12 letters or digits, like the LEIs of `generate_records`
+    chars = np.concatenate([
+        np.array([[int(c, 36) for c in lou[:4]] for lou in LOUS])[rng.integers(0, len(LOUS), n)],
+        np.zeros((n, 2), dtype=np.int64), rng.integers(0, 36, (n, 12))], axis=1)
+    repeated = np.flatnonzero(rng.random(n) < rates["duplicates"])
+    chars[repeated] = chars[rng.integers(0, np.maximum(repeated, 1))]
+    # ISO 7064 MOD 97-10 over the base with letters expanded to two digits
+    remainder = np.zeros(n, dtype=np.int64)
+    for column in chars.T:
+        remainder = (remainder * np.where(column < 10, 10, 100) + column) % 97
+    check = 98 - remainder * 100 % 97
+    alphabet = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    leis = np.strings.add(alphabet[chars].view("U18").ravel(), np.strings.zfill(check.astype("U2"), 2))
+
+    initial = np.datetime64("2012-06-01") + rng.integers(0, 4500, n).astype("timedelta64[D]")
+    renewal = today + rng.integers(1, 366, n).astype("timedelta64[D]")
+    expired = rng.random(n) < rates["expired"]
+    renewal[expired] = today - rng.integers(1, 1500, expired.sum()).astype("timedelta64[D]")
+    inverted = rng.random(n) < rates["inverted_dates"]
+    renewal[inverted] = initial[inverted] - rng.integers(1, 700, inverted.sum()).astype("timedelta64[D]")
+
+    countries = pick(COUNTRIES)
+    invalid = rng.random(n) < rates["invalid_countries"]
+    countries[invalid] = pick(INVALID_COUNTRIES, invalid.sum())
+    return pd.DataFrame({
+        "lei": leis,
+        "entity.legalName.name": missing(pd.Series(pick(WORDS) + " " + pick(WORDS) + " " + pick(SUFFIXES))),
+        "entity.legalAddress.addressLines.1": rng.integers(1, 999, n).astype("U3").astype(object) + " " + pick(WORDS) + " Street",
+        "entity.legalAddress.city": pick(WORDS) + "ville",
+        "entity.legalAddress.postalCode": np.strings.zfill(rng.integers(0, 99999, n).astype("U5"), 5),
+        "entity.legalAddress.country": countries,
+        "entity.jurisdiction": countries,
+        "registration.status": np.where(renewal >= today, "ISSUED", pick(["LAPSED", "ISSUED", "RETIRED"])),
+        "registration.managingLou": pick(LOUS),
+        "registration.initialRegistrationDate": missing(timestamps(initial)),
+        "registration.nextRenewalDate": missing(timestamps(renewal)),
+    })
@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from utils.db import get_engine
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """The Postgres engine of the POSTGRES_* variables; tests using it are skipped without one."""
+    engine = get_engine()
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("no Postgres database (POSTGRES_* variables)")
+    return engine
@@ -0,0 +1,106 @@
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.stub_api import StubLeiApi
+from utils.crawler import crawl_lei_records
+from utils.delta_sync import crawl_updated_records
+
+RECORDS = 45
+PAGE_SIZE = 10
+
+
+@pytest.fixture
+def api():
+    api = StubLeiApi(RECORDS)
+    server, api.url = api.serve()
+    yield api
+    server.shutdown()
+
+
+def _leis(batches):
+    return [item["id"] for batch in batches for item in batch]
+
+
+def test_crawl_walks_every_page_in_order(api):
+    leis = _leis(crawl_lei_records(api.url, page_size=PAGE_SIZE, workers=3))
+    assert leis == [api.records[i]["lei"] for i in api.order]
+    assert api.requests == 5
+
+
+@pytest.mark.parametrize("statuses", [[429], [500, 502, 503], [504, 429]])
+def test_crawl_retries_rate_limits_and_server_errors(api, statuses):
+    api.fail(*statuses)
+    leis = _leis(crawl_lei_records(api.url, page_size=PAGE_SIZE, workers=1, backoff=0))
+    assert len(leis) == RECORDS
+    assert api.requests == 5 + len(statuses)
+
+
+def test_crawl_gives_up_after_max_retries(api):
+    api.fail(503, 503, 503)
+    with pytest.raises(Exception, match="503"):
+        list(crawl_lei_records(api.url, page_size=PAGE_SIZE, max_retries=2, backoff=0))
+
+
+def test_crawl_does_not_retry_client_errors(api):
+    api.fail(404)
+    with pytest.raises(Exception, match="404"):
+        list(crawl_lei_records(api.url, page_size=PAGE_SIZE, backoff=0))
+    assert api.requests == 1
+
+
+def test_interrupted_crawl_resumes_from_cursor(api, tmp_path):
+    cursor = tmp_path / "cursor.json"
+    crawl = crawl_lei_records(api.url, page_size=PAGE_SIZE, workers=2, cursor_path=str(cursor))
+    first = [next(crawl), next(crawl)]
+    crawl.close()
+    # Only the first batch was finished when the crawl stopped
+    assert json.loads(cursor.read_text())["next_page"] == 2
+
+    rest = list(crawl_lei_records(api.url, page_size=PAGE_SIZE, workers=2, cursor_path=str(cursor)))
+    assert _leis(first[:1] + rest) == [api.records[i]["lei"] for i in api.order]
+    assert not cursor.exists()
+
+
+def test_cursor_of_other_params_is_ignored(api, tmp_path):
+    cursor = tmp_path / "cursor.json"
+    crawl = crawl_lei_records(api.url, page_size=PAGE_SIZE, cursor_path=str(cursor))
+    next(crawl), next(crawl)
+    crawl.close()
+
+    leis = _leis(crawl_lei_records(api.url, page_size=5, cursor_path=str(cursor)))
+    assert len(leis) == RECORDS
+
+
+def test_delta_crawl_keeps_every_record_updated_during_the_crawl(api):
+    since = pd.Timestamp(api.keys[0])
+    crawl = crawl_updated_records(since, api.url, page_size=PAGE_SIZE)
+    first = next(crawl)
+    # Updated records move to the end; page numbers would now skip as many records
+    changed = api.update(15)
+    leis = _leis([first] + list(crawl))
+    # Records updated after they were read come again, with their new version
+    assert set(leis) == {record["lei"] for record in api.records}
+    assert sorted(leis[-15:]) == sorted(changed)
+
+
+def test_delta_crawl_pages_through_records_of_one_date(api):
+    changed = api.update(25)
+    since = pd.Timestamp(api.keys[-1])
+    leis = _leis(crawl_updated_records(since, api.url, page_size=PAGE_SIZE))
+    assert sorted(leis) == sorted(changed)
+
+
+def test_delta_crawl_compares_dates_at_the_filter_precision():
+    api = StubLeiApi(RECORDS)
+    # Every record updated within the same second, milliseconds apart
+    for i, record in enumerate(api.records):
+        record["registration"]["lastUpdateDate"] = f"2024-01-01T10:00:00.{i * 20:03d}Z"
+    api._sort()
+    server, url = api.serve()
+    try:
+        leis = _leis(crawl_updated_records(pd.Timestamp(api.keys[0]), url, page_size=PAGE_SIZE))
+    finally:
+        server.shutdown()
+    assert sorted(leis) == sorted(record["lei"] for record in api.records)
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from benchmarks.synthetic import flattened_frame
+from tests.test_rules import LEIS, LEIS_VALID
+from utils.data_quality_checks import lei_valid, run_quality_checks
+from utils.db import quote
+from utils.db_quality import (QUALITY_REFRESH_TABLE, create_quality_view, fetch_quality_scores,
+                              quality_view_name, refresh_volatile_checks)
+from utils.near_duplicates import NEAR_DUPLICATES_TABLE
+from utils.rules import RULES, active_rules
+from utils.scoring import LABEL_BINS, LABELS, calculate_quality_score
+
+TABLE = "test_quality_parity"
+NAME = "entity.legalName.name"
+DATES = ["registration.initialRegistrationDate", "registration.nextRenewalDate"]
+
+
+@pytest.fixture
+def table(engine):
+    df = flattened_frame(3000, seed=1)
+    for col in DATES:
+        df[col] = pd.to_datetime(df[col], utc=True)
+    # Near-duplicates: copies under another LEI with one letter of the name changed
+    copies = df.iloc[:20].copy()
+    copies["lei"] = df["lei"].iloc[100:120].to_numpy()
+    copies[NAME] = copies[NAME].str.replace("a", "e", n=1)
+    # Malformed LEIs: a changed check digit, lower case, too short
+    df.loc[200, "lei"] = df.loc[200, "lei"][:-1] + str((int(df.loc[200, "lei"][-1]) + 1) % 10)
+    df.loc[201, "lei"] = df.loc[201, "lei"].lower()
+    df.loc[202, "lei"] = df.loc[202, "lei"][:19]
+    df.loc[203, "lei"] = None
+    df = pd.concat([df, copies], ignore_index=True)
+    df.to_sql(TABLE, engine, if_exists="replace", index=False)
+    yield df
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {NEAR_DUPLICATES_TABLE} WHERE table_oid = CAST(:table AS regclass)::oid"),
+                     {"table": TABLE})
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {quote(quality_view_name(TABLE))}"))
+        conn.execute(text(f"DROP TABLE {quote(TABLE)}"))
+
+
+def _outcomes(df):
+    columns = ["lei", NAME] + [r.name for r in active_rules()] + ["QualityScore"]
+    df = df[columns].astype({"lei": object, NAME: object})
+    return df.sort_values(columns).reset_index(drop=True)
+
+
+def test_quality_view_matches_the_pandas_engine(engine, table):
+    create_quality_view(TABLE, engine)
+    expected = _outcomes(calculate_quality_score(run_quality_checks(table.copy())))
+    actual = fetch_quality_scores(TABLE)
+    labels = pd.cut(actual["QualityScore"], bins=LABEL_BINS, labels=LABELS)
+    assert actual["QualityLabel"].astype(str).tolist() == labels.astype(str).tolist()
+    pd.testing.assert_frame_equal(_outcomes(actual), expected, check_dtype=False)
+    for r in active_rules():
+        assert not expected[r.name].all(), f"{r.name} passes every fixture record"
+
+
+def test_volatile_checks_are_refreshed_once_a_day(engine, table):
+    create_quality_view(TABLE, engine)
+    assert not refresh_volatile_checks(TABLE, engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {QUALITY_REFRESH_TABLE} SET refreshed_at = now() - interval '1 day' "
+                          f"WHERE table_name = :table"), {"table": TABLE})
+    assert refresh_volatile_checks(TABLE, engine)
+    assert not refresh_volatile_checks(TABLE, engine)
+
+
+def test_lei_check_sql_agrees_with_python(engine):
+    leis = LEIS + flattened_frame(2000, seed=4)["lei"].str.replace("0", "1", n=1).tolist()
+    sql = RULES["ValidLEI"].sql(lambda name: f"t.{quote(name)}")
+    with engine.connect() as conn:
+        actual = conn.execute(text(f"SELECT {sql} FROM unnest(CAST(:leis AS TEXT[])) WITH ORDINALITY "
+                                   f"AS t(lei, i) ORDER BY i"), {"leis": leis}).scalars().all()
+    assert actual == lei_valid(pd.Series(leis, dtype=object)).tolist()
+    assert actual[:len(LEIS)] == LEIS_VALID
+    assert 0 < sum(actual) < len(actual)
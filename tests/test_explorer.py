@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from utils.db import quote
+from utils.db_quality import create_quality_view, quality_view_name
+from utils.explorer import FramePager, ViewPager, page_keys
+
+TABLE = "test_explorer_pages"
+RECORDS = 157
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "lei": [f"LEI{i:05d}" for i in rng.permutation(RECORDS)],
+        "entity.legalName.name": "Name",
+        "entity.legalAddress.country": rng.choice(["DE", "FR"], RECORDS),
+        # Few distinct scores, so most pages start and end inside a tie
+        "QualityScore": rng.choice([40, 85, 100], RECORDS),
+    })
+    # Missing and repeated LEIs tie on the whole (score, lei) key
+    df.loc[:11, "lei"] = None
+    df.loc[:11, "QualityScore"] = 40
+    df.loc[12:19, "lei"] = "LEI00001"
+    df.loc[12:19, "QualityScore"] = 85
+    df["QualityLabel"] = np.where(df["QualityScore"] > 80, "Good", "Poor")
+    return df
+
+
+def _walk(pager, page_size, descending):
+    """Keys of every record, reading forwards to the end and then backwards to the start."""
+    forward, cursor = [], {}
+    while not (page := pager.page(page_size=page_size, descending=descending, **cursor)).empty:
+        forward.append(page)
+        cursor = {"after": page_keys(page)[1]}
+    backward, cursor = [], {"before": page_keys(forward[-1])[0]}
+    while not (page := pager.page(page_size=page_size, descending=descending, **cursor)).empty:
+        backward.insert(0, page)
+        cursor = {"before": page_keys(page)[0]}
+    keys = [list(map(_key, page["QualityScore"], page["lei"], page.index)) for page in forward]
+    back = [list(map(_key, page["QualityScore"], page["lei"], page.index)) for page in backward]
+    return [key for page in keys for key in page], [key for page in back + keys[-1:] for key in page]
+
+
+def _check_pages(pager, expected):
+    for descending in (False, True):
+        for page_size in (1, 7, 10):
+            forward, backward = _walk(pager, page_size, descending)
+            order = sorted(expected, reverse=descending)
+            assert forward == order
+            assert backward == order
+
+
+def _key(score, lei, row):
+    return int(score), "" if pd.isna(lei) else lei, int(row)
+
+
+def test_frame_pager_has_no_gaps_or_repeats_on_tied_keys():
+    df = _frame()
+    pager = FramePager(df)
+    expected = list(map(_key, df["QualityScore"], df["lei"], range(len(df))))
+    _check_pages(pager, expected)
+    mask = (df["entity.legalAddress.country"] == "DE") & (df["QualityLabel"] == "Good")
+    _check_pages(pager.filter(countries=["DE"], labels=["Good"]),
+                 [key for key, keep in zip(expected, mask) if keep])
+
+
+@pytest.fixture
+def view(engine):
+    # The view scores the records itself; missing and repeated LEIs still tie
+    _frame().drop(columns=["QualityScore", "QualityLabel"]).to_sql(TABLE, engine, if_exists="replace", index=False)
+    create_quality_view(TABLE, engine)
+    yield
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {quote(quality_view_name(TABLE))}"))
+        conn.execute(text(f"DROP TABLE {quote(TABLE)}"))
+
+
+def test_view_pager_has_no_gaps_or_repeats_on_tied_keys(engine, view):
+    with engine.connect() as conn:
+        rows = pd.read_sql_query(text(f'SELECT "QualityScore", lei, row_id FROM {quote(quality_view_name(TABLE))}'),
+                                 conn)
+    expected = list(map(_key, rows["QualityScore"], rows["lei"], rows["row_id"]))
+    assert len(set(key[:2] for key in expected)) < len(expected)
+    _check_pages(ViewPager(TABLE), expected)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import flattened_frame
+from utils.history import daily_aggregates, latest_scores, record_history, score_trend
+
+COUNTRY = "entity.legalAddress.country"
+
+
+def _scored(n, seed):
+    df = flattened_frame(n, seed, rates={"duplicates": 0})
+    df["QualityScore"] = np.random.default_rng(seed).choice([40, 70, 85, 100], n)
+    return df
+
+
+def _rescored(df, seed, share=0.2):
+    df = df.copy()
+    rows = np.random.default_rng(seed).random(len(df)) < share
+    df.loc[rows, "QualityScore"] = 100 - df.loc[rows, "QualityScore"]
+    return df
+
+
+def _model_aggregates(live):
+    """Counts and score sums of the LEIs in `live` ({lei: (score, country)})."""
+    versions = pd.DataFrame(list(live.values()), columns=["score", "country"])
+    total = {"": (len(versions), int(versions["score"].sum()))}
+    by_country = {country: (len(group), int(group["score"].sum())) for country, group in versions.groupby("country")}
+    return total, by_country
+
+
+def _recorded(history_dir, day, dimension):
+    daily = daily_aggregates("test", dimension, history_dir)
+    daily = daily[daily["date"] == pd.Timestamp(day)]
+    return {value: (int(records), int(score_sum))
+            for value, records, score_sum in daily[["value", "records", "score_sum"]].itertuples(index=False)}
+
+
+def test_trend_aggregates_follow_repeated_days_filtered_runs_and_retired_leis(tmp_path):
+    history_dir = str(tmp_path)
+    base = _scored(600, 0)
+    extra = _scored(100, 1)
+    germany = base[COUNTRY] == "DE"
+    runs = [
+        ("2026-01-01", base, True),
+        # Again on the same day: that day's aggregates are replaced, not added to
+        ("2026-01-01", _rescored(base, 1), True),
+        # A filtered run only updates the records it scored
+        ("2026-01-02", _rescored(base[germany], 2, share=0.5), False),
+        # A complete run retires the LEIs it no longer holds and adds new ones
+        ("2026-01-03", pd.concat([base.iloc[100:], extra], ignore_index=True), True),
+        ("2026-01-03", pd.concat([base.iloc[150:], extra], ignore_index=True), True),
+        # Retired LEIs come back, and a day without changes still gets its point
+        ("2026-01-04", pd.concat([base.iloc[:50], base.iloc[150:], extra], ignore_index=True), True),
+        ("2026-01-05", pd.concat([base.iloc[:50], base.iloc[150:], extra], ignore_index=True), True),
+    ]
+    live, expected = {}, {}
+    for day, df, complete in runs:
+        record_history(df, "test", day=day, history_dir=history_dir, complete=complete)
+        scored = {lei: (score, country) for lei, score, country in zip(df["lei"], df["QualityScore"], df[COUNTRY])}
+        live = scored if complete else dict(live, **scored)
+        expected[day] = _model_aggregates(live)
+        assert len(latest_scores("test", history_dir)) == len(live)
+
+    # Later runs leave the earlier days as they were
+    for day, (total, by_country) in expected.items():
+        assert _recorded(history_dir, day, "all") == total
+        assert _recorded(history_dir, day, "country") == by_country
+
+    trend = score_trend("test", history_dir=history_dir)
+    assert trend["date"].dt.strftime("%Y-%m-%d").tolist() == list(expected)
+    averages = [total[""][1] / total[""][0] for total, _ in expected.values()]
+    assert np.allclose(trend["avg_score"], averages)
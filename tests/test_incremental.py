@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import flattened_frame
+from utils.data_quality_checks import run_quality_checks
+from utils.incremental import run_incremental_checks
+from utils.rules import active_rules
+
+NAME = "entity.legalName.name"
+POSTAL_CODE = "entity.legalAddress.postalCode"
+
+
+def _records():
+    df = flattened_frame(4000, seed=2)
+    # Near-duplicates under other LEIs, so NoNearDuplicate fails some blocks
+    copies = df.iloc[:200].copy()
+    copies["lei"] = flattened_frame(200, seed=5)["lei"].to_numpy()
+    copies[NAME] = copies[NAME].str.replace("a", "e", n=1)
+    return pd.concat([df, copies], ignore_index=True)
+
+
+def _edits(df):
+    rng = np.random.default_rng(0)
+    renamed = df.copy()
+    rows = rng.choice(len(df), 300, replace=False)
+    renamed.loc[rows, NAME] = renamed.loc[rows, NAME].fillna("") + " Holding"
+    moved = renamed.copy()
+    # Records moving between blocks, one of them onto its near-duplicate's block
+    moved.loc[:50, POSTAL_CODE] = moved.loc[50:100, POSTAL_CODE].to_numpy()
+    removed = moved.drop(index=rng.choice(len(df), 400, replace=False)).reset_index(drop=True)
+    added = pd.concat([removed, flattened_frame(300, seed=6), df.iloc[4000:4050]], ignore_index=True)
+    shuffled = added.sample(frac=1, random_state=0).reset_index(drop=True)
+    return [("unchanged", df), ("renamed", renamed), ("moved", moved), ("removed", removed),
+            ("added", added), ("shuffled", shuffled), ("original", df)]
+
+
+@pytest.mark.parametrize("filtered", [False, True])
+def test_incremental_checks_match_a_full_run_after_changes_and_removals(tmp_path, filtered):
+    store = str(tmp_path / "results.parquet")
+    df = _records()
+    run_incremental_checks(df.copy(), store)
+    for label, frame in _edits(df):
+        if filtered:
+            # A filtered run leaves the stored results of the other records alone
+            frame = frame[frame["entity.legalAddress.country"] != "DE"].reset_index(drop=True)
+        expected = run_quality_checks(frame.copy())
+        actual = run_incremental_checks(frame.copy(), store)
+        for r in active_rules():
+            assert np.array_equal(actual[r.name].to_numpy(), expected[r.name].to_numpy()), (label, r.name)
+        assert not expected["NoNearDuplicate"].all()
+
+
+def test_incremental_checks_start_over_from_an_empty_store(tmp_path):
+    store = str(tmp_path / "results.parquet")
+    run_incremental_checks(_records().iloc[:0].copy(), store)
+    df = _records()
+    expected = run_quality_checks(df.copy())
+    actual = run_incremental_checks(df.copy(), store)
+    for r in active_rules():
+        assert np.array_equal(actual[r.name].to_numpy(), expected[r.name].to_numpy()), r.name
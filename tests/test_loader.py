@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from utils.db import quote
+from utils.loader import DATA_VERSION_TABLE, copy_upsert
+
+TABLE = "test_loader"
+NAME = "entity.legalName.name"
+
+
+@pytest.fixture
+def table(engine):
+    yield TABLE
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(TABLE)}"))
+        conn.execute(text(f"DELETE FROM {DATA_VERSION_TABLE} WHERE table_name = :table"), {"table": TABLE})
+
+
+def test_copy_keeps_text_that_looks_like_null(engine, table):
+    names = ["\\N", "", None, 'Quote "A", comma', "Two\nlines", "Back\\slash"]
+    df = pd.DataFrame({"lei": [f"LEI{i}" for i in range(len(names))], NAME: names,
+                       "registration.nextRenewalDate": pd.to_datetime(["2030-01-01", None] * 3, utc=True)})
+    assert copy_upsert(df, engine, table)["inserted"] == len(names)
+    actual = pd.read_sql(f"SELECT * FROM {quote(table)} ORDER BY lei", engine)
+    assert [None if pd.isna(name) else name for name in actual[NAME]] == names
+    assert actual["registration.nextRenewalDate"].isna().tolist() == [False, True] * 3
+
+
+def test_tables_repeating_leis_are_reported(engine, table):
+    pd.DataFrame({"lei": ["A", "A", "B", None, None], NAME: list("vwxyz")}).to_sql(table, engine, index=False)
+    with pytest.raises(ValueError, match=r"repeats 1 LEIs \(e\.g\. A\)"):
+        copy_upsert(pd.DataFrame({"lei": ["C"], NAME: ["c"]}), engine, table)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {quote(table)} WHERE lei = 'A' AND {quote(NAME)} = 'v'"))
+    assert copy_upsert(pd.DataFrame({"lei": ["C"], NAME: ["c"]}), engine, table)["inserted"] == 1
@@ -0,0 +1,74 @@
+import io
+
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.synthetic import flattened_frame
+from utils.compact import read_compact_csv
+from utils.data_quality_checks import REQUIRED_COLUMNS, lei_valid, run_quality_checks
+
+
+def _frame(**columns):
+    df = pd.DataFrame({col: ["5493001KJTIIGC8Y1R12"] if col == "lei" else ["DE"] for col in REQUIRED_COLUMNS})
+    df["registration.initialRegistrationDate"] = ["2020-01-01T00:00:00Z"]
+    df["registration.nextRenewalDate"] = ["2099-01-01T00:00:00Z"]
+    for col, values in columns.items():
+        df[col] = values
+    return df
+
+
+def test_completeness_counts_present_but_malformed_dates():
+    df = run_quality_checks(_frame(**{"registration.initialRegistrationDate": ["01/13/2020 ???"]}))
+    assert df["Completeness"].tolist() == [True]
+    assert df["DateConsistent"].tolist() == [False]
+
+
+def test_completeness_fails_missing_fields():
+    df = run_quality_checks(_frame(**{"registration.nextRenewalDate": [None]}))
+    assert df["Completeness"].tolist() == [False]
+
+
+def test_compact_uploads_keep_malformed_dates_present():
+    csv = ",".join(REQUIRED_COLUMNS) + "\n"
+    csv += "5493001KJTIIGC8Y1R12,A,DE,2020-01-01T00:00:00Z,2099-01-01T00:00:00Z\n"
+    csv += "5493001KJTIIGC8Y1R12,B,DE,garbage,2099-01-01T00:00:00Z\n"
+    df, _ = read_compact_csv(io.StringIO(csv), chunk_rows=1)
+    df = run_quality_checks(df)
+    assert df["Completeness"].tolist() == [True, True]
+    assert df["DateConsistent"].tolist() == [True, False]
+
+
+# Check digits of the first two verified with a big-integer MOD 97-10
+LEIS = ["5493001KJTIIGC8Y1R12", "529900T8BM49AURSDO55", "5493001KJTIIGC8Y1R13", "5493001kjtiigc8y1r12",
+        "5493001KJTIIGC8Y1RÉ", "5493001KJTIIGC8Y1R1", "5493001KJTIIGC8Y1R123", None, ""]
+LEIS_VALID = [True, True, False, False, False, False, False, False, False]
+
+
+def _lei_valid_python(lei):
+    if not isinstance(lei, str) or len(lei) != 20 or not lei.isascii() or not lei.isalnum() or lei != lei.upper():
+        return False
+    return lei[18:].isdigit() and int("".join(str(int(c, 36)) for c in lei)) % 97 == 1
+
+
+def test_lei_valid_check_digits_and_format():
+    assert [_lei_valid_python(lei) for lei in LEIS] == LEIS_VALID
+    assert lei_valid(pd.Series(LEIS, dtype=object)).tolist() == LEIS_VALID
+    assert lei_valid(pa.array(LEIS)).tolist() == LEIS_VALID
+
+
+def test_lei_valid_reads_arrow_and_categorical_columns():
+    for dtype in ["string[pyarrow]", "str", "category"]:
+        assert lei_valid(pd.Series(LEIS, dtype=dtype)).tolist() == LEIS_VALID
+    # Offsets of a slice, and the chunks of a chunked array
+    assert lei_valid(pa.array(LEIS).slice(1, 3)).tolist() == LEIS_VALID[1:4]
+    assert lei_valid(pa.chunked_array([LEIS[:4], LEIS[4:]])).tolist() == LEIS_VALID
+
+
+def test_lei_valid_agrees_with_a_big_integer_check():
+    df = flattened_frame(5000, seed=3)
+    leis = df["lei"].copy()
+    # Every other LEI gets a changed character
+    leis[::2] = [lei[:7] + ("A" if lei[7] != "A" else "B") + lei[8:] for lei in leis[::2]]
+    expected = [_lei_valid_python(lei) for lei in leis]
+    assert lei_valid(leis).tolist() == expected
+    assert 0 < sum(expected) < len(expected)
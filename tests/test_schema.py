@@ -0,0 +1,22 @@
+import pytest
+
+from utils.schema import classify_path
+
+
+@pytest.mark.parametrize("path, kind", [
+    ("entity.legalAddress.country", "code"),
+    ("entity.otherAddresses.0.country", "code"),
+    ("entity.otherNames.1.language", "code"),
+    ("entity.legalForm.id", "code"),
+    ("entity.otherNames.0.type", "list_position"),
+    ("entity.legalAddress.addressLines.1", "list_position"),
+    ("entity.associatedEntity.name", "text"),
+    ("entity.registeredAs", "text"),
+    ("registration.otherValidationAuthorities.0.validationAuthorityID", "list_position"),
+    ("entity.expiration.reason", "code"),
+    ("entity.eventGroups.0.events.1.reason", "list_position"),
+    ("registration.nextRenewalDate", "timestamp"),
+    ("entity.eventGroups.0.events.1.effectiveDate", "timestamp"),
+])
+def test_classify_path(path, kind):
+    assert classify_path(path) == kind
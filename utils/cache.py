@@ -0,0 +1,141 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+
+from utils.db import get_engine, quote
+from utils.loader import DATA_VERSION_TABLE
+from utils.rules import rules_fingerprint
+from utils.tracing import span, traced
+
+CACHE_DIR = os.environ.get("LEI_CACHE_DIR", ".lei_cache")
+CACHE_MAX_BYTES = int(os.environ.get("LEI_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+def data_version(table_name='test', engine=None):
+    """
+    Load watermark of `table_name`: the version advanced by every load and view refresh,
+    or the row count for tables that were never loaded through the loaders.
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:table)"), {"table": DATA_VERSION_TABLE}).scalar():
+            version = conn.execute(
+                text(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE table_name = :table"),
+                {"table": table_name},
+            ).scalar()
+            if version is not None:
+                return f"v{version}"
+        count = conn.execute(text(f"SELECT count(*) FROM {quote(table_name)}")).scalar()
+    return f"rows{count}"
+
+
+def snapshot_key(**parts):
+    """
+    Cache key of a scored frame described by `parts` (source, data version, filters...),
+    combined with the rules fingerprint and today's date, which the expiry check depends on.
+    """
+    parts = dict(parts, rules=rules_fingerprint(), day=pd.Timestamp.today(tz="utc").date().isoformat())
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _snapshot_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.arrow")
+
+
+def read_arrow_file(path):
+    """The Arrow table in the IPC file at `path`, read through a memory map, or None."""
+    try:
+        source = pa.memory_map(path)
+    except FileNotFoundError:
+        return None
+    with source:
+        table = pa.ipc.open_file(source).read_all()
+    # The modification time orders cache files for eviction, least recently used first
+    os.utime(path)
+    return table
+
+
+def chunk_schema(df):
+    """
+    Arrow schema of `df`, the first of a sequence of chunks written to one file. Columns that
+    are empty in the first chunk are typed as strings for the rest.
+    """
+    schema = pa.Table.from_pandas(df, preserve_index=False).schema
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                      for field in schema])
+
+
+def write_arrow_file(table, path):
+    """
+    Write `table` to `path` as an Arrow IPC file. It is written under a unique name and
+    renamed, so readers in other processes never see a partial file.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+@traced()
+def load_snapshot(key, cache_dir=CACHE_DIR):
+    """The frame stored under `key`, or None."""
+    table = read_arrow_file(_snapshot_path(key, cache_dir))
+    return None if table is None else table.to_pandas()
+
+
+@traced()
+def save_snapshot(key, df, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Store `df` under `key` as an Arrow IPC file, then evict the least recently used snapshots
+    beyond `max_bytes`. Returns False for frames Arrow cannot represent, which are not cached.
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return False
+
+    write_arrow_file(table, _snapshot_path(key, cache_dir))
+    evict_snapshots(cache_dir, max_bytes)
+    return True
+
+
+def evict_snapshots(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Delete the least recently used cache files until the cache fits in `max_bytes`."""
+    snapshots = []
+    for path in glob.glob(os.path.join(cache_dir, "*")):
+        if path.endswith(".tmp"):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        snapshots.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in snapshots)
+    for _, size, path in sorted(snapshots):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached_snapshot(key, compute, cache_dir=CACHE_DIR):
+    """The snapshot stored under `key`, computed with `compute()` and stored on a miss."""
+    with span("cached_snapshot", key=key) as current:
+        df = load_snapshot(key, cache_dir)
+        current.set(hit=df is not None)
+        if df is None:
+            df = compute()
+            save_snapshot(key, df, cache_dir)
+    return df
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+MAX_OUTLIERS = 100
+SAMPLE_POINTS = 1000
+
+
+def histogram_bins(distribution, bins=20, value_range=(0, 100)):
+    """
+    Counts of `bins` equal-width bins over `value_range`, from a value -> count Series such as
+    rollup.score_distribution. The last bin is closed on the right, like numpy.histogram.
+    """
+    edges = np.linspace(value_range[0], value_range[1], bins + 1)
+    counts, _ = np.histogram(distribution.index.to_numpy(dtype=float), bins=edges,
+                             weights=distribution.to_numpy(dtype=float))
+    return pd.DataFrame({"start": edges[:-1], "end": edges[1:], "count": counts.astype(np.int64)})
+
+
+def _quantile(values, ends, total, q):
+    """Linearly interpolated quantile `q` of the sorted `values` repeated by their counts."""
+    position = q * (total - 1)
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    below, above = values[np.searchsorted(ends, [lower, upper], side="right")]
+    return below + (above - below) * (position - lower)
+
+
+def box_stats(distribution, max_outliers=MAX_OUTLIERS, seed=0):
+    """
+    Box plot statistics of a value -> count Series: quartiles, mean, Tukey whiskers (the most
+    extreme values within 1.5 IQR of the box) and at most `max_outliers` sampled outliers.
+    None for an empty distribution.
+    """
+    distribution = distribution[distribution > 0].sort_index()
+    total = int(distribution.sum())
+    if not total:
+        return None
+    values = distribution.index.to_numpy(dtype=float)
+    counts = distribution.to_numpy()
+    ends = np.cumsum(counts)
+
+    q1, median, q3 = (_quantile(values, ends, total, q) for q in (0.25, 0.5, 0.75))
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = (values >= low) & (values <= high)
+    outside = ~inside
+
+    # Outliers repeat their value once per record; sample them down to the cap
+    outliers = np.repeat(values[outside], counts[outside])
+    if len(outliers) > max_outliers:
+        outliers = np.sort(np.random.default_rng(seed).choice(outliers, max_outliers, replace=False))
+    return {
+        "q1": q1, "median": median, "q3": q3,
+        "mean": float((values * counts).sum() / total),
+        "lowerfence": values[inside].min(), "upperfence": values[inside].max(),
+        "outliers": outliers, "records": total,
+    }
+
+
+class Reservoir:
+    """
+    Uniform sample of at most `size` values from a stream of arrays (Algorithm R), so a
+    points overlay stays the same size whatever the number of records.
+    """
+
+    def __init__(self, size=SAMPLE_POINTS, seed=0):
+        self.size = size
+        self.values = None
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        values = np.asarray(values)
+        if self.values is None:
+            self.values = values[:0].copy()
+        # Fill the reservoir first
+        room = max(self.size - len(self.values), 0)
+        if room:
+            self.values = np.concatenate([self.values, values[:room]])
+            self.seen += min(room, len(values))
+            values = values[room:]
+        if len(values):
+            # The t-th value replaces a random slot with probability size / t
+            slots = self.rng.integers(0, self.seen + np.arange(1, len(values) + 1))
+            keep = slots < self.size
+            self.values[slots[keep]] = values[keep]
+            self.seen += len(values)
+        return self
+
+    def sample(self):
+        return self.values if self.values is not None else np.array([])
+
+
+def sample_points(series, size=SAMPLE_POINTS, chunk_rows=100000, seed=0):
+    """Reservoir sample of at most `size` non-null values of `series`."""
+    reservoir = Reservoir(size, seed)
+    for start in range(0, len(series), chunk_rows):
+        reservoir.add(series.iloc[start:start + chunk_rows].dropna().to_numpy())
+    return reservoir.sample()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from utils.schema import PANDAS_DTYPES, classify_path
+from utils.tracing import traced
+from utils.utils import _concat_chunks
+
+COMPACT_CHUNK_ROWS = 100000
+
+
+def compact_frame(df, schema=None):
+    """
+    `df` with every column in its compact dtype: categoricals for codes, Arrow strings for
+    text and UTC timestamps for dates. A date column with values that do not parse stays text,
+    so those values still count as present; the checks parse it themselves.
+    `schema` ({path: kind}) defaults to the kinds inferred from the column names.
+    """
+    columns = {}
+    for col in df.columns:
+        kind = (schema or {}).get(col) or classify_path(col)
+        series = df[col]
+        if kind == "timestamp":
+            parsed = pd.to_datetime(series, utc=True, errors="coerce")
+            malformed = parsed.isna().to_numpy() & series.notna().to_numpy()
+            columns[col] = series.astype(PANDAS_DTYPES["text"]) if malformed.any() else parsed
+        elif series.dtype != PANDAS_DTYPES[kind]:
+            columns[col] = series.astype(PANDAS_DTYPES[kind])
+        else:
+            columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def split_list_fields(df, keep=()):
+    """
+    Move the list position columns of `df` (`otherNames.N`, `addressLines.N`, ...) except
+    `keep` into a side table with one row per non-null value: (row label, field, value).
+    Returns the narrowed frame and the side table.
+    """
+    keep = set(keep)
+    fields = [col for col in df.columns if col not in keep and classify_path(col) == "list_position"]
+    rows, names, values = [], [], []
+    for i, col in enumerate(fields):
+        present = df[col].notna().to_numpy()
+        rows.append(df.index.to_numpy()[present])
+        names.append(np.full(present.sum(), i, dtype=np.int32))
+        values.append(df[col].to_numpy(dtype=object)[present])
+    side = pd.DataFrame({
+        "row": np.concatenate(rows) if rows else np.array([], dtype=np.int64),
+        "field": pd.Categorical.from_codes(np.concatenate(names) if names else np.array([], dtype=np.int32),
+                                           categories=fields),
+        "value": pd.array(np.concatenate(values) if values else [], dtype=PANDAS_DTYPES["list_position"]),
+    })
+    return df.drop(columns=fields), side
+
+
+def join_list_fields(df, side, columns=None):
+    """`df` with its list fields joined back from the side table, limited to `columns` if given."""
+    if side is None or not len(side):
+        return df if columns is None else df.reindex(columns=list(columns))
+    entries = side[side["row"].isin(df.index)]
+    fields = list(side["field"].cat.categories)
+    if columns is not None:
+        fields = [field for field in fields if field in set(columns)]
+        entries = entries[entries["field"].isin(fields)]
+    wide = entries.pivot(index="row", columns="field", values="value").reindex(index=df.index, columns=fields)
+    joined = pd.concat([df, wide.astype(PANDAS_DTYPES["list_position"])], axis=1)
+    return joined if columns is None else joined.reindex(columns=list(columns))
+
+
+@traced()
+def read_compact_csv(stream, keep=(), chunk_rows=COMPACT_CHUNK_ROWS):
+    """
+    Read a flattened CSV in chunks of `chunk_rows` records, compacting each chunk before the
+    next is read, so the object columns of the whole file are never held at once. List
+    fields other than `keep` go to a side table. Returns the frame and the side table.
+    """
+    frames, sides = [], []
+    for chunk in pd.read_csv(stream, dtype=str, chunksize=chunk_rows):
+        frame, side = split_list_fields(compact_frame(chunk), keep)
+        frames.append(frame)
+        sides.append(side)
+    if not frames:
+        return pd.DataFrame(), None
+    # Every chunk has the file's columns; only the categories of their codes differ
+    df = _concat_chunks(frames)
+    # A date column kept as text in some chunks is text in all of them
+    mixed = [col for col in df.columns if df[col].dtype == object]
+    return df.astype({col: PANDAS_DTYPES["text"] for col in mixed}), _concat_chunks(sides)
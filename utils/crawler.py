@@ -0,0 +1,157 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GLEIF_API_URL = "https://api.gleif.org/api/v1/lei-records"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` of them start per second, across threads."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(workers=4):
+    """Keep-alive session whose connection pool is large enough for every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept": "application/vnd.api+json"})
+    return session
+
+
+def load_cursor(path, params):
+    """Return the next page to fetch from a persisted cursor, or 1 if there is none."""
+    if not path or not os.path.exists(path):
+        return 1
+    with open(path) as f:
+        cursor = json.load(f)
+    # A cursor written for another page size or filter would skip records
+    if cursor.get("params") != params:
+        return 1
+    return cursor["next_page"]
+
+
+def save_cursor(path, params, next_page, last_page):
+    """Atomically persist the crawl position."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"params": params, "next_page": next_page, "last_page": last_page}, f)
+    os.replace(tmp_path, path)
+
+
+def get_page(session, url, params, limiter=None, max_retries=5, backoff=0.5, timeout=30):
+    """
+    GET one page, retrying 429/5xx responses and connection errors with exponential backoff.
+    A `Retry-After` header from the server takes precedence over the computed delay.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.wait()
+
+        retry_after = None
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+        else:
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                raise Exception(f"GLEIF API error: {response.status_code}")
+            retry_after = response.headers.get("Retry-After")
+
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = backoff * 2 ** attempt * (1 + random.random())
+        time.sleep(delay)
+
+
+def crawl_lei_records(base_url=GLEIF_API_URL, page_size=200, workers=4, params=None,
+                      cursor_path=None, max_pages=None, requests_per_second=None,
+                      batch_pages=1, max_retries=5, backoff=0.5, timeout=30, session=None):
+    """
+    Walk every page of the lei-records endpoint with a bounded pool of workers.
+
+    Yields the `data` items of `batch_pages` consecutive pages at a time, in page order. At
+    most `2 * workers` pages are in flight or buffered at any time. When `cursor_path` is
+    given, the next unfinished page is persisted once the consumer is done with a batch, so an
+    interrupted crawl resumes where it stopped; the cursor is removed when the crawl completes.
+    """
+    params = dict(params or {})
+    params["page[size]"] = page_size
+    cursor_params = {k: str(v) for k, v in sorted(params.items())}
+
+    session = session or make_session(workers)
+    limiter = RateLimiter(requests_per_second)
+    start = load_cursor(cursor_path, cursor_params)
+
+    def fetch(page_number):
+        page_params = dict(params, **{"page[number]": page_number})
+        return get_page(session, base_url, page_params, limiter, max_retries, backoff, timeout)
+
+    # The first page tells us how many pages there are
+    first = fetch(start)
+    total_pages = first.get("meta", {}).get("pagination", {}).get("lastPage", start)
+    last_page = total_pages
+    if max_pages is not None:
+        last_page = min(total_pages, start + max_pages - 1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        next_page = start + 1
+
+        def fill():
+            nonlocal next_page
+            while next_page <= last_page and len(pending) < 2 * workers:
+                pending.append((next_page, pool.submit(fetch, next_page)))
+                next_page += 1
+
+        fill()
+        page_number, batch = start, list(first["data"])
+        try:
+            while True:
+                if pending and (page_number - start + 1) % batch_pages:
+                    page_number, future = pending.popleft()
+                    batch.extend(future.result()["data"])
+                    fill()
+                    continue
+
+                yield batch
+                if cursor_path:
+                    save_cursor(cursor_path, cursor_params, page_number + 1, last_page)
+                if not pending:
+                    break
+                page_number, future = pending.popleft()
+                batch = list(future.result()["data"])
+                fill()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    if cursor_path and last_page >= total_pages and os.path.exists(cursor_path):
+        os.remove(cursor_path)
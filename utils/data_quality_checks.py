@@ -1,34 +1,145 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import pycountry
 
-def check_completeness(df):
+from utils.rules import evaluate_rules, isin_codes, rule
+from utils.tracing import traced
+
+REQUIRED_COLUMNS = ["lei", "entity.legalName.name", "entity.legalAddress.country", "registration.initialRegistrationDate", "registration.nextRenewalDate"]
+VALID_COUNTRIES = frozenset(c.alpha_2 for c in pycountry.countries)
+VALID_COUNTRIES_TABLE = "lei_valid_countries"
+LEI_BLOCK_ROWS = 65536
+
+def _lei_pair_tables():
+    """
+    Tables indexed by two LEI bytes read as one uint16: the pair's digits modulo 97 (-1 if
+    either byte is not a digit or upper-case letter), 10 to the number of digits modulo 97, and
+    whether both bytes are digits. In ISO 7064 MOD 97-10 a letter stands for two digits (A=10).
+    """
+    values = np.full(256, -1, dtype=np.int64)
+    values[np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype=np.uint8)] = np.arange(36)
+    pairs = np.arange(2 ** 16, dtype=np.uint16).view(np.uint8).reshape(-1, 2)
+    first, second = values[pairs[:, 0]], values[pairs[:, 1]]
+    digits = np.where(first < 10, 1, 2) + np.where(second < 10, 1, 2)
+    valid = (first >= 0) & (second >= 0)
+    remainder = np.where(valid, (first * 10 ** np.where(second < 10, 1, 2) + second) % 97, -1)
+    return (remainder.astype(np.int16), (10 ** digits % 97).astype(np.int16),
+            valid & (first < 10) & (second < 10))
+
+LEI_PAIR_REMAINDER, LEI_PAIR_SHIFT, LEI_PAIR_DIGITS = _lei_pair_tables()
+
+# Raw columns: a date that is present but does not parse still counts as present
+@rule("Completeness", inputs=REQUIRED_COLUMNS, raw=True,
+      sql=lambda col: " AND ".join(f"{col(name)} IS NOT NULL" for name in REQUIRED_COLUMNS))
+def check_completeness(inputs):
     """Check if required fields are present and not null."""
-    required_columns = ["lei", "entity.legalName.name", "entity.legalAddress.country", "registration.initialRegistrationDate", "registration.nextRenewalDate"]
-    completeness = df[required_columns].notnull().all(axis=1)
-    return completeness
+    return np.logical_and.reduce([inputs[col].notna().to_numpy() for col in REQUIRED_COLUMNS])
 
-def check_country_validity(df):
+@rule("CountryValid", inputs=["entity.legalAddress.country"],
+      sql=lambda col: f"COALESCE({col('entity.legalAddress.country')} IN "
+                      f"(SELECT code FROM {VALID_COUNTRIES_TABLE}), false)")
+def check_country_validity(inputs):
     """Check if country codes are valid ISO alpha-2 codes."""
-    valid_countries = {c.alpha_2 for c in pycountry.countries}
-    return df["entity.legalAddress.country"].apply(lambda x: x in valid_countries)
+    return isin_codes(inputs["entity.legalAddress.country"], VALID_COUNTRIES)
 
-def check_date_consistency(df):
+@rule("DateConsistent", inputs=["registration.initialRegistrationDate", "registration.nextRenewalDate"],
+      sql=lambda col: f"COALESCE({col('registration.nextRenewalDate')}::TIMESTAMPTZ > "
+                      f"{col('registration.initialRegistrationDate')}::TIMESTAMPTZ, false)")
+def check_date_consistency(inputs):
     """Check if expiration date is after registration date."""
-    df["registration.initialRegistrationDate"] = pd.to_datetime(df["registration.initialRegistrationDate"])
-    df["registration.nextRenewalDate"] = pd.to_datetime(df["registration.nextRenewalDate"])
-    return df["registration.nextRenewalDate"] > df["registration.initialRegistrationDate"]
+    return (inputs["registration.nextRenewalDate"] > inputs["registration.initialRegistrationDate"]).to_numpy()
+
+def _lei_keys(inputs):
+    """64-bit hash of every LEI, the partial result of one shard for UniqueLEI."""
+    return pd.util.hash_pandas_object(inputs["lei"], index=False, categorize=False).to_numpy()
+
+def _first_lei_occurrence(partials, df):
+    """UniqueLEI over all shards: first occurrence of each LEI hash, shards taken in order."""
+    keys = pd.Series(np.concatenate(partials))
+    unique = ~keys.duplicated().to_numpy()
+    # A repeated hash is only a duplicate if its LEI equals the first one seen with that hash
+    # Only those LEIs are read, so `df` can be backed by a memory-mapped file
+    first = keys[unique]
+    repeated = np.flatnonzero(~unique)
+    first_positions = first.index.to_numpy()[pd.Index(first.to_numpy()).get_indexer(keys.to_numpy()[repeated])]
+    leis = df["lei"]
+    if not leis.take(repeated).reset_index(drop=True).equals(leis.take(first_positions).reset_index(drop=True)):
+        # Hash collision between distinct LEIs: fall back to comparing the LEIs themselves
+        return ~df["lei"].duplicated().to_numpy()
+    return unique
+
+# First occurrence in storage order is the unique one, like DataFrame.duplicated
+@rule("UniqueLEI", inputs=["lei"], scope="global",
+      sql=lambda col: f"row_number() OVER (PARTITION BY {col('lei')} ORDER BY t.ctid) = 1",
+      shard_map=_lei_keys, shard_reduce=_first_lei_occurrence)
+def check_uniqueness(inputs):
+    return ~inputs["lei"].duplicated().to_numpy()
+
+@rule("NotExpired", inputs=["registration.nextRenewalDate"], volatile=True,
+      sql=lambda col: f"COALESCE({col('registration.nextRenewalDate')}::TIMESTAMPTZ >= now(), false)")
+def check_if_expired(inputs):
+    return (inputs["registration.nextRenewalDate"] >= pd.Timestamp.today(tz='utc')).to_numpy()
+
+def lei_valid(leis):
+    """
+    ISO 17442 validity of every LEI in `leis` (a pandas or Arrow string array): 18 upper-case
+    letters or digits and two check digits, the whole LEI being 1 modulo 97 (ISO 7064
+    MOD 97-10). Missing LEIs are invalid.
+
+    The LEIs are read from the Arrow buffer as a matrix of byte pairs and reduced modulo 97
+    two characters at a time through lookup tables, in blocks that stay in cache, so no LEI
+    is ever turned into its up-to-40-digit integer.
+    """
+    arr = leis if isinstance(leis, (pa.Array, pa.ChunkedArray)) else pa.array(leis, from_pandas=True)
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    arr = arr.cast(pa.large_string())
+    valid = np.zeros(len(arr), dtype=bool)
+    candidates = pc.fill_null(pc.equal(pc.binary_length(arr), 20), False).to_numpy(zero_copy_only=False)
+    if not candidates.any():
+        return valid
+    if not candidates.all():
+        # The 20-byte values, copied next to each other
+        arr = arr.filter(pa.array(candidates))
+    _, offsets, data = arr.buffers()
+    start = np.frombuffer(offsets, dtype=np.int64)[arr.offset]
+    pairs = np.frombuffer(data, dtype=np.uint8)[start:start + 20 * len(arr)].view(np.uint16).reshape(-1, 10)
+
+    outcome = np.empty(len(pairs), dtype=bool)
+    for first in range(0, len(pairs), LEI_BLOCK_ROWS):
+        block = np.ascontiguousarray(pairs[first:first + LEI_BLOCK_ROWS].T)
+        remainders, shifts = LEI_PAIR_REMAINDER[block], LEI_PAIR_SHIFT[block]
+        # Horner's scheme, two characters per step; 64 bits hold five steps between reductions
+        remainder = np.zeros(block.shape[1], dtype=np.int64)
+        for step in range(10):
+            remainder = remainder * shifts[step] + remainders[step]
+            if step == 4:
+                remainder %= 97
+        outcome[first:first + LEI_BLOCK_ROWS] = ((remainders >= 0).all(axis=0) & LEI_PAIR_DIGITS[block[9]]
+                                                 & (remainder % 97 == 1))
+    valid[candidates] = outcome
+    return valid
 
-def check_uniqueness(df):
-    return ~df["lei"].duplicated()
+def _lei_valid_sql(col):
+    lei = col("lei")
+    # Letters become their two digits (A=10 ... Z=35), then the digit string is one NUMERIC
+    digits = lei
+    for value, letter in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ", 10):
+        digits = f"replace({digits}, '{letter}', '{value}')"
+    return f"CASE WHEN {lei} ~ '^[0-9A-Z]{{18}}[0-9]{{2}}$' THEN {digits}::NUMERIC % 97 = 1 ELSE false END"
 
-def check_if_expired(df):
-    return pd.to_datetime(df["registration.nextRenewalDate"]) >= pd.Timestamp.today(tz='utc')
+@rule("ValidLEI", inputs=["lei"], sql=_lei_valid_sql)
+def check_lei_validity(inputs):
+    """Check if the LEI has the ISO 17442 format and check digits."""
+    return lei_valid(inputs["lei"])
 
 
+@traced()
 def run_quality_checks(df):
-    df["Completeness"] = check_completeness(df)
-    df["CountryValid"] = check_country_validity(df)
-    df["DateConsistent"] = check_date_consistency(df)
-    df["UniqueLEI"] = check_uniqueness(df)
-    df["NotExpired"] = check_if_expired(df)
-    return df
\ No newline at end of file
+    for name, passed in evaluate_rules(df).items():
+        df[name] = passed
+    return df
@@ -0,0 +1,32 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+load_dotenv()
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    Shared SQLAlchemy engine built from the POSTGRES_* environment variables.
+    Its connection pool lives for the whole process, so connections are reused across calls.
+    """
+    url = URL.create(
+        "postgresql+psycopg2",
+        username=os.environ.get('POSTGRES_USERNAME', 'postgres'),
+        password=os.environ.get('POSTGRES_PASSWORD'),
+        host=os.environ.get('POSTGRES_HOST'),
+        port=os.environ.get('POSTGRES_PORT'),
+        database=os.environ.get('POSTGRES_DB'),
+    )
+    # Sessions run in UTC so TIMESTAMPTZ columns arrive as UTC datetimes
+    return create_engine(url, pool_size=5, max_overflow=5, pool_pre_ping=True,
+                         connect_args={"options": "-c timezone=UTC"})
+
+
+def quote(name):
+    """Quote an identifier such as a flattened column name (`entity.legalName.name`)."""
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,234 @@
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from utils.data_quality_checks import VALID_COUNTRIES, VALID_COUNTRIES_TABLE
+from utils.db import get_engine, quote
+from utils.loader import bump_data_version
+from utils.rollup import ROLLUP_DIMENSIONS, cube_dimensions
+from utils.rules import active_rules
+from utils.schema import apply_schema_dtypes, read_schema
+from utils.scoring import LABEL_BINS, LABELS, WEIGHTS
+from utils.tracing import traced
+from utils.utils import DEFAULT_CHUNKSIZE, dashboard_columns
+
+SCORE_COLUMNS = ["QualityScore", "QualityLabel"]
+QUALITY_REFRESH_TABLE = "lei_quality_refreshes"
+# Row number of each record in the view, which breaks ties between equal (score, lei) keys
+ROW_COLUMN = "row_id"
+
+
+def quality_view_name(table_name):
+    return f"{table_name}_quality"
+
+
+def _check_expressions(available):
+    """
+    SQL of every active rule, over the columns of the table aliased `t`.
+    Missing values fail a rule, as NaN/NaT do in pandas.
+    """
+    def col(name):
+        return f"t.{quote(name)}" if name in available else "NULL"
+
+    expressions = {}
+    for r in active_rules():
+        if r.sql is None:
+            raise ValueError(f"Rule {r.name} has no SQL form for the in-database engine")
+        expressions[r.name] = r.sql(col)
+    return expressions
+
+
+def _score_expressions():
+    score = " + ".join(f'{weight} * {quote(check)}::INT' for check, weight in WEIGHTS.items())
+    # pd.cut bins are closed on the right
+    cases = " ".join(f"WHEN {quote('QualityScore')} <= {upper} THEN '{label}'"
+                     for upper, label in zip(LABEL_BINS[1:], LABELS))
+    label = f"CASE WHEN {quote('QualityScore')} > {LABEL_BINS[0]} THEN CASE {cases} END END"
+    return score, label
+
+
+def _sync_valid_countries(conn):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {VALID_COUNTRIES_TABLE} (code TEXT PRIMARY KEY)"))
+    conn.execute(text(f"TRUNCATE {VALID_COUNTRIES_TABLE}"))
+    conn.execute(text(f"INSERT INTO {VALID_COUNTRIES_TABLE} (code) VALUES (:code)"),
+                 [{"code": code} for code in sorted(VALID_COUNTRIES)])
+
+
+def _sync_rule_tables(conn, table_name):
+    """Fill the tables the SQL forms of the active rules read."""
+    for r in active_rules():
+        if r.sql_setup is not None:
+            r.sql_setup(conn, table_name)
+
+
+def _record_refresh(conn, table_name):
+    """Note when the quality view of `table_name` was computed, inside the caller's transaction."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {QUALITY_REFRESH_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            refreshed_at TIMESTAMPTZ NOT NULL
+        )
+    """))
+    conn.execute(text(f"INSERT INTO {QUALITY_REFRESH_TABLE} (table_name, refreshed_at) VALUES (:table, now()) "
+                      f"ON CONFLICT (table_name) DO UPDATE SET refreshed_at = now()"),
+                 {"table": table_name})
+
+
+def create_quality_view(table_name='test', engine=None):
+    """
+    (Re)create the materialized view holding the checks, QualityScore and QualityLabel of
+    every record of `table_name`, next to the columns the dashboard reads.
+    Results match run_quality_checks + calculate_quality_score as of the last refresh.
+    """
+    engine = engine or get_engine()
+    view = quality_view_name(table_name)
+    with engine.begin() as conn:
+        available = {col["name"] for col in inspect(conn).get_columns(table_name)}
+        passthrough = [col for col in dashboard_columns() if col in available]
+        checks = _check_expressions(available)
+        score, label = _score_expressions()
+
+        _sync_valid_countries(conn)
+        _sync_rule_tables(conn, table_name)
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {quote(view)}"))
+        conn.execute(text(f"""
+            CREATE MATERIALIZED VIEW {quote(view)} AS
+            WITH checks AS (
+                SELECT {', '.join(f't.{quote(col)}' for col in passthrough)},
+                       {', '.join(f'{expr} AS {quote(name)}' for name, expr in checks.items())},
+                       row_number() OVER () AS {quote(ROW_COLUMN)}
+                FROM {quote(table_name)} t
+            ), scored AS (
+                SELECT checks.*, {score} AS {quote('QualityScore')} FROM checks
+            )
+            SELECT scored.*, {label} AS {quote('QualityLabel')} FROM scored
+        """))
+        conn.execute(text(f"CREATE INDEX ON {quote(view)} (lei)"))
+        # Keyset pagination of the explorer walks this index
+        conn.execute(text(f"CREATE INDEX ON {quote(view)} ({quote('QualityScore')}, (COALESCE(lei, '') COLLATE \"C\"), "
+                          f"{quote(ROW_COLUMN)})"))
+        _record_refresh(conn, table_name)
+
+
+def refresh_quality_view(table_name='test', engine=None):
+    """
+    Recompute the quality view after a load, creating it on first use or when a rule or
+    column was added since it was created. The table's load watermark is advanced too, so snapshots read
+    from the previous view state are not reused.
+    """
+    engine = engine or get_engine()
+    view = quality_view_name(table_name)
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:view)"), {"view": quote(view)}).scalar()
+        if exists is not None:
+            columns = {col["name"] for col in inspect(conn).get_columns(view)}
+            if ROW_COLUMN not in columns or any(r.name not in columns for r in active_rules()):
+                exists = None
+            else:
+                _sync_rule_tables(conn, table_name)
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW {quote(view)}"))
+                _record_refresh(conn, table_name)
+    if exists is None:
+        create_quality_view(table_name, engine)
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cur:
+            bump_data_version(cur, table_name)
+
+
+def refresh_volatile_checks(table_name='test', engine=None):
+    """
+    Refresh the quality view before it is read if a volatile rule (expiry) was last evaluated
+    on an earlier UTC day, so its outcomes hold for today, as for the pandas engine's
+    snapshots. Returns whether the view was refreshed.
+    """
+    if not any(r.volatile for r in active_rules()):
+        return False
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:table)"), {"table": QUALITY_REFRESH_TABLE}).scalar():
+            current = conn.execute(text(f"""
+                SELECT (refreshed_at AT TIME ZONE 'UTC')::DATE = (now() AT TIME ZONE 'UTC')::DATE
+                FROM {QUALITY_REFRESH_TABLE} WHERE table_name = :table
+            """), {"table": table_name}).scalar()
+            if current:
+                return False
+    refresh_quality_view(table_name, engine)
+    return True
+
+
+def _filters(countries=None, statuses=None, score_range=None, labels=None):
+    conditions, params = [], {}
+    if countries:
+        conditions.append(f'{quote("entity.legalAddress.country")} = ANY(:countries)')
+        params["countries"] = list(countries)
+    if statuses:
+        conditions.append(f'{quote("registration.status")} = ANY(:statuses)')
+        params["statuses"] = list(statuses)
+    if score_range:
+        conditions.append(f'{quote("QualityScore")} BETWEEN :min_score AND :max_score')
+        params["min_score"], params["max_score"] = score_range
+    if labels:
+        conditions.append(f'{quote("QualityLabel")} = ANY(:labels)')
+        params["labels"] = list(labels)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+@traced()
+def fetch_quality_scores(table_name='test', countries=None, statuses=None, score_range=None):
+    """
+    Per-record checks and scores from the quality view, with the dashboard columns.
+    The frame has the same columns as the pandas engine produces before format_dataframe.
+    """
+    engine = get_engine()
+    where, params = _filters(countries, statuses, score_range)
+    with engine.connect() as conn:
+        schema = read_schema(conn, table_name)
+        df = pd.read_sql_query(text(f"SELECT * FROM {quote(quality_view_name(table_name))}{where}"),
+                               conn, params=params)
+    df = df.reindex(columns=dashboard_columns() + [r.name for r in active_rules()] + SCORE_COLUMNS)
+    df = apply_schema_dtypes(df, schema)
+    df["QualityScore"] = df["QualityScore"].astype(int)
+    df["QualityLabel"] = pd.Categorical(df["QualityLabel"], categories=LABELS)
+    return df
+
+
+def iter_quality_scores(table_name='test', columns=None, countries=None, statuses=None,
+                        score_range=None, labels=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Stream the quality view through a server-side cursor as typed DataFrames of `chunksize`
+    rows, limited to `columns` and filtered like fetch_quality_scores and by label.
+    """
+    where, params = _filters(countries, statuses, score_range, labels)
+    with get_engine().connect() as conn:
+        schema = read_schema(conn, table_name)
+        available = [col["name"] for col in inspect(conn).get_columns(quality_view_name(table_name))
+                     if col["name"] != ROW_COLUMN]
+        selected = [col for col in columns if col in available] if columns else available
+        query = text(f"SELECT {', '.join(quote(col) for col in selected)} "
+                     f"FROM {quote(quality_view_name(table_name))}{where}")
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunksize):
+            if "QualityLabel" in chunk.columns:
+                chunk["QualityLabel"] = pd.Categorical(chunk["QualityLabel"], categories=LABELS)
+            yield apply_schema_dtypes(chunk.reindex(columns=list(columns or selected)), schema)
+
+
+@traced()
+def fetch_quality_rollup(table_name='test', countries=None, statuses=None, score_range=None):
+    """The rollup cube of build_rollup, aggregated by the database over the quality view."""
+    view = quote(quality_view_name(table_name))
+    where, params = _filters(countries, statuses, score_range)
+    with get_engine().connect() as conn:
+        available = {col["name"] for col in inspect(conn).get_columns(quality_view_name(table_name))}
+        dimensions = [f"{quote(col) if col in available else 'NULL'}::TEXT AS {quote(name)}"
+                      for name, col in ROLLUP_DIMENSIONS.items()]
+        dimensions += [quote(name) for name in cube_dimensions()[len(ROLLUP_DIMENSIONS):]]
+        cube = pd.read_sql_query(text(f"""
+            SELECT {', '.join(dimensions)}, count(*) AS records, sum({quote('QualityScore')}) AS score_sum
+            FROM {view}{where}
+            GROUP BY {', '.join(str(i + 1) for i in range(len(dimensions)))}
+        """), conn, params=params)
+    types = {name: "string" for name in ROLLUP_DIMENSIONS}
+    types.update({r.name: bool for r in active_rules()},
+                 QualityScore="int64", QualityLabel="string", records="int64", score_sum="int64")
+    return cube.astype(types)
@@ -0,0 +1,164 @@
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from utils.crawler import GLEIF_API_URL, RateLimiter, get_page, make_session
+from utils.db import get_engine, quote
+from utils.loader import copy_upsert
+from utils.tracing import traced
+
+SYNC_WATERMARK_TABLE = "lei_sync_watermarks"
+LAST_UPDATE = "registration.lastUpdateDate"
+# lei-records filter and sort on the last update date, as accepted by the GLEIF API
+LAST_UPDATE_FILTER = f"filter[{LAST_UPDATE}]"
+LAST_UPDATE_SORT = LAST_UPDATE
+
+
+def _timestamp(value):
+    """`value` as a UTC timestamp, or None if it is missing or not a date."""
+    value = pd.to_datetime(value, utc=True, errors="coerce")
+    return None if pd.isna(value) else value
+
+
+def read_watermark(table_name='test', engine=None):
+    """
+    The last update date up to which `table_name` is in sync: the stored watermark, or for a
+    table that was only ever loaded in full, the latest last update date it holds. None when
+    neither exists, in which case the next sync is a full one.
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        tables = inspect(conn).get_table_names()
+        if SYNC_WATERMARK_TABLE in tables:
+            stored = conn.execute(text(f"SELECT last_update FROM {SYNC_WATERMARK_TABLE} "
+                                       f"WHERE table_name = :table"), {"table": table_name}).scalar()
+            if stored is not None:
+                return _timestamp(stored)
+        if table_name in tables and LAST_UPDATE in [col["name"] for col in inspect(conn).get_columns(table_name)]:
+            # Tables loaded before the registry store the date as text, which sorts the same way
+            return _timestamp(conn.execute(text(f"SELECT max({quote(LAST_UPDATE)}) "
+                                                f"FROM {quote(table_name)}")).scalar())
+    return None
+
+
+def save_watermark(table_name, watermark, engine=None):
+    """Advance the stored watermark of `table_name` to `watermark`; it never moves back."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {SYNC_WATERMARK_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                last_update TIMESTAMPTZ NOT NULL,
+                synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """))
+        conn.execute(text(f"""
+            INSERT INTO {SYNC_WATERMARK_TABLE} (table_name, last_update) VALUES (:table, :watermark)
+            ON CONFLICT (table_name) DO UPDATE
+            SET last_update = GREATEST({SYNC_WATERMARK_TABLE}.last_update, EXCLUDED.last_update),
+                synced_at = now()
+        """), {"table": table_name, "watermark": watermark.to_pydatetime()})
+
+
+def _filter_precision(moment):
+    """`moment` truncated to the whole seconds the last update date filter compares at."""
+    return None if moment is None else moment.floor("s")
+
+
+def delta_params(watermark):
+    """
+    Crawl parameters for the records updated at or after `watermark`, oldest first, or no
+    filter at all without a watermark. The bound is inclusive so records updated in the same
+    second as the last sync are not missed; upserting them again changes nothing.
+    """
+    if watermark is None:
+        return {}
+    return {LAST_UPDATE_FILTER: ">=" + watermark.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "sort": LAST_UPDATE_SORT}
+
+
+def _updated_at(item):
+    return _timestamp(item["attributes"].get("registration", {}).get("lastUpdateDate"))
+
+
+def crawl_updated_records(since=None, base_url=GLEIF_API_URL, page_size=200, batch_pages=1,
+                          requests_per_second=None, max_retries=5, backoff=0.5, timeout=30,
+                          session=None):
+    """
+    Walk the lei-records updated at or after `since`, oldest first, and yield the `data`
+    items of `batch_pages` pages at a time.
+
+    Records updated during the walk move to the end of the sort order, so page numbers into
+    the result set would shift under the crawl and skip records. Pages are read by keyset
+    instead: each request asks again for the records updated at or after the last update date
+    of the previous page, from its first page. Records of that date seen already are dropped;
+    a full page of a single date goes on to the next page of that date. Dates are compared at
+    the whole seconds of the filter, since records within one second come back together.
+    """
+    session = session or make_session(1)
+    since = _filter_precision(since)
+    limiter = RateLimiter(requests_per_second)
+    seen, page_number, batch, pages = set(), 1, [], 0
+    while True:
+        params = dict(delta_params(since) or {"sort": LAST_UPDATE_SORT},
+                      **{"page[size]": page_size, "page[number]": page_number})
+        data = get_page(session, base_url, params, limiter, max_retries, backoff, timeout)["data"]
+        batch.extend(item for item in data if item["id"] not in seen)
+        pages += 1
+        if len(data) < page_size:
+            break
+        if pages % batch_pages == 0:
+            yield batch
+            batch = []
+
+        last = _filter_precision(_updated_at(data[-1]))
+        if last is None or last == since:
+            page_number += 1
+        else:
+            since, page_number, seen = last, 1, set()
+        seen.update(item["id"] for item in data if _filter_precision(_updated_at(item)) == since)
+    if batch:
+        yield batch
+
+
+def _table_columns(engine, table_name):
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(table_name):
+            return []
+        return [col["name"] for col in inspect(conn).get_columns(table_name)]
+
+
+@traced()
+def sync_batches(batches, engine=None, table_name='test', watermark=None):
+    """
+    Upsert batches of changed records (DataFrames of flattened records, from the API or a
+    GLEIF delta file) into `table_name`, then advance its watermark to the latest last update
+    date seen. Records last updated before `watermark` are skipped, since delta files overlap.
+
+    Each record replaces the stored one as a whole: fields a record no longer has, such as a
+    removed address line, are cleared rather than left from the earlier version.
+    Returns the inserted, updated and unchanged counts, the records skipped and the watermark.
+    """
+    engine = engine or get_engine()
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    latest = watermark
+    columns = _table_columns(engine, table_name)
+    known = set(columns)
+    for df in batches:
+        updated_at = pd.to_datetime(df[LAST_UPDATE], utc=True, errors="coerce") if LAST_UPDATE in df.columns else None
+        if watermark is not None and updated_at is not None:
+            fresh = ((updated_at >= watermark) | updated_at.isna()).to_numpy()
+            counts["skipped"] += int((~fresh).sum())
+            df, updated_at = df[fresh], updated_at[fresh]
+        if df.empty:
+            continue
+        columns += [col for col in df.columns if col not in known]
+        known.update(df.columns)
+        for name, count in copy_upsert(df.reindex(columns=columns), engine, table_name).items():
+            counts[name] += count
+        if updated_at is not None and updated_at.notna().any():
+            latest = max(latest, updated_at.max()) if latest is not None else updated_at.max()
+
+    # Only once every batch is in, so an interrupted sync starts again from the old mark
+    if latest is not None:
+        save_watermark(table_name, latest, engine)
+    return dict(counts, watermark=latest)
@@ -0,0 +1,174 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from utils.cache import data_version
+from utils.db import get_engine, quote
+from utils.db_quality import ROW_COLUMN, _filters, quality_view_name
+from utils.scoring import LABELS
+
+EXPLORER_COLUMNS = ["lei", "entity.legalName.name", "entity.legalAddress.country",
+                    "QualityScore", "QualityLabel"]
+
+
+def _window(n_rows, lower, upper, page_size, after, before, descending):
+    """
+    Positions of a page in ascending (score, lei, row) order. `lower(key)` is the position of
+    the first entry >= key and `upper(key)` of the first entry > key.
+    """
+    if descending:
+        if after is not None:
+            stop = lower(after)
+            return max(stop - page_size, 0), stop
+        if before is not None:
+            start = upper(before)
+            return start, min(start + page_size, n_rows)
+        return max(n_rows - page_size, 0), n_rows
+    if after is not None:
+        start = upper(after)
+        return start, min(start + page_size, n_rows)
+    if before is not None:
+        stop = lower(before)
+        return max(stop - page_size, 0), stop
+    return 0, min(page_size, n_rows)
+
+
+class FramePager:
+    """
+    Keyset pages over an in-memory scored frame, ordered by (QualityScore, lei) and then by
+    position in the frame, which the pages keep as their index. Records with the same score
+    and LEI (duplicate or missing LEIs) are then still paged one after the other.
+
+    The explorer columns are copied and sorted once; a page is then a few binary searches and
+    a slice. Filtered pagers are derived from the sorted one and kept per filter.
+    """
+
+    def __init__(self, df, presorted=False):
+        page = df.reindex(columns=EXPLORER_COLUMNS)
+        if not presorted:
+            page.index = np.arange(len(page))
+            lei = page["lei"].fillna("").astype(str).to_numpy(dtype=object)
+            # Stable, so ties stay in frame order
+            order = np.lexsort((lei, page["QualityScore"].to_numpy()))
+            page = page.iloc[order]
+        self.frame = page
+        self.scores = page["QualityScore"].to_numpy()
+        self.leis = page["lei"].fillna("").astype(str).to_numpy(dtype=object)
+        self.rows = page.index.to_numpy()
+        self._filtered = {}
+
+    def filter(self, countries=None, labels=None):
+        """Pager over the records of the given countries and labels, in the same order."""
+        signature = (tuple(countries or ()), tuple(labels or ()))
+        if signature == ((), ()):
+            return self
+        if signature not in self._filtered:
+            mask = np.ones(len(self.frame), dtype=bool)
+            if countries:
+                mask &= self.frame["entity.legalAddress.country"].isin(list(countries)).to_numpy()
+            if labels:
+                mask &= self.frame["QualityLabel"].isin(list(labels)).to_numpy()
+            self._filtered[signature] = FramePager(self.frame[mask], presorted=True)
+        return self._filtered[signature]
+
+    def count(self):
+        return len(self.frame)
+
+    def _position(self, key, side):
+        score, lei, row = key
+        start = np.searchsorted(self.scores, score, side="left")
+        stop = np.searchsorted(self.scores, score, side="right")
+        start, stop = (start + np.searchsorted(self.leis[start:stop], lei, side=edge) for edge in ("left", "right"))
+        return start + np.searchsorted(self.rows[start:stop], row, side=side)
+
+    def _lower(self, key):
+        return self._position(key, "left")
+
+    def _upper(self, key):
+        return self._position(key, "right")
+
+    def page(self, after=None, before=None, page_size=10, descending=False):
+        """
+        The page of `page_size` records following the (score, lei, row) key `after`, or
+        preceding `before`, in ascending or descending order.
+        """
+        start, stop = _window(len(self.frame), self._lower, self._upper, page_size,
+                              after, before, descending)
+        page = self.frame.iloc[start:stop]
+        return page.iloc[::-1] if descending else page
+
+
+@lru_cache(maxsize=256)
+def _count(table_name, version, where, params):
+    with get_engine().connect() as conn:
+        return conn.execute(text(f"SELECT count(*) FROM {quote(quality_view_name(table_name))}{where}"),
+                            {name: list(value) if isinstance(value, tuple) else value
+                             for name, value in params}).scalar()
+
+
+class ViewPager:
+    """
+    Keyset pages over the quality view of `table_name`, ordered by (QualityScore, lei) and
+    the view's row number, and served from its index, so a page costs the same at any depth.
+    Pages are indexed by row number. Counts are cached per data version and filter.
+    """
+
+    def __init__(self, table_name='test', countries=None, statuses=None, score_range=None, labels=None):
+        self.table_name = table_name
+        self.filters = {"countries": countries, "statuses": statuses,
+                        "score_range": score_range, "labels": labels}
+        self.where, self.params = _filters(countries, statuses, score_range, labels)
+
+    def filter(self, countries=None, labels=None):
+        """Pager with the given countries and labels replacing the current ones when set."""
+        filters = dict(self.filters)
+        filters["countries"] = countries or filters["countries"]
+        filters["labels"] = labels or filters["labels"]
+        return ViewPager(self.table_name, **filters)
+
+    def count(self):
+        # Hashable filter parameters for the count cache
+        params = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                              for name, value in self.params.items()))
+        return _count(self.table_name, data_version(self.table_name), self.where, params)
+
+    def page(self, after=None, before=None, page_size=10, descending=False):
+        """Same as FramePager.page, in one indexed query."""
+        # Byte-order collation, so the database orders LEIs like Python does
+        lei = "(COALESCE(lei, '') COLLATE \"C\")"
+        key = f"({quote('QualityScore')}, {lei}, {quote(ROW_COLUMN)})"
+        conditions = [self.where[len(" WHERE "):]] if self.where else []
+        params = dict(self.params, page_size=page_size)
+        # Walking backwards from `before`, or forwards in descending order, scans the index in reverse
+        backwards = (before is not None) != descending
+        cursor = after if after is not None else before
+        if cursor is not None:
+            conditions.append(f"{key} {'<' if backwards else '>'} (:score, :lei, :row)")
+            params["score"], params["lei"], params["row"] = cursor
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if backwards else "ASC"
+
+        columns = ", ".join(quote(col) for col in EXPLORER_COLUMNS + [ROW_COLUMN])
+        with get_engine().connect() as conn:
+            page = pd.read_sql_query(text(f"""
+                SELECT {columns} FROM {quote(quality_view_name(self.table_name))}{where}
+                ORDER BY {quote('QualityScore')} {direction}, {lei} {direction}, {quote(ROW_COLUMN)} {direction}
+                LIMIT :page_size
+            """), conn, params=params, index_col=ROW_COLUMN)
+        if backwards != descending:
+            page = page.iloc[::-1]
+        page["QualityLabel"] = pd.Categorical(page["QualityLabel"], categories=LABELS)
+        return page
+
+
+def page_keys(page):
+    """(score, lei, row) keys of the first and last records of a page, for the next request."""
+    if page.empty:
+        return None, None
+    keys = []
+    for i in (0, -1):
+        lei = page["lei"].iloc[i]
+        keys.append((int(page["QualityScore"].iloc[i]), lei if isinstance(lei, str) else "", int(page.index[i])))
+    return tuple(keys)
@@ -0,0 +1,107 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.cache import CACHE_DIR, chunk_schema, evict_snapshots
+
+# Report format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+EXPORT_CHUNK_ROWS = 100000
+
+
+def filter_report(df, countries=None, labels=None, columns=None):
+    """Rows of a scored frame in the given countries and labels, limited to `columns`."""
+    mask = None
+    if countries:
+        mask = df["entity.legalAddress.country"].isin(list(countries))
+    if labels:
+        by_label = df["QualityLabel"].isin(list(labels))
+        mask = by_label if mask is None else mask & by_label
+    if mask is not None:
+        df = df[mask]
+    return df.reindex(columns=list(columns)) if columns else df
+
+
+def iter_frame_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    # An empty frame still gives one chunk, so the report gets its header
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _write_csv_gz(chunks, path):
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, header=header, index=False)
+            header = False
+
+
+def _write_parquet(chunks, path):
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(path, chunk_schema(chunk).remove_metadata(), compression="zstd")
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_report(chunks, path, fmt):
+    """
+    Write the DataFrame `chunks` one at a time to `path` in report format `fmt`, so memory
+    stays bounded by a chunk. The file appears under `path` only once complete.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fmt == "CSV (gzip)":
+            _write_csv_gz(chunks, tmp_path)
+        elif fmt == "Parquet":
+            _write_parquet(chunks, tmp_path)
+        else:
+            raise ValueError(f"Unsupported report format: {fmt}")
+        if not os.path.exists(tmp_path):
+            # No chunks at all: an empty report
+            open(tmp_path, "wb").close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class ReportFile(io.FileIO):
+    """A report opened for one download, closed once it has been read to the end."""
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if size is None or size < 0 or not data:
+            self.close()
+        return data
+
+
+def cached_report(key, fmt, build_chunks, options=None, cache_dir=CACHE_DIR):
+    """
+    Path of the report of snapshot `key` in format `fmt` with the given column and filter
+    `options`. Built from `build_chunks()` on the first request and reused afterwards, until
+    the data version, and with it the key, changes.
+    """
+    digest = hashlib.sha1(json.dumps([key, fmt, options], sort_keys=True, default=str).encode()).hexdigest()
+    path = os.path.join(cache_dir, f"{digest}.report.{EXPORT_FORMATS[fmt][0]}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    write_report(build_chunks(), path, fmt)
+    evict_snapshots(cache_dir)
+    return path
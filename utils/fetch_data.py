@@ -1,23 +1,19 @@
-import os
+import argparse
 import pandas as pd
 import requests
-from sqlalchemy import create_engine, text, inspect
-from dotenv import load_dotenv
+from sqlalchemy import text
 
-os.chdir(os.path.dirname(os.getcwd()))
-load_dotenv()
+from utils.crawler import GLEIF_API_URL, crawl_lei_records
+from utils.db import get_engine
+from utils.db_quality import refresh_quality_view
+from utils.delta_sync import crawl_updated_records, read_watermark, sync_batches
+from utils.flatten import RecordFlattener
+from utils.golden_copy import iter_golden_copy
+from utils.loader import bump_data_version, copy_upsert
+from utils.schema import SQL_TYPES, migrate
 
-username = os.environ.get('POSTGRES_USERNAME')
-password = os.environ.get('POSTGRES_PASSWORD')
-host = os.environ.get('POSTGRES_HOST')
-port = os.environ.get('POSTGRES_PORT')
-database = os.environ.get('POSTGRES_DB')
-
-GLEIF_API_URL = "https://api.gleif.org/api/v1/lei-records"
 REMOVE_KEYS = ['bic', 'mic', 'ocid', 'qcc', 'spglobal', 'conformityFlag']
 
-# DB connection
-engine = create_engine(f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{database}")
 table_name = "test"
 
 def extract_leaf_nodes(data, parent_key=''):
@@ -40,45 +36,56 @@ def extract_leaf_nodes(data, parent_key=''):
     return leaves
 
 
+def flatten_page(data):
+    """Flatten the `data` list of one lei-records page into leaf-node dicts."""
+    lei_records = []
+    for item in data:
+        attributes = item['attributes']
+        for key in REMOVE_KEYS:
+            attributes.pop(key, None)
+        lei_records.append(extract_leaf_nodes(attributes))
+    return lei_records
+
+
 def fetch_lei_records(limit=100):
     params = {"page[size]": limit}
     response = requests.get(GLEIF_API_URL, params=params)
-
-    lei_records = []
     
     if response.status_code == 200:
-        data = response.json()["data"]
-        for i, item in enumerate(data, 1):
-            attributes = item['attributes']
-            [attributes.pop(key) for key in REMOVE_KEYS]
-
-            lei = extract_leaf_nodes(attributes)
-            lei_records.append(lei)
-            
-        return lei_records
+        return flatten_page(response.json()["data"])
     else:
         raise Exception(f"GLEIF API error: {response.status_code}")
 
-df = pd.DataFrame(fetch_lei_records())
-
-if __name__ == '__main__':
-    
-    with engine.connect() as conn:
-        inspector = inspect(engine)
-
-        # Create table if it does not exist
-        if table_name not in inspector.get_table_names():
-            df.to_sql(table_name, engine, if_exists="replace", index=False)
-            print("Created table with initial schema.")
-            exit()
 
-        # Add missing columns (only if needed)
-        existing_columns = {col["name"] for col in inspector.get_columns(table_name)}
-        new_columns = set(df.columns) - existing_columns
-        for col in new_columns:
-            conn.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" TEXT;'))
-            conn.commit()
+def crawl_lei_batches(batch_pages=10, crawl=crawl_lei_records, **crawl_options):
+    """
+    Crawl every page of the lei-records endpoint and yield one DataFrame per `batch_pages`
+    pages. Keyword options are passed through to `crawl`, `crawl_lei_records` or
+    `crawl_updated_records`.
+    """
+    flattener = RecordFlattener()
+    for data in crawl(batch_pages=batch_pages, **crawl_options):
+        for item in data:
+            attributes = item['attributes']
+            for key in REMOVE_KEYS:
+                attributes.pop(key, None)
+            flattener.add(attributes)
+        yield flattener.to_frame()
+        flattener.reset()
+
+
+def load_dataframe(df, engine, table_name=table_name):
+    """Insert the LEIs of `df` that are not in `table_name` yet."""
+    # Create the table or add missing columns, typed by the schema registry, in one transaction
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            schema = migrate(cur, table_name, df.columns)
+        raw.commit()
+    finally:
+        raw.close()
 
+    with engine.connect() as conn:
         # Create a temporary table with incoming data
         tmp_table = f"{table_name}_tmp"
         df.to_sql(tmp_table, engine, if_exists="replace", index=False)
@@ -86,16 +93,82 @@ if __name__ == '__main__':
         # Insert only new LEIs from temp table using LEFT JOIN
         insert_sql = f"""
             INSERT INTO "{table_name}" ({', '.join(f'"{col}"' for col in df.columns)})
-            SELECT {', '.join(f't."{col}"' for col in df.columns)}
+            SELECT {', '.join(f't."{col}"::{SQL_TYPES[schema[col]]}' for col in df.columns)}
             FROM "{tmp_table}" t
             LEFT JOIN "{table_name}" main ON t.lei = main.lei
             WHERE main.lei IS NULL;
         """
 
         result = conn.execute(text(insert_sql))
+        if result.rowcount:
+            with conn.connection.cursor() as cur:
+                bump_data_version(cur, table_name)
         conn.commit()
         print(f"Inserted {result.rowcount} new rows.")
 
         # Drop the temporary table
         conn.execute(text(f'DROP TABLE IF EXISTS "{tmp_table}";'))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load GLEIF LEI records into Postgres.")
+    parser.add_argument("--all", action="store_true", help="crawl every page instead of only the first")
+    parser.add_argument("--golden-copy", metavar="PATH",
+                        help="stream a golden-copy file (XML or CSV, optionally zipped) instead of the API")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--loader", choices=["copy", "insert"], default="copy",
+                        help="COPY + INSERT ... ON CONFLICT upsert, or the row-wise to_sql insert of new LEIs")
+    parser.add_argument("--on-conflict", choices=["update", "nothing"], default="update",
+                        help="what the copy loader does with LEIs that are already loaded")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--requests-per-second", type=float, default=None)
+    parser.add_argument("--cursor", default=".lei_crawl_cursor.json",
+                        help="file used to resume an interrupted crawl")
+    parser.add_argument("--delta", action="store_true",
+                        help="only load records updated since the last sync (from the API, or from "
+                             "the GLEIF delta file given with --golden-copy) and advance the watermark")
+    parser.add_argument("--base-url", default=GLEIF_API_URL,
+                        help="lei-records endpoint, e.g. a local stub server")
+    args = parser.parse_args()
+
+    engine = get_engine()
+
+    def load(df):
+        if args.loader == "insert":
+            load_dataframe(df, engine)
+            return
+        counts = copy_upsert(df, engine, table_name, on_conflict=args.on_conflict)
+        print(f"Inserted {counts['inserted']}, updated {counts['updated']}, "
+              f"unchanged {counts['unchanged']} rows.")
+
+    if args.delta:
+        # Changed records replace the stored ones whole, whatever --loader says
+        watermark = read_watermark(table_name, engine)
+        if args.golden_copy:
+            batches = iter_golden_copy(args.golden_copy, chunk_size=args.chunk_size)
+        else:
+            # Pages follow each other by last update date, so a delta crawl runs on one worker
+            batches = crawl_lei_batches(crawl=crawl_updated_records, since=watermark, base_url=args.base_url,
+                                        page_size=args.page_size,
+                                        requests_per_second=args.requests_per_second)
+        counts = sync_batches(batches, engine, table_name, watermark)
+        print(f"Synced records updated since {watermark or 'the beginning'}: inserted {counts['inserted']}, "
+              f"updated {counts['updated']}, unchanged {counts['unchanged']}, skipped {counts['skipped']}; "
+              f"watermark now {counts['watermark']}.")
+    elif args.golden_copy:
+        for df in iter_golden_copy(args.golden_copy, chunk_size=args.chunk_size):
+            load(df)
+    elif not args.all:
+        load(pd.DataFrame(fetch_lei_records()))
+    else:
+        batches = crawl_lei_batches(base_url=args.base_url, page_size=args.page_size, workers=args.workers,
+                                    max_pages=args.max_pages, cursor_path=args.cursor,
+                                    requests_per_second=args.requests_per_second)
+        for df in batches:
+            load(df)
+
+    # Keep the in-database checks and scores in step with the table
+    refresh_quality_view(table_name, engine)
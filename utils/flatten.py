@@ -0,0 +1,107 @@
+import pandas as pd
+
+
+class _Node:
+    """One path of the learned schema: its flattened key, column buffer and child paths."""
+    __slots__ = ("key", "column", "children")
+
+    def __init__(self, key):
+        self.key = key
+        self.column = None
+        self.children = {}
+
+
+class RecordFlattener:
+    """
+    Flattens nested records into one buffer per leaf key, with the same key naming as
+    `extract_leaf_nodes` (`entity.legalAddress.addressLines.1`, ...).
+
+    Keys are built once, the first time a path is seen, and kept in a schema tree that later
+    records are walked against, so no per-record dicts or key strings are created. Variable
+    length lists simply grow the tree with new positions.
+    """
+
+    def __init__(self):
+        self.root = _Node("")
+        self.columns = {}
+        self.n_rows = 0
+
+    def _child(self, node, name):
+        child = node.children.get(name)
+        if child is None:
+            key = f"{node.key}.{name}" if node.key else str(name)
+            child = node.children[name] = _Node(key)
+        return child
+
+    def _column(self, node):
+        column = self.columns.get(node.key)
+        if column is None:
+            column = self.columns[node.key] = []
+        node.column = column
+        return column
+
+    def _walk(self, items, node, row):
+        """Walk `(name, value)` pairs of one dict or list against the schema tree."""
+        children = node.children
+        for name, value in items:
+            child = children.get(name)
+            if child is None:
+                child = self._child(node, name)
+
+            if isinstance(value, dict):
+                self._walk(value.items(), child, row)
+            elif isinstance(value, list):
+                self._walk(enumerate(value, 1), child, row)
+            else:
+                column = child.column
+                if column is None:
+                    column = self._column(child)
+                filled = len(column)
+                if filled == row:
+                    column.append(value)
+                elif filled < row:
+                    column.extend([None] * (row - filled))
+                    column.append(value)
+                else:
+                    # Same key reached twice in one record: last value wins, like dict.update
+                    column[row] = value
+
+    def add(self, record):
+        """Append one nested record as a row."""
+        if isinstance(record, dict):
+            self._walk(record.items(), self.root, self.n_rows)
+        elif isinstance(record, list):
+            self._walk(enumerate(record, 1), self.root, self.n_rows)
+        else:
+            self._walk([("", record)], _Node(""), self.n_rows)
+        self.n_rows += 1
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def to_columns(self):
+        """Column buffers padded to the number of rows, keyed in first-seen order."""
+        for column in self.columns.values():
+            if len(column) < self.n_rows:
+                column.extend([None] * (self.n_rows - len(column)))
+        return self.columns
+
+    def to_frame(self):
+        return pd.DataFrame(self.to_columns(), index=pd.RangeIndex(self.n_rows))
+
+    def reset(self):
+        """Drop the buffered rows but keep the learned schema."""
+        self.columns = {}
+        self.n_rows = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            node.column = None
+            stack.extend(node.children.values())
+
+
+def flatten_records(records):
+    """Flatten an iterable of nested records straight into a DataFrame."""
+    return RecordFlattener().add_many(records).to_frame()
@@ -0,0 +1,251 @@
+import csv
+import gzip
+import io
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+# Elements that may repeat under the same parent. Their 1-based position becomes part of the
+# flattened key, like list indices in the API payload. Additional address lines start at 2
+# because the first line of an address is its own element.
+REPEATED_START = {
+    "OtherEntityName": 1,
+    "TransliteratedOtherEntityName": 1,
+    "OtherAddress": 1,
+    "TransliteratedOtherAddress": 1,
+    "AdditionalAddressLine": 2,
+    "OtherValidationAuthority": 1,
+    "SuccessorEntity": 1,
+}
+
+ADDRESS_FIELDS = {
+    ("@xml:lang",): "language",
+    ("@type",): "type",
+    ("FirstAddressLine",): "addressLines.1",
+    ("AdditionalAddressLine",): "addressLines.{}",
+    ("AddressNumber",): "addressNumber",
+    ("AddressNumberWithinBuilding",): "addressNumberWithinBuilding",
+    ("MailRouting",): "mailRouting",
+    ("City",): "city",
+    ("Region",): "region",
+    ("Country",): "country",
+    ("PostalCode",): "postalCode",
+}
+
+NAME_FIELDS = {
+    (): "name",
+    ("@xml:lang",): "language",
+    ("@type",): "type",
+}
+
+VALIDATION_FIELDS = {
+    ("ValidationAuthorityID",): "validatedAt.id",
+    ("OtherValidationAuthorityID",): "validatedAt.other",
+    ("ValidationAuthorityEntityID",): "validatedAs",
+}
+
+
+def _prefixed(tags, prefix, fields):
+    return {tuple(tags) + key: f"{prefix}.{path}" for key, path in fields.items()}
+
+
+# LEI-CDF element path -> flattened API key, as produced by extract_leaf_nodes on the
+# lei-records `attributes`. `{}` placeholders take the positions of repeated elements.
+CDF_PATHS = {
+    ("LEI",): "lei",
+    ("Entity", "LegalName"): "entity.legalName.name",
+    ("Entity", "LegalName", "@xml:lang"): "entity.legalName.language",
+    **_prefixed(("Entity", "OtherEntityNames", "OtherEntityName"),
+                "entity.otherNames.{}", NAME_FIELDS),
+    **_prefixed(("Entity", "TransliteratedOtherEntityNames", "TransliteratedOtherEntityName"),
+                "entity.transliteratedOtherNames.{}", NAME_FIELDS),
+    **_prefixed(("Entity", "LegalAddress"), "entity.legalAddress", ADDRESS_FIELDS),
+    **_prefixed(("Entity", "HeadquartersAddress"), "entity.headquartersAddress", ADDRESS_FIELDS),
+    **_prefixed(("Entity", "OtherAddresses", "OtherAddress"),
+                "entity.otherAddresses.{}", ADDRESS_FIELDS),
+    **_prefixed(("Entity", "TransliteratedOtherAddresses", "TransliteratedOtherAddress"),
+                "entity.transliteratedOtherAddresses.{}", ADDRESS_FIELDS),
+    ("Entity", "RegistrationAuthority", "RegistrationAuthorityID"): "entity.registeredAt.id",
+    ("Entity", "RegistrationAuthority", "OtherRegistrationAuthorityID"): "entity.registeredAt.other",
+    ("Entity", "RegistrationAuthority", "RegistrationAuthorityEntityID"): "entity.registeredAs",
+    ("Entity", "LegalJurisdiction"): "entity.jurisdiction",
+    ("Entity", "EntityCategory"): "entity.category",
+    ("Entity", "EntitySubCategory"): "entity.subCategory",
+    ("Entity", "LegalForm", "EntityLegalFormCode"): "entity.legalForm.id",
+    ("Entity", "LegalForm", "OtherLegalForm"): "entity.legalForm.other",
+    ("Entity", "AssociatedEntity", "AssociatedLEI"): "entity.associatedEntity.lei",
+    ("Entity", "AssociatedEntity", "AssociatedEntityName"): "entity.associatedEntity.name",
+    ("Entity", "EntityStatus"): "entity.status",
+    ("Entity", "EntityCreationDate"): "entity.creationDate",
+    ("Entity", "EntityExpirationDate"): "entity.expiration.date",
+    ("Entity", "EntityExpirationReason"): "entity.expiration.reason",
+    ("Entity", "SuccessorEntity", "SuccessorLEI"): "entity.successorEntity.lei",
+    ("Entity", "SuccessorEntity", "SuccessorEntityName"): "entity.successorEntity.name",
+    ("Registration", "InitialRegistrationDate"): "registration.initialRegistrationDate",
+    ("Registration", "LastUpdateDate"): "registration.lastUpdateDate",
+    ("Registration", "RegistrationStatus"): "registration.status",
+    ("Registration", "NextRenewalDate"): "registration.nextRenewalDate",
+    ("Registration", "ManagingLOU"): "registration.managingLou",
+    ("Registration", "ValidationSources"): "registration.corroborationLevel",
+    **_prefixed(("Registration", "ValidationAuthority"), "registration", VALIDATION_FIELDS),
+    **_prefixed(("Registration", "OtherValidationAuthorities", "OtherValidationAuthority"),
+                "registration.otherValidationAuthorities.{}", VALIDATION_FIELDS),
+}
+
+
+def _lower_first(tag):
+    return tag[:1].lower() + tag[1:]
+
+
+def cdf_key(tags, positions):
+    """Flattened API key for a LEI-CDF element path and the positions of its repeated elements."""
+    path = CDF_PATHS.get(tuple(tags))
+    if path is not None:
+        return path.format(*positions)
+
+    # Unmapped elements keep their own names, camelCased like the API
+    parts = []
+    positions = iter(positions)
+    for tag in tags:
+        parts.append(_lower_first(tag.lstrip("@").replace("xml:lang", "language")))
+        if tag in REPEATED_START:
+            parts.append(str(next(positions)))
+    return ".".join(parts)
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _attribute_name(name):
+    if name == "{http://www.w3.org/XML/1998/namespace}lang":
+        return "@xml:lang"
+    return "@" + _local(name)
+
+
+def _flatten_element(elem, tags, positions, record):
+    for name, value in elem.attrib.items():
+        record[cdf_key(tags + (_attribute_name(name),), positions)] = value
+
+    text = elem.text.strip() if elem.text else ""
+    if text and len(elem) == 0:
+        record[cdf_key(tags, positions)] = text
+
+    seen = {}
+    for child in elem:
+        tag = _local(child.tag)
+        child_positions = positions
+        if tag in REPEATED_START:
+            seen[tag] = seen.get(tag, REPEATED_START[tag] - 1) + 1
+            child_positions = positions + (seen[tag],)
+        _flatten_element(child, tags + (tag,), child_positions, record)
+
+
+def flatten_cdf_record(elem):
+    """Flatten one <LEIRecord> element into the API's leaf-node key naming."""
+    record = {}
+    for child in elem:
+        tag = _local(child.tag)
+        if tag != "Extension":
+            _flatten_element(child, (tag,), (), record)
+    return record
+
+
+def _cdf_column_key(column):
+    """Flattened API key for a golden-copy CSV header such as `Entity.LegalAddress.AdditionalAddressLine.1`."""
+    tags, positions = [], []
+    for part in column.split("."):
+        if part.isdigit():
+            # CSV positions count repeated elements from 1, additional address lines included
+            positions.append(int(part) + REPEATED_START.get(tags[-1], 1) - 1)
+        elif part == "xmllang":
+            tags.append("@xml:lang")
+        elif part[:1].islower():
+            tags.append("@" + part)
+        else:
+            tags.append(part)
+    return cdf_key(tags, positions)
+
+
+def open_golden_copy(path):
+    """
+    Open a golden-copy file as a binary stream, looking inside .zip and .gz archives.
+    Returns the stream and the name of the file it holds.
+    """
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if not name.endswith("/"))
+        return archive.open(member), member
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb"), path[:-3]
+    return open(path, "rb"), path
+
+
+def iter_golden_copy_xml(stream, chunk_size=10000, columns=None):
+    """Yield DataFrames of `chunk_size` flattened records from a LEI-CDF XML stream."""
+    records = []
+    container = None
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            if tag == "LEIRecords":
+                container = elem
+            continue
+        if tag != "LEIRecord":
+            continue
+
+        record = flatten_cdf_record(elem)
+        if columns is not None:
+            record = {key: record.get(key) for key in columns}
+        records.append(record)
+
+        # Drop the parsed element so memory is bounded by the chunk, not the file
+        elem.clear()
+        if container is not None:
+            container.remove(elem)
+
+        if len(records) == chunk_size:
+            yield pd.DataFrame(records)
+            records = []
+
+    if records:
+        yield pd.DataFrame(records)
+
+
+def iter_golden_copy_csv(stream, chunk_size=10000, columns=None):
+    """Yield DataFrames of `chunk_size` flattened records from a golden-copy CSV stream."""
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    header = next(csv.reader([text_stream.readline()]))
+    keys = {column: _cdf_column_key(column) for column in header}
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = [column for column in header if keys[column] in wanted]
+
+    reader = pd.read_csv(text_stream, names=header, header=None, usecols=usecols, dtype=str,
+                         keep_default_na=False, na_values=[""], chunksize=chunk_size)
+    for chunk in reader:
+        chunk = chunk.rename(columns=keys)
+        if columns is not None:
+            chunk = chunk.reindex(columns=list(columns))
+        yield chunk
+
+
+def iter_golden_copy(path, chunk_size=10000, columns=None):
+    """
+    Stream a GLEIF golden-copy or concatenated file (XML or CSV, optionally zipped) as
+    DataFrames of `chunk_size` records, with columns named like `extract_leaf_nodes` output.
+    Pass `columns` to keep only some flattened keys.
+    """
+    stream, name = open_golden_copy(path)
+    with stream:
+        extension = os.path.splitext(name)[1].lower()
+        if extension == ".xml":
+            yield from iter_golden_copy_xml(stream, chunk_size, columns)
+        elif extension == ".csv":
+            yield from iter_golden_copy_csv(stream, chunk_size, columns)
+        else:
+            raise ValueError(f"Unsupported golden copy format: {name}")
@@ -0,0 +1,161 @@
+import glob
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from utils.incremental import lei_hash
+from utils.rollup import ROLLUP_DIMENSIONS
+from utils.tracing import traced
+
+HISTORY_DIR = os.environ.get("LEI_HISTORY_DIR", ".lei_history")
+HISTORY_DIMENSIONS = list(ROLLUP_DIMENSIONS)
+VERSION_COLUMNS = ["lei", "lei_key", "QualityScore"] + HISTORY_DIMENSIONS
+AGGREGATE_COLUMNS = ["date", "dimension", "value", "records", "score_sum"]
+
+
+def _scores_path(name, history_dir):
+    return os.path.join(history_dir, name, "scores")
+
+
+def _daily_path(name, history_dir):
+    return os.path.join(history_dir, name, "daily.parquet")
+
+
+def _latest_path(name, history_dir):
+    return os.path.join(history_dir, name, "latest.parquet")
+
+
+def _write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _versions(df):
+    """Score and dimension values of each LEI of a scored frame, first occurrence only."""
+    rows = df[df["lei"].notna().to_numpy() & ~df["lei"].duplicated().to_numpy()]
+    versions = {"lei": rows["lei"].astype("string").array, "lei_key": lei_hash(rows),
+                "QualityScore": rows["QualityScore"].to_numpy(dtype=np.int16)}
+    for name, col in ROLLUP_DIMENSIONS.items():
+        versions[name] = (rows[col].astype("string").array if col in rows.columns
+                          else pd.array([pd.NA] * len(rows), dtype="string"))
+    return pd.DataFrame(versions)
+
+
+def latest_scores(name='test', history_dir=HISTORY_DIR):
+    """The last recorded version of every live LEI in history `name`, or None before the first run."""
+    path = _latest_path(name, history_dir)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    paths = sorted(glob.glob(os.path.join(_scores_path(name, history_dir), "date=*", "*.parquet")))
+    if not paths:
+        return None
+    # Histories written before latest.parquet existed: replay the part files once, which are
+    # named by run time, so the last version of an LEI is its last occurrence
+    history = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    history = history.drop_duplicates("lei_key", keep="last")
+    if "retired" in history.columns:
+        history = history[~history["retired"].fillna(False).to_numpy(dtype=bool)]
+    latest = history[VERSION_COLUMNS].sort_values("lei_key", ignore_index=True)
+    _write_parquet(latest, path)
+    return latest
+
+
+def _aggregate(versions, sign=1):
+    """Record counts and score sums of `versions` in total and per value of each dimension."""
+    scores = versions["QualityScore"].to_numpy(dtype=np.int64)
+    parts = []
+    for dimension in ["all"] + HISTORY_DIMENSIONS:
+        values = (pd.Series("", index=versions.index, dtype="string") if dimension == "all"
+                  else versions[dimension])
+        part = pd.DataFrame({"value": values, "records": sign, "score_sum": sign * scores})
+        part = part.groupby("value", dropna=False, sort=False).sum().reset_index()
+        part.insert(0, "dimension", dimension)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+@traced()
+def record_history(df, name='test', day=None, history_dir=HISTORY_DIR, complete=False):
+    """
+    Add a scoring run of `df` on `day` (today by default) to history `name`, and return `df`.
+
+    Only records that are new or whose score or dimension values changed since their last
+    recorded version are written, with their previous score, to the `date=<day>` partition;
+    `latest.parquet` keeps the last version of every LEI and is updated by each run. Records
+    absent from `df` keep their last version, so runs over filtered frames only update what
+    they scored. A `complete` run holds every record of the dataset: the LEIs it no longer
+    has are retired, written with `retired` set and dropped from the latest versions. The
+    daily aggregates of `day` are the latest earlier ones with the changed and retired
+    records' old versions taken out and the changed records' new ones added.
+    """
+    day = pd.Timestamp(day or pd.Timestamp.today(tz="utc").date())
+    current = _versions(df)
+    previous = latest_scores(name, history_dir)
+    if previous is None:
+        previous = current.iloc[:0]
+    merged = current.merge(previous.drop(columns="lei"), on="lei_key", how="left",
+                           suffixes=("", "_old"), indicator=True)
+    differs = merged["_merge"].eq("left_only").to_numpy()
+    for col in ["QualityScore"] + HISTORY_DIMENSIONS:
+        new, recorded = merged[col], merged[f"{col}_old"]
+        same = new.eq(recorded).fillna(False) | (new.isna() & recorded.isna())
+        differs = differs | ~same.to_numpy(dtype=bool)
+    changed = current[differs]
+    recorded = differs & merged["_merge"].eq("both").to_numpy()
+    old = merged.loc[recorded, [f"{col}_old" for col in VERSION_COLUMNS[2:]]]
+    old.columns = VERSION_COLUMNS[2:]
+    previous_score = merged.loc[differs, "QualityScore_old"].astype("Int16").array
+    retired = previous[~previous["lei_key"].isin(current["lei_key"]).to_numpy()] if complete else previous.iloc[:0]
+    daily = daily_aggregates(name, history_dir=history_dir)
+    if not len(changed) and not len(retired) and (daily["date"] == day).any():
+        return df
+
+    if len(changed) or len(retired):
+        run = pd.Timestamp.now(tz="utc")
+        deltas = pd.concat([changed.assign(previous_score=previous_score, retired=False),
+                            retired.assign(previous_score=retired["QualityScore"].astype("Int16").array,
+                                           retired=True)], ignore_index=True).assign(run=run)
+        _write_parquet(deltas, os.path.join(_scores_path(name, history_dir), f"date={day.date().isoformat()}",
+                                            f"part-{run.strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"))
+        replaced = previous["lei_key"].isin(changed["lei_key"]) | previous["lei_key"].isin(retired["lei_key"])
+        latest = pd.concat([previous[~replaced.to_numpy()], changed], ignore_index=True)
+        _write_parquet(latest.sort_values("lei_key", ignore_index=True), _latest_path(name, history_dir))
+
+    # A day without changes still gets its aggregates, so the trend has a point per scored day
+    earlier = daily[daily["date"] <= day]
+    base = earlier[earlier["date"] == earlier["date"].max()] if len(earlier) else earlier
+    updated = pd.concat([base.drop(columns="date"), _aggregate(changed), _aggregate(old, sign=-1),
+                         _aggregate(retired, sign=-1)], ignore_index=True)
+    updated = updated.groupby(["dimension", "value"], dropna=False, sort=False)[["records", "score_sum"]].sum().reset_index()
+    updated = updated[updated["records"] != 0].assign(date=day)[AGGREGATE_COLUMNS]
+    daily = pd.concat([daily[daily["date"] != day], updated], ignore_index=True)
+    _write_parquet(daily.sort_values(["date", "dimension", "value"], ignore_index=True),
+                   _daily_path(name, history_dir))
+    return df
+
+
+def daily_aggregates(name='test', dimension=None, history_dir=HISTORY_DIR):
+    """Record counts and score sums per day, in total and per dimension value (or of one `dimension`)."""
+    path = _daily_path(name, history_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "dimension": pd.Series(dtype="string"),
+                             "value": pd.Series(dtype="string"), "records": pd.Series(dtype="int64"),
+                             "score_sum": pd.Series(dtype="int64")})
+    filters = [("dimension", "==", dimension)] if dimension else None
+    return pd.read_parquet(path, filters=filters).astype({"dimension": "string", "value": "string"})
+
+
+def score_trend(name='test', dimension="all", values=None, history_dir=HISTORY_DIR):
+    """
+    Average score per recorded day, in total or per value of `dimension` (limited to
+    `values`), read from the daily aggregates: the cost depends on the days, not the records.
+    """
+    trend = daily_aggregates(name, dimension, history_dir)
+    if values:
+        trend = trend[trend["value"].isin(list(values))]
+    trend = trend.assign(avg_score=trend["score_sum"] / trend["records"].where(trend["records"] > 0))
+    return trend[["date", "value", "records", "score_sum", "avg_score"]].reset_index(drop=True)
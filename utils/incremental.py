@@ -0,0 +1,204 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.rules import active_rules, evaluate_rules
+from utils.schema import classify_path
+from utils.tracing import traced
+
+RESULTS_STORE_PATH = os.environ.get("LEI_RESULTS_STORE", ".lei_results.parquet")
+
+
+def cached_rules():
+    """Rules that only depend on the record's own fields, which the content hash covers."""
+    return [r for r in active_rules() if r.scope == "row" and not r.volatile]
+
+
+def partitioned_rules():
+    """Global rules whose outcomes are reused for the partitions that did not change."""
+    return [r for r in active_rules() if r.scope == "global" and r.partition is not None and not r.volatile]
+
+
+def hash_columns():
+    return list(dict.fromkeys(["lei"] + [col for r in cached_rules() for col in r.inputs]))
+
+
+def _hash_column(series, kind="text"):
+    """64-bit hash per value of `series`, a column of `kind` (see classify_path)."""
+    if kind == "text" or not pd.api.types.is_string_dtype(series.dtype):
+        # Most text values are distinct, so hashing them directly beats factorizing first
+        return pd.util.hash_pandas_object(series, index=False, categorize=False).to_numpy()
+    # Codes and dates repeat a few thousand values at most: hash each once through a dictionary
+    encoded = pc.dictionary_encode(pa.array(series, from_pandas=True))
+    if isinstance(encoded, pa.ChunkedArray):
+        encoded = encoded.combine_chunks()
+    values = np.append(pd.util.hash_array(encoded.dictionary.to_numpy(zero_copy_only=False), categorize=False),
+                       np.uint64(0))
+    return values[np.asarray(pc.fill_null(encoded.indices, len(encoded.dictionary)), dtype=np.int64)]
+
+
+def _mix(values):
+    # splitmix64 finalizer, so sums of mixed hashes do not cancel out like plain sums or xors
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def lei_hash(df):
+    """64-bit key per record's LEI, used to look records up in the sorted results store."""
+    return _hash_column(df["lei"])
+
+
+def content_hash(df, keys=None, columns=None, column_hashes=None):
+    """
+    64-bit hash per record of `columns`, by default the fields the row checks read.
+    `column_hashes` keeps the hash of every column read, for the next call over the same frame.
+    """
+    column_hashes = {} if column_hashes is None else column_hashes
+    hashes = (lei_hash(df) if keys is None else keys).copy()
+    for col in hash_columns() if columns is None else columns:
+        if col == "lei":
+            continue
+        if col not in column_hashes:
+            values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+            column_hashes[col] = _hash_column(values, classify_path(col))
+        hashes *= np.uint64(1000003)
+        hashes ^= column_hashes[col]
+    return hashes
+
+
+def partition_signatures(partition_keys, hashes):
+    """
+    Partition of every record, as codes, and a 64-bit signature of its partition: a hash of
+    the content hashes of its records in frame order. A partition's signature only stays the
+    same while it holds the same records, unchanged and in the same order.
+    """
+    if isinstance(partition_keys, (pa.Array, pa.ChunkedArray)):
+        codes = pc.fill_null(pc.dictionary_encode(partition_keys).indices, -1)
+        codes = np.asarray(codes, dtype=np.int64) + 1
+    else:
+        codes = pd.factorize(partition_keys)[0] + 1
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(codes) else np.zeros(0, int)
+    sizes = np.diff(np.r_[starts, len(codes)])
+    ranks = np.arange(len(codes), dtype=np.uint64) - np.repeat(starts, sizes).astype(np.uint64)
+    members = _mix(hashes[order] ^ _mix(ranks))
+    signatures = np.empty(len(codes), dtype=np.uint64)
+    signatures[order] = np.repeat(np.add.reduceat(members, starts) if len(starts) else members, sizes)
+    return codes, signatures
+
+
+def load_results_store(path=RESULTS_STORE_PATH):
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def save_results_store(store, path=RESULTS_STORE_PATH):
+    tmp_path = f"{path}.tmp"
+    store.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _rows(df, mask):
+    # A first run selects every record, which needs no copy of the frame
+    return df if mask.all() else df.loc[mask]
+
+
+def _signature_column(r):
+    return f"{r.name}.partition"
+
+
+@traced()
+def run_incremental_checks(df, store_path=RESULTS_STORE_PATH):
+    """
+    Same result as run_quality_checks, but row rules are only evaluated for records whose
+    content hash is new or changed since the last run; the others reuse the outcomes kept in
+    the per-LEI results store at `store_path`.
+
+    Global rules with a partition, such as near-duplicates within an address block, are only
+    evaluated over the partitions whose signature changed: a record added, changed, removed or
+    moved re-runs its old and new partitions. Other global rules such as uniqueness and
+    volatile rules such as expiry are recomputed for every record: uniqueness over the whole
+    LEI column so it stays correct globally however few records changed, expiry because it
+    depends on today's date. Both are single vectorized passes.
+    """
+    rules = active_rules()
+    cached = cached_rules()
+    partitioned = partitioned_rules()
+    keys = lei_hash(df)
+    column_hashes = {}
+    hashes = content_hash(df, keys, column_hashes=column_hashes)
+    partitions = {r.name: partition_signatures(r.partition(df), content_hash(df, keys, r.inputs, column_hashes))
+                  for r in partitioned}
+    n_rows = len(df)
+    results = {r.name: np.zeros(n_rows, dtype=bool) for r in cached + partitioned}
+    changed = np.ones(n_rows, dtype=bool)
+    rerun = {r.name: np.ones(n_rows, dtype=bool) for r in partitioned}
+    # Duplicate LEIs, found through their keys rather than by comparing the strings again
+    order = np.argsort(keys, kind="stable")
+    repeated = np.r_[False, keys[order][1:] == keys[order][:-1]]
+    first = np.empty(n_rows, dtype=bool)
+    first[order] = ~repeated
+    shared = np.zeros(n_rows, dtype=bool)
+    shared[order] = repeated | np.r_[repeated[1:], False]
+
+    store = load_results_store(store_path)
+    stored_columns = list(results) + [_signature_column(r) for r in partitioned]
+    if store is not None and (not len(store) or not all(col in store.columns for col in stored_columns)):
+        # The store is empty or predates one of the rules
+        store = None
+    if store is not None:
+        # The store is sorted by LEI key, so lookups are a binary search
+        store_keys = store["lei_key"].to_numpy()
+        positions = np.minimum(np.searchsorted(store_keys, keys), len(store) - 1)
+        found = store_keys[positions] == keys
+        unchanged = found & (store["content_hash"].to_numpy()[positions] == hashes)
+        changed = ~unchanged
+        stale = changed.copy()
+        for r in cached:
+            results[r.name][unchanged] = store[r.name].to_numpy()[positions[unchanged]]
+
+        # Records sharing their LEI share a store entry, so their partitions always re-run
+        distinct = found & ~shared
+        for r in partitioned:
+            codes, signatures = partitions[r.name]
+            current = store[_signature_column(r)].to_numpy()[positions] == signatures
+            stale |= ~current
+            current &= distinct
+            rerun[r.name] = (np.bincount(codes[~current], minlength=codes.max(initial=0) + 1) > 0)[codes]
+            reused = ~rerun[r.name]
+            results[r.name][reused] = store[r.name].to_numpy()[positions[reused]]
+
+    if changed.any():
+        for name, passed in evaluate_rules(_rows(df, changed), cached).items():
+            results[name][changed] = passed
+    for r in partitioned:
+        if rerun[r.name].any():
+            results[r.name][rerun[r.name]] = evaluate_rules(_rows(df, rerun[r.name]), [r])[r.name]
+
+    # Other global and time-dependent rules always run over the whole frame
+    results.update(evaluate_rules(df, [r for r in rules if r not in cached and r not in partitioned]))
+    for r in rules:
+        df[r.name] = results[r.name]
+
+    # The store keeps the first occurrence of each LEI, and is only written when one changed
+    keep = df["lei"].notna().to_numpy() & first
+    if store is None or (stale & keep).any():
+        current = pd.DataFrame({"lei_key": keys[keep], "content_hash": hashes[keep]})
+        for r in cached + partitioned:
+            current[r.name] = results[r.name][keep]
+        for r in partitioned:
+            current[_signature_column(r)] = partitions[r.name][1][keep]
+        # Records outside this frame (e.g. filtered out) keep their stored results
+        if store is not None:
+            outside = np.ones(len(store), dtype=bool)
+            outside[positions[found]] = False
+            current = pd.concat([store[outside], current], ignore_index=True)
+        save_results_store(current.sort_values("lei_key", ignore_index=True), store_path)
+
+    return df
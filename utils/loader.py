@@ -0,0 +1,127 @@
+import io
+
+from utils.db import quote
+from utils.schema import migrate
+from utils.tracing import traced
+
+COPY_CHUNK_ROWS = 50000
+DATA_VERSION_TABLE = "lei_data_versions"
+
+
+def ensure_table(cur, table_name, columns):
+    """
+    Migrate `table_name` to hold `columns` and make sure `lei` has its unique index. A table
+    written before the index existed can repeat LEIs, which is reported instead of indexed.
+    """
+    schema = migrate(cur, table_name, columns)
+    index = quote(table_name + "_lei_key")
+    cur.execute("SELECT to_regclass(%s)", (index,))
+    if cur.fetchone()[0] is None:
+        cur.execute(f"SELECT lei, count(*) OVER () FROM {quote(table_name)} WHERE lei IS NOT NULL "
+                    f"GROUP BY lei HAVING count(*) > 1 ORDER BY lei LIMIT 5")
+        duplicates = cur.fetchall()
+        if duplicates:
+            examples = ", ".join(lei for lei, _ in duplicates)
+            raise ValueError(f"{table_name} repeats {duplicates[0][1]} LEIs (e.g. {examples}); "
+                             f"remove the duplicate records before loading it with COPY")
+        cur.execute(f"CREATE UNIQUE INDEX {index} ON {quote(table_name)} (lei)")
+    return schema
+
+
+def bump_data_version(cur, table_name):
+    """Advance the load watermark of `table_name`, inside the caller's transaction."""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute(f"INSERT INTO {DATA_VERSION_TABLE} (table_name, version) VALUES (%s, 1) "
+                f"ON CONFLICT (table_name) DO UPDATE "
+                f"SET version = {DATA_VERSION_TABLE}.version + 1, loaded_at = now()",
+                (table_name,))
+
+
+def _csv_field(values):
+    """Quote every present value, so that only missing ones are the unquoted empty NULL of COPY."""
+    quoted = '"' + values.astype(str).str.replace('"', '""', regex=False) + '"'
+    return quoted.where(values.notna(), "")
+
+
+def copy_into(cur, table_name, df, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    COPY the rows of `df` into `table_name`, serializing at most `chunk_rows` rows at a time.
+    Values are always quoted, so empty strings and any text (`\\N` included) survive as text.
+    """
+    columns = ", ".join(quote(col) for col in df.columns)
+    sql = f"COPY {quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        fields = [_csv_field(chunk[col]) for col in chunk.columns]
+        rows = fields[0].str.cat(fields[1:], sep=",") if len(fields) > 1 else fields[0]
+        cur.copy_expert(sql, io.StringIO("\n".join(rows) + "\n"))
+
+
+@traced()
+def copy_upsert(df, engine, table_name="test", on_conflict="update"):
+    """
+    Bulk-load `df` with COPY FROM STDIN into an unlogged staging table, then merge it into
+    `table_name` with INSERT ... ON CONFLICT (lei). The table is migrated first through the
+    schema registry, so new paths get typed columns. With `on_conflict="update"` records whose
+    values changed are updated, with `"nothing"` known LEIs are left as they are.
+    Runs in one transaction, advancing the table's load watermark when rows changed, and
+    returns the number of inserted, updated and unchanged rows.
+    """
+    if on_conflict not in ("update", "nothing"):
+        raise ValueError(f"on_conflict must be 'update' or 'nothing', not {on_conflict!r}")
+
+    columns = list(df.columns)
+    staging = f"{table_name}_staging"
+    column_list = ", ".join(quote(col) for col in columns)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            ensure_table(cur, table_name, columns)
+            cur.execute(f"DROP TABLE IF EXISTS {quote(staging)}")
+            cur.execute(f"CREATE UNLOGGED TABLE {quote(staging)} (LIKE {quote(table_name)})")
+            copy_into(cur, staging, df)
+
+            # A LEI repeated within the batch keeps its last occurrence
+            source = (f"SELECT DISTINCT ON (lei) {column_list} FROM {quote(staging)} "
+                      f"WHERE lei IS NOT NULL ORDER BY lei, ctid DESC")
+            updates = [col for col in columns if col != "lei"]
+            if on_conflict == "nothing" or not updates:
+                conflict = "DO NOTHING"
+            else:
+                assignments = ", ".join(f"{quote(col)} = EXCLUDED.{quote(col)}" for col in updates)
+                current = ", ".join(f"main.{quote(col)}" for col in updates)
+                incoming = ", ".join(f"EXCLUDED.{quote(col)}" for col in updates)
+                conflict = (f"DO UPDATE SET {assignments} "
+                            f"WHERE ROW({current}) IS DISTINCT FROM ROW({incoming})")
+
+            cur.execute(f"""
+                WITH merged AS (
+                    INSERT INTO {quote(table_name)} AS main ({column_list})
+                    {source}
+                    ON CONFLICT (lei) {conflict}
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+                FROM merged
+            """)
+            inserted, updated = cur.fetchone()
+            cur.execute(f"SELECT count(DISTINCT lei) FROM {quote(staging)}")
+            staged = cur.fetchone()[0]
+            cur.execute(f"DROP TABLE {quote(staging)}")
+            if inserted or updated:
+                bump_data_version(cur, table_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return {"inserted": inserted, "updated": updated, "unchanged": staged - inserted - updated}
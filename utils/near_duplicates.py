@@ -0,0 +1,370 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+
+from utils.db import get_engine, quote
+from utils.loader import copy_into
+from utils.rules import rule
+from utils.search import LEGAL_NAME, TRANSLITERATED_NAME
+from utils.tracing import span, traced
+
+ADDRESS_LINE = "entity.legalAddress.addressLines.1"
+CITY = "entity.legalAddress.city"
+POSTAL_CODE = "entity.legalAddress.postalCode"
+COUNTRY = "entity.legalAddress.country"
+NEAR_DUPLICATE_INPUTS = ["lei", LEGAL_NAME, TRANSLITERATED_NAME, ADDRESS_LINE, CITY, POSTAL_CODE, COUNTRY]
+NEAR_DUPLICATES_TABLE = "lei_near_duplicates"
+NEAR_DUPLICATE_KEYS_TABLE = "lei_near_duplicate_keys"
+PAIR_COLUMNS = ["lei_a", "name_a", "lei_b", "name_b", "country", "postal_code", "similarity"]
+
+# MinHash signatures of NUM_PERM hashes, cut into LSH_BANDS bands: two records agreeing on
+# every hash of some band become a candidate pair, which with 8 bands of 4 hashes is likely
+# from a Jaccard similarity of about 0.6 up
+NUM_PERM = 32
+LSH_BANDS = 8
+# Candidates are kept from this Jaccard similarity of their name and address trigrams
+SIMILARITY_THRESHOLD = 0.7
+# Records in the same bucket are paired with their next few neighbours only, so a bucket of
+# many near-identical records gives a chain of pairs instead of every pair
+LSH_WINDOW = 8
+# Trigrams hashed at once, which bounds the (trigrams, NUM_PERM) array of hash values
+MINHASH_CHUNK = 1 << 20
+
+_rng = np.random.default_rng(17442)
+_HASH_A = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint32) | np.uint32(1)
+_HASH_B = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint32)
+
+
+def _column(df, name):
+    return df[name] if name in df else pd.Series(None, index=df["lei"].index, dtype=object)
+
+
+def _clean(series):
+    """Lower-cased Arrow strings of `series` without accents, punctuation or repeated spaces."""
+    values = pc.cast(pa.array(series.astype("string"), from_pandas=True), pa.large_string())
+    # Frames concatenated from chunks hold chunked columns; the trigram and block code read buffers
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    values = pc.replace_substring_regex(pc.utf8_normalize(values, "NFKD"), r"\p{Mn}", "")
+    values = pc.replace_substring_regex(pc.utf8_lower(values), r"[^\p{L}\p{N}]+", " ")
+    return pc.utf8_trim_whitespace(values)
+
+
+def _clean_distinct(series):
+    """`_clean(series)`, cleaning each distinct value once: for the short, repetitive block fields."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = _clean(series.cat.categories.to_series())
+        indices = pa.array(series.cat.codes.to_numpy(), mask=series.isna().to_numpy())
+    else:
+        encoded = pc.dictionary_encode(pa.array(series.astype("string"), from_pandas=True))
+        if isinstance(encoded, pa.ChunkedArray):
+            encoded = encoded.combine_chunks()
+        values, indices = _clean(encoded.dictionary.to_pandas()), encoded.indices
+    return values.take(indices)
+
+
+def _join(separator, *values):
+    """Element-wise concatenation of large string arrays, nulls taken as empty strings."""
+    values = [pc.fill_null(value, "") if isinstance(value, (pa.Array, pa.ChunkedArray)) else value
+              for value in values]
+    return pc.binary_join_element_wise(*values, pa.scalar(separator, pa.large_string()))
+
+
+def _ragged(starts, sizes):
+    """Positions of the ranges [start, start + size), concatenated."""
+    return np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes - starts, sizes)
+
+
+def _distinct(values):
+    """Sorted distinct `values`; sorting beats np.unique's hashing on these integer keys."""
+    values = np.sort(values)
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+
+def _trigrams(texts):
+    """
+    Distinct byte trigrams of every string of `texts`, as 24-bit codes sorted by string and
+    code, with the position of the first trigram of each string and their number.
+    """
+    texts = pc.fill_null(texts, "")
+    offsets = np.frombuffer(texts.buffers()[1], dtype=np.int64)[texts.offset:texts.offset + len(texts) + 1]
+    data = texts.buffers()[2]
+    data = np.frombuffer(data, dtype=np.uint8).astype(np.uint32) if data is not None else np.zeros(0, np.uint32)
+    sizes = np.maximum(np.diff(offsets) - 2, 0)
+    positions = _ragged(offsets[:-1], sizes)
+    keys = (np.repeat(np.arange(len(texts), dtype=np.int64), sizes) << 24
+            | (data[positions] << 16 | data[positions + 1] << 8 | data[positions + 2]).astype(np.int64))
+    keys = _distinct(keys)
+    sizes = np.bincount(keys >> 24, minlength=len(texts))
+    return (keys & 0xFFFFFF).astype(np.uint32), np.cumsum(sizes) - sizes, sizes
+
+
+def _signatures(codes, starts, sizes):
+    """MinHash signature of every trigram set, one row of NUM_PERM hashes per set."""
+    # Mixed once so the per-permutation multiply sees well spread bits
+    mixed = codes * np.uint32(0x9E3779B1)
+    mixed ^= mixed >> np.uint32(15)
+    signatures = np.empty((len(sizes), NUM_PERM), dtype=np.uint32)
+    ends = starts + sizes
+    first = 0
+    while first < len(sizes):
+        last = max(int(np.searchsorted(ends, starts[first] + MINHASH_CHUNK, side="right")), first + 1)
+        # One row per permutation, so the reduction runs along contiguous memory
+        chunk = _HASH_A[:, None] * mixed[None, starts[first]:ends[last - 1]]
+        chunk += _HASH_B[:, None]
+        signatures[first:last] = np.minimum.reduceat(chunk, starts[first:last] - starts[first], axis=1).T
+        first = last
+    return signatures
+
+
+def _bucket_keys(blocks, signatures):
+    """64-bit key of the block and the hashes of `signatures`, per record."""
+    keys = blocks.astype(np.uint64)
+    for column in signatures.T:
+        keys = (keys ^ column) * np.uint64(0x100000001B3)
+    return keys
+
+
+def _bucket_pairs(keys, window=LSH_WINDOW):
+    """Pairs of records with equal keys, each paired with the next `window - 1` in its bucket."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    pairs = []
+    for distance in range(1, window):
+        same = np.flatnonzero(keys[distance:] == keys[:-distance])
+        if not len(same):
+            break
+        pairs.append(np.column_stack([order[same], order[same + distance]]))
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def _jaccard(pairs, codes, starts, sizes, chunk=MINHASH_CHUNK):
+    """Exact Jaccard similarity of the trigram sets of each pair."""
+    similarity = np.empty(len(pairs))
+    first = 0
+    while first < len(pairs):
+        totals = np.cumsum(sizes[pairs[first:, 0]] + sizes[pairs[first:, 1]])
+        last = first + max(int(np.searchsorted(totals, chunk, side="right")), 1)
+        a, b = pairs[first:last, 0], pairs[first:last, 1]
+        ids = np.arange(last - first, dtype=np.int64)
+        tagged = np.concatenate([
+            np.repeat(ids, sizes[a]) << 24 | codes[_ragged(starts[a], sizes[a])],
+            np.repeat(ids, sizes[b]) << 24 | codes[_ragged(starts[b], sizes[b])],
+        ])
+        tagged.sort()
+        common = np.bincount(tagged[1:][tagged[1:] == tagged[:-1]] >> 24, minlength=last - first)
+        similarity[first:last] = common / (sizes[a] + sizes[b] - common)
+        first = last
+    return similarity
+
+
+def near_duplicate_blocks(df):
+    """
+    Block key of every record, as Arrow strings: its legal address country and postal code,
+    or city without a postal code. Only records with the same key are compared.
+    """
+    countries = pc.utf8_upper(_clean_distinct(_column(df, COUNTRY)))
+    postal_codes = pc.replace_substring(pc.utf8_upper(_clean_distinct(_column(df, POSTAL_CODE))), " ", "")
+    postal_codes = pc.if_else(pc.fill_null(pc.not_equal(postal_codes, ""), False), postal_codes,
+                              _join("", pa.scalar("city ", pa.large_string()), _clean_distinct(_column(df, CITY))))
+    return _join("|", countries, postal_codes)
+
+
+@traced()
+def near_duplicate_pairs(df, threshold=SIMILARITY_THRESHOLD):
+    """
+    Pairs of records with different LEIs that look like the same entity: the same legal
+    address country and postal code (or city, without a postal code), and names and first
+    address lines whose trigram sets have a Jaccard similarity of at least `threshold`. The
+    name is the first transliterated name, else the legal name, so names in other scripts
+    compare in Latin letters.
+
+    Records are only compared within their country and postal code block, and within a block
+    only when MinHash LSH puts them in the same bucket, so the work grows with the records
+    rather than the pairs. Returns the positions of both records (`row_a`, `row_b`), their
+    block key and the PAIR_COLUMNS, most similar first.
+    """
+    leis = _column(df, "lei")
+    display = _column(df, TRANSLITERATED_NAME).astype("string").fillna(_column(df, LEGAL_NAME).astype("string"))
+    texts = _join(" ", _clean(display), _clean(_column(df, ADDRESS_LINE)))
+    block_keys = near_duplicate_blocks(df)
+    blocks = np.asarray(pc.dictionary_encode(block_keys).indices, dtype=np.int64)
+
+    # Only records that share their block with another one can have a near-duplicate
+    lengths = pc.utf8_length(pc.utf8_trim_whitespace(texts)).to_numpy(zero_copy_only=False)
+    candidates = leis.notna().to_numpy() & (lengths >= 3)
+    candidates &= np.bincount(blocks[candidates], minlength=len(blocks) + 1)[blocks] >= 2
+    rows = np.flatnonzero(candidates)
+    with span("minhash", rows=len(rows)):
+        codes, starts, sizes = _trigrams(texts.take(pa.array(rows)))
+        signatures = _signatures(codes, starts, sizes)
+        blocks = blocks[rows]
+
+    with span("lsh_buckets", rows=len(rows)):
+        # Records with the same signature in a block are paired once, with the first of them;
+        # only that first one goes through the bands
+        keys = _bucket_keys(blocks, signatures)
+        order = np.argsort(keys, kind="stable")
+        first = np.ones(len(keys), dtype=bool)
+        first[order[1:]] = keys[order[1:]] != keys[order[:-1]]
+        leaders = np.flatnonzero(first)
+        leader_of = np.empty(len(keys), dtype=np.int64)
+        leader_of[order] = order[np.maximum.accumulate(np.where(first[order], np.arange(len(keys)), 0))]
+        pairs = [np.column_stack([leader_of[~first], np.flatnonzero(~first)])]
+        rows_per_band = NUM_PERM // LSH_BANDS
+        for band in range(LSH_BANDS):
+            band_signatures = signatures[leaders, band * rows_per_band:(band + 1) * rows_per_band]
+            pairs.append(leaders[_bucket_pairs(_bucket_keys(blocks[leaders], band_signatures))])
+        pairs = np.sort(np.concatenate(pairs), axis=1)
+        pairs = _distinct(pairs[:, 0] * len(rows) + pairs[:, 1])
+        pairs = np.column_stack([pairs // max(len(rows), 1), pairs % max(len(rows), 1)])
+        # Keys of different blocks can collide, and equal LEIs are UniqueLEI's concern
+        lei_values = leis.to_numpy(dtype=object)
+        pairs = pairs[(blocks[pairs[:, 0]] == blocks[pairs[:, 1]])
+                      & (lei_values[rows[pairs[:, 0]]] != lei_values[rows[pairs[:, 1]]])]
+
+    with span("verify_pairs", rows=len(pairs)):
+        similarity = _jaccard(pairs, codes, starts, sizes)
+        keep = similarity >= threshold
+        row_a, row_b = rows[pairs[keep, 0]], rows[pairs[keep, 1]]
+
+    result = pd.DataFrame({
+        "row_a": row_a,
+        "row_b": row_b,
+        "lei_a": leis.iloc[row_a].astype("string").to_numpy(),
+        "name_a": display.iloc[row_a].to_numpy(),
+        "lei_b": leis.iloc[row_b].astype("string").to_numpy(),
+        "name_b": display.iloc[row_b].to_numpy(),
+        "country": _column(df, COUNTRY).astype("string").iloc[row_a].to_numpy(),
+        "postal_code": _column(df, POSTAL_CODE).astype("string").iloc[row_a].to_numpy(),
+        "similarity": similarity[keep].round(3),
+        "block": block_keys.take(pa.array(row_a)).to_numpy(zero_copy_only=False),
+    })
+    return result.sort_values(["similarity", "lei_a", "lei_b"], ascending=[False, True, True],
+                              ignore_index=True)
+
+
+def _create_near_duplicate_tables(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {NEAR_DUPLICATES_TABLE} (
+            table_oid OID NOT NULL,
+            lei_a TEXT NOT NULL,
+            name_a TEXT,
+            lei_b TEXT NOT NULL,
+            name_b TEXT,
+            country TEXT,
+            postal_code TEXT,
+            similarity REAL NOT NULL
+        )
+    """))
+    conn.execute(text(f"ALTER TABLE {NEAR_DUPLICATES_TABLE} ADD COLUMN IF NOT EXISTS block TEXT"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {NEAR_DUPLICATES_TABLE}_a ON {NEAR_DUPLICATES_TABLE} (table_oid, lei_a)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {NEAR_DUPLICATES_TABLE}_b ON {NEAR_DUPLICATES_TABLE} (table_oid, lei_b)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {NEAR_DUPLICATES_TABLE}_block "
+                      f"ON {NEAR_DUPLICATES_TABLE} (table_oid, block)"))
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {NEAR_DUPLICATE_KEYS_TABLE} (
+            table_oid OID NOT NULL,
+            lei TEXT NOT NULL,
+            block TEXT NOT NULL,
+            input_hash TEXT NOT NULL,
+            PRIMARY KEY (table_oid, lei)
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {NEAR_DUPLICATE_KEYS_TABLE}_block "
+                      f"ON {NEAR_DUPLICATE_KEYS_TABLE} (table_oid, block)"))
+
+
+@traced()
+def sync_near_duplicates(conn, table_name):
+    """
+    Bring the near-duplicate pairs of `table_name` in NEAR_DUPLICATES_TABLE, which the SQL
+    form of NoNearDuplicate reads, up to date with the table. Pairs are keyed by the table's
+    oid, so every table keeps its own.
+
+    NEAR_DUPLICATE_KEYS_TABLE holds the block and a digest of the inputs of every LEI as of
+    the last sync. Only the blocks of records added, changed or removed since then are read
+    back and searched again, so after a delta load the cost follows the changes; the digests
+    are compared in the database. The first sync of a table searches all of it.
+    """
+    columns = {row[0] for row in conn.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = :table"), {"table": table_name})}
+    selected = ", ".join(f"t.{quote(col)}" for col in NEAR_DUPLICATE_INPUTS if col in columns)
+    digest = "md5(concat_ws(chr(31), {}))".format(
+        ", ".join(f"COALESCE(t.{quote(col)}::TEXT, chr(30))" for col in NEAR_DUPLICATE_INPUTS if col in columns))
+    _create_near_duplicate_tables(conn)
+    oid = conn.execute(text("SELECT CAST(:table AS regclass)::oid"), {"table": quote(table_name)}).scalar()
+    params = {"oid": oid}
+    full = not conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {NEAR_DUPLICATE_KEYS_TABLE} "
+                                 f"WHERE table_oid = :oid)"), params).scalar()
+
+    with span("near_duplicate_changes"):
+        changed = pd.read_sql_query(text(f"""
+            SELECT {selected}, {digest} AS input_hash
+            FROM {quote(table_name)} t
+            LEFT JOIN {NEAR_DUPLICATE_KEYS_TABLE} k ON k.table_oid = :oid AND k.lei = t.lei
+            WHERE t.lei IS NOT NULL AND k.input_hash IS DISTINCT FROM {digest}
+            ORDER BY t.lei
+        """), conn, params=params)
+        # Blocks the changed and removed LEIs were in as of the last sync, whose keys go
+        touched = [] if full else [row[0] for row in conn.execute(text(f"""
+            DELETE FROM {NEAR_DUPLICATE_KEYS_TABLE} k
+            WHERE k.table_oid = :oid AND (k.lei = ANY(:leis) OR NOT EXISTS (
+                SELECT 1 FROM {quote(table_name)} t WHERE t.lei = k.lei))
+            RETURNING k.block
+        """), dict(params, leis=changed["lei"].tolist()))]
+
+    keys = pd.DataFrame({"table_oid": oid, "lei": changed["lei"],
+                         "block": near_duplicate_blocks(changed).to_numpy(zero_copy_only=False),
+                         "input_hash": changed["input_hash"]}).drop_duplicates("lei")
+    touched = sorted(set(touched) | set(keys["block"]))
+    with conn.connection.cursor() as cur:
+        copy_into(cur, NEAR_DUPLICATE_KEYS_TABLE, keys)
+
+    if full:
+        conn.execute(text(f"DELETE FROM {NEAR_DUPLICATES_TABLE} WHERE table_oid = :oid"), params)
+        df = changed
+    else:
+        conn.execute(text(f"DELETE FROM {NEAR_DUPLICATES_TABLE} WHERE table_oid = :oid AND block = ANY(:blocks)"),
+                     dict(params, blocks=touched))
+        df = pd.read_sql_query(text(f"""
+            SELECT {selected} FROM {quote(table_name)} t
+            JOIN {NEAR_DUPLICATE_KEYS_TABLE} k ON k.table_oid = :oid AND k.lei = t.lei
+            WHERE k.block = ANY(:blocks)
+            ORDER BY t.lei
+        """), conn, params=dict(params, blocks=touched))
+    pairs = near_duplicate_pairs(df)
+    with conn.connection.cursor() as cur:
+        copy_into(cur, NEAR_DUPLICATES_TABLE, pairs[PAIR_COLUMNS + ["block"]].assign(table_oid=oid))
+
+
+def fetch_near_duplicates(table_name='test', countries=None, engine=None):
+    """
+    The near-duplicate pairs stored for `table_name` at the last quality view refresh,
+    optionally only those in the legal address `countries`.
+    """
+    where, params = "", {"table": quote(table_name)}
+    if countries:
+        where = " AND country = ANY(:countries)"
+        params["countries"] = list(countries)
+    with (engine or get_engine()).connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": NEAR_DUPLICATES_TABLE}).scalar() is None:
+            return pd.DataFrame(columns=PAIR_COLUMNS)
+        return pd.read_sql_query(text(f"""
+            SELECT {', '.join(PAIR_COLUMNS)} FROM {NEAR_DUPLICATES_TABLE}
+            WHERE table_oid = CAST(:table AS regclass)::oid{where}
+            ORDER BY similarity DESC, lei_a, lei_b
+        """), conn, params=params)
+
+
+@rule("NoNearDuplicate", inputs=NEAR_DUPLICATE_INPUTS, scope="global",
+      sql=lambda col: f"NOT EXISTS (SELECT 1 FROM {NEAR_DUPLICATES_TABLE} d WHERE d.table_oid = t.tableoid "
+                      f"AND {col('lei')} IN (d.lei_a, d.lei_b))",
+      sql_setup=sync_near_duplicates, partition=near_duplicate_blocks)
+def check_near_duplicates(inputs):
+    """Check that no record with another LEI looks like the same entity at the same address."""
+    pairs = near_duplicate_pairs(inputs)
+    flagged = pd.concat([pairs["lei_a"], pairs["lei_b"]]).unique()
+    return ~_column(inputs, "lei").astype("string").isin(flagged).to_numpy(dtype=bool)
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pyarrow as pa
+
+from utils.data_quality_checks import run_quality_checks
+from utils.rules import active_rules, evaluate_rules, prepare_inputs
+from utils.tracing import traced
+
+PARALLEL_WORKERS = int(os.environ.get("LEI_WORKERS", os.cpu_count() or 1))
+DEFAULT_SHARD_ROWS = 250000
+
+
+def _shardable(r):
+    return r.scope == "row" or r.shard_map is not None
+
+
+def share_table(df, columns, shard_rows=DEFAULT_SHARD_ROWS):
+    """
+    Write `columns` of `df` to a shared memory block as an Arrow IPC file with one record
+    batch per shard. Returns the block and the number of shards; the caller unlinks the block.
+    """
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    batches = table.to_batches(max_chunksize=shard_rows)
+
+    def write(sink):
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+    size = pa.MockOutputStream()
+    write(size)
+    block = shared_memory.SharedMemory(create=True, size=max(size.size(), 1))
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(block.buf))
+    write(sink)
+    sink.close()
+    return block, len(batches)
+
+
+def _evaluate_shard(block_name, shard, rule_names):
+    """Worker: evaluate the shardable rules over one record batch of the shared table."""
+    block = shared_memory.SharedMemory(name=block_name)
+    # The batch is read in place from the shared block, without a copy or unpickling
+    buffer = pa.py_buffer(block.buf)
+    frame = pa.ipc.open_file(buffer).get_batch(shard).to_pandas()
+    rules = [r for r in active_rules() if r.name in rule_names]
+    results = evaluate_rules(frame, [r for r in rules if r.scope == "row"])
+    global_rules = [r for r in rules if r.scope != "row"]
+    if global_rules:
+        inputs = prepare_inputs(frame, global_rules)
+        results.update({r.name: np.array(r.shard_map(inputs)) for r in global_rules})
+        del inputs
+    # Views of the block must be gone before it can be closed
+    del frame, buffer
+    block.close()
+    return results
+
+
+@traced()
+def run_parallel_checks(df, workers=PARALLEL_WORKERS, shard_rows=DEFAULT_SHARD_ROWS):
+    """
+    Same result as run_quality_checks, with the rules evaluated over shards of `shard_rows`
+    records in a pool of `workers` processes.
+
+    The input columns of the rules are handed to the workers through shared memory as Arrow
+    record batches. Global rules are reduced across shards with their `shard_reduce`; the
+    ones without a shard form run over the whole frame in this process.
+    """
+    if workers <= 1 or len(df) <= shard_rows:
+        return run_quality_checks(df)
+
+    rules = active_rules()
+    shardable = [r for r in rules if _shardable(r)]
+    columns = [col for col in dict.fromkeys(col for r in shardable for col in r.inputs)
+               if col in df.columns]
+    try:
+        block, n_shards = share_table(df, columns, shard_rows)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns (e.g. from a loosely typed CSV) have no Arrow form
+        return run_quality_checks(df)
+    try:
+        names = [r.name for r in shardable]
+        with ProcessPoolExecutor(max_workers=min(workers, n_shards)) as pool:
+            shards = list(pool.map(_evaluate_shard, [block.name] * n_shards, range(n_shards),
+                                   [names] * n_shards))
+    finally:
+        block.close()
+        block.unlink()
+
+    results = {}
+    for r in shardable:
+        partials = [shard[r.name] for shard in shards]
+        if r.scope == "row":
+            results[r.name] = np.concatenate(partials)
+        else:
+            results[r.name] = r.shard_reduce(partials, df)
+    results.update(evaluate_rules(df, [r for r in rules if not _shardable(r)]))
+
+    for r in rules:
+        df[r.name] = results[r.name]
+    return df
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pycountry
+
+from utils.rules import active_rules
+from utils.scoring import LABELS
+from utils.tracing import traced
+
+ISO2_TO_ISO3 = {country.alpha_2: country.alpha_3 for country in pycountry.countries}
+
+# Cube dimension -> flattened column it is read from
+ROLLUP_DIMENSIONS = {
+    "country": "entity.legalAddress.country",
+    "jurisdiction": "entity.jurisdiction",
+    "status": "registration.status",
+    "managing_lou": "registration.managingLou",
+}
+MEASURES = ["records", "score_sum"]
+
+
+def cube_dimensions():
+    """Dimensions of the cube: the code columns, every rule outcome, score and label."""
+    return list(ROLLUP_DIMENSIONS) + [r.name for r in active_rules()] + ["QualityScore", "QualityLabel"]
+
+
+def _group(frame):
+    dimensions = [col for col in frame.columns if col not in MEASURES]
+    cube = frame.groupby(dimensions, dropna=False, observed=True, sort=False)[MEASURES].sum()
+    return cube.reset_index()
+
+
+@traced()
+def build_rollup(df):
+    """
+    Record counts and score sums of a scored frame for every combination of the cube
+    dimensions that occurs. Every chart and metric aggregates this instead of the records.
+    """
+    frame = {}
+    for name, col in ROLLUP_DIMENSIONS.items():
+        frame[name] = df[col].astype("string") if col in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+    for r in active_rules():
+        frame[r.name] = df[r.name].astype(bool)
+    frame["QualityScore"] = df["QualityScore"].astype(np.int64)
+    frame["QualityLabel"] = df["QualityLabel"].astype("string")
+    frame["records"] = np.ones(len(df), dtype=np.int64)
+    frame["score_sum"] = frame["QualityScore"]
+    return _group(pd.DataFrame(frame, index=df.index))
+
+
+def update_rollup(cube, added=None):
+    """
+    The cube with the scored records `added`, without aggregating the records it already
+    holds again, so a cube can be built a chunk at a time.
+    """
+    if added is None or not len(added):
+        return cube
+    return _group(pd.concat([cube, build_rollup(added)], ignore_index=True))
+
+
+def rollup(cube, by=None, **where):
+    """
+    Record count, score sum and average score per value of the dimensions `by` (all records
+    if None), over the cells matching `where` (dimension=list of values).
+    """
+    for dimension, values in where.items():
+        if values:
+            cube = cube[cube[dimension].isin(list(values))]
+    if by:
+        result = cube.groupby(list(by), dropna=False, observed=True)[MEASURES].sum().reset_index()
+    else:
+        result = cube[MEASURES].sum().to_frame().T
+    result["avg_score"] = result["score_sum"] / result["records"].where(result["records"] > 0)
+    return result
+
+
+def score_distribution(cube):
+    """Number of records per QualityScore, by increasing score."""
+    counts = cube.groupby("QualityScore")["records"].sum()
+    return counts[counts > 0].sort_index()
+
+
+def score_summary(cube):
+    """Record count, average, median, min and max score and the count per label."""
+    counts = score_distribution(cube)
+    total = int(counts.sum())
+    summary = {"records": total, "avg_score": float("nan"), "median_score": float("nan"),
+               "min_score": None, "max_score": None}
+    if total:
+        scores = counts.index.to_numpy()
+        ends = np.cumsum(counts.to_numpy())
+        # Middle record(s) of the sorted scores, averaged like Series.median
+        middle = np.searchsorted(ends, [(total - 1) // 2, total // 2], side="right")
+        summary.update(avg_score=float((scores * counts.to_numpy()).sum() / total),
+                       median_score=float(scores[middle].mean()),
+                       min_score=int(scores[0]), max_score=int(scores[-1]))
+    labels = cube.groupby("QualityLabel")["records"].sum()
+    for label in LABELS:
+        summary[label] = int(labels.get(label, 0))
+    return summary
+
+
+def country_rollup(cube):
+    """Records and average score per legal address country, with ISO 3166 alpha-3 codes."""
+    countries = rollup(cube, by=["country"]).dropna(subset=["country"])
+    countries["iso3"] = countries["country"].map(ISO2_TO_ISO3)
+    return countries
@@ -0,0 +1,141 @@
+import hashlib
+import importlib
+import inspect
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from utils.schema import classify_path
+from utils.tracing import span
+
+RULES_CONFIG_PATH = os.environ.get(
+    "LEI_RULES_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "quality_rules.json"),
+)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    A quality check: the flattened columns it reads and a vectorized implementation that maps
+    those columns to one boolean per record.
+
+    `sql` optionally renders the same rule for the in-database engine, given a function that
+    returns the SQL expression of a column. `scope="global"` marks rules whose outcome for a
+    record depends on other records, `volatile` rules whose outcome changes with time.
+
+    Global rules can be split for sharded execution: `shard_map` turns the inputs of one shard
+    into a partial result, and `shard_reduce(partials, df)` combines the partials of all
+    shards, in order, into the outcome for the whole frame.
+
+    `sql_setup(conn, table_name)` fills the tables a `sql` form reads, before the quality view
+    of `table_name` is created or refreshed.
+
+    `partition(df)` optionally gives a global rule one key per record, such that a record's
+    outcome only depends on the records with the same key. Incremental runs then re-evaluate
+    only the partitions that changed.
+
+    Rules read their columns converted by `prepare_column` (dates parsed, codes categorical),
+    unless `raw` is set: then they read the columns as given, e.g. to tell a missing date from
+    one that does not parse.
+    """
+    name: str
+    inputs: tuple
+    func: object
+    sql: object = None
+    scope: str = "row"
+    volatile: bool = False
+    shard_map: object = None
+    shard_reduce: object = None
+    sql_setup: object = None
+    partition: object = None
+    raw: bool = False
+
+
+RULES = {}
+
+
+def rule(name, inputs, sql=None, scope="row", volatile=False, shard_map=None, shard_reduce=None,
+         sql_setup=None, partition=None, raw=False):
+    """Register the decorated function as the implementation of rule `name`."""
+    def register(func):
+        RULES[name] = Rule(name, tuple(inputs), func, sql, scope, volatile, shard_map, shard_reduce,
+                           sql_setup, partition, raw)
+        return func
+    return register
+
+
+def load_rule_config(path=RULES_CONFIG_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+RULE_CONFIG = load_rule_config()
+
+
+def active_rules():
+    """Rules registered by the modules listed in the rule config, in registration order."""
+    for module in RULE_CONFIG.get("modules", []):
+        importlib.import_module(module)
+    return list(RULES.values())
+
+
+def rules_fingerprint():
+    """Digest of the rule config and the source of the rule and scoring code, for cache keys."""
+    digest = hashlib.sha1(json.dumps(RULE_CONFIG, sort_keys=True).encode())
+    for module in [__name__, "utils.scoring"] + RULE_CONFIG.get("modules", []):
+        digest.update(inspect.getsource(importlib.import_module(module)).encode())
+    return digest.hexdigest()
+
+
+def result_columns():
+    """Columns added by run_quality_checks and calculate_quality_score."""
+    return [r.name for r in active_rules()] + ["QualityScore", "QualityLabel"]
+
+
+def prepare_column(series, kind):
+    """Convert a column once into the form every rule reading it expects."""
+    if kind == "timestamp":
+        return pd.to_datetime(series, utc=True, errors="coerce")
+    if kind == "code" and not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype("category")
+    return series
+
+
+def prepare_inputs(df, rules, raw=False):
+    """
+    Prepared version of every column the rules read, each converted exactly once, or the
+    columns as given with `raw`. Missing columns are all null.
+    """
+    inputs = {}
+    for col in dict.fromkeys(col for r in rules for col in r.inputs):
+        series = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        inputs[col] = series if raw else prepare_column(series, classify_path(col))
+    return inputs
+
+
+def evaluate_rules(df, rules=None):
+    """Run the rules over `df` in one pass over their input columns. Returns {name: bool array}."""
+    rules = active_rules() if rules is None else rules
+    with span("prepare_inputs", rows=len(df)):
+        inputs = {False: prepare_inputs(df, [r for r in rules if not r.raw]),
+                  True: prepare_inputs(df, [r for r in rules if r.raw], raw=True)}
+    outcomes = {}
+    for r in rules:
+        with span(f"rule.{r.name}", rows=len(df)):
+            outcomes[r.name] = np.asarray(r.func(inputs[r.raw]), dtype=bool)
+    return outcomes
+
+
+def isin_codes(series, values):
+    """Membership test that looks at each distinct value once, through categorical codes."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    valid = series.cat.categories.isin(list(values))
+    codes = series.cat.codes.to_numpy()
+    if not len(valid):
+        return np.zeros(len(codes), dtype=bool)
+    return (codes >= 0) & valid[codes]
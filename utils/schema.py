@@ -0,0 +1,142 @@
+import re
+
+import pandas as pd
+
+from utils.db import quote
+
+SCHEMA_REGISTRY_TABLE = "lei_schema_registry"
+
+# Leaf names holding short codes from a closed list (ISO codes, GLEIF enumerations)
+CODE_FIELDS = {
+    "country", "region", "jurisdiction", "status", "category", "subCategory", "language",
+    "fieldType", "managingLou", "corroborationLevel",
+}
+# Codes whose leaf alone (`id`, `reason`) is too generic to tell: the RA and ELF ids, expiry reasons
+CODE_PATHS = {"entity.legalForm.id", "entity.registeredAt.id", "entity.expiration.reason"}
+
+SQL_TYPES = {
+    "timestamp": "TIMESTAMPTZ",
+    "code": "TEXT",
+    "text": "TEXT",
+    "list_position": "TEXT",
+}
+
+# Text is held in Arrow string arrays rather than Python objects
+PANDAS_DTYPES = {
+    "timestamp": "datetime64[ns, UTC]",
+    "code": "category",
+    "text": "string[pyarrow]",
+    "list_position": "string[pyarrow]",
+}
+
+_LIST_POSITION = re.compile(r"\.\d+(\.|$)")
+
+
+def classify_path(path):
+    """Type of a flattened key: `timestamp`, `code`, `list_position` or `text`."""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith("Date") or leaf == "date":
+        return "timestamp"
+    if leaf in CODE_FIELDS or path in CODE_PATHS:
+        return "code"
+    if _LIST_POSITION.search(path):
+        return "list_position"
+    return "text"
+
+
+def infer_schema(columns):
+    return {col: classify_path(col) for col in columns}
+
+
+def _ensure_registry(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_REGISTRY_TABLE} (
+            table_name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            sql_type TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            added_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, path)
+        )
+    """)
+
+
+def _table_columns(cur, table_name):
+    cur.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+        (table_name,),
+    )
+    return dict(cur.fetchall())
+
+
+def migrate(cur, table_name, columns):
+    """
+    Bring `table_name` and its registry entries up to date with the flattened `columns`,
+    inside the caller's transaction.
+
+    Paths seen for the first time are classified and registered under a new schema version,
+    and added to the table with their SQL type. Columns of older all-TEXT tables that the
+    registry types as timestamps are converted in place. Returns the table's {path: kind}.
+    """
+    _ensure_registry(cur)
+    # Serialize concurrent migrations of the same registry
+    cur.execute(f"LOCK TABLE {SCHEMA_REGISTRY_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute(f"SELECT path, kind, version FROM {SCHEMA_REGISTRY_TABLE} WHERE table_name = %s",
+                (table_name,))
+    rows = cur.fetchall()
+    schema = {path: kind for path, kind, _ in rows}
+    version = max((row[2] for row in rows), default=0) + 1
+
+    existing = _table_columns(cur, table_name)
+    wanted = list(dict.fromkeys(list(existing) + list(columns)))
+    new_paths = [col for col in wanted if col not in schema]
+    for path in new_paths:
+        schema[path] = classify_path(path)
+
+    if not existing:
+        definitions = ", ".join(f"{quote(col)} {SQL_TYPES[schema[col]]}" for col in wanted)
+        cur.execute(f"CREATE TABLE {quote(table_name)} ({definitions})")
+    else:
+        for col in wanted:
+            sql_type = SQL_TYPES[schema[col]]
+            if col not in existing:
+                cur.execute(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(col)} {sql_type}")
+            elif sql_type == "TIMESTAMPTZ" and existing[col] == "text":
+                cur.execute(f"ALTER TABLE {quote(table_name)} ALTER COLUMN {quote(col)} TYPE TIMESTAMPTZ "
+                            f"USING NULLIF({quote(col)}, '')::TIMESTAMPTZ")
+
+    for path in new_paths:
+        cur.execute(
+            f"INSERT INTO {SCHEMA_REGISTRY_TABLE} (table_name, path, kind, sql_type, version) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            (table_name, path, schema[path], SQL_TYPES[schema[path]], version),
+        )
+    return schema
+
+
+def read_schema(conn, table_name):
+    """{path: kind} registered for `table_name`, empty if the table predates the registry."""
+    exists = conn.exec_driver_sql("SELECT to_regclass(%s)", (SCHEMA_REGISTRY_TABLE,)).scalar()
+    if exists is None:
+        return {}
+    rows = conn.exec_driver_sql(
+        f"SELECT path, kind FROM {SCHEMA_REGISTRY_TABLE} WHERE table_name = %s", (table_name,)
+    )
+    return dict(rows.fetchall())
+
+
+def apply_schema_dtypes(df, schema):
+    """Cast the columns of `df` to the pandas dtypes of their registered kinds."""
+    dtypes = {}
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind is None:
+            continue
+        dtype = PANDAS_DTYPES[kind]
+        if kind == "timestamp":
+            df[col] = pd.to_datetime(df[col], utc=True)
+        elif df[col].dtype != dtype:
+            dtypes[col] = dtype
+    return df.astype(dtypes) if dtypes else df
@@ -1,22 +1,24 @@
+import numpy as np
 import pandas as pd
+
+from utils.rules import RULE_CONFIG
+from utils.tracing import traced
+
+WEIGHTS = RULE_CONFIG["weights"]
+LABEL_BINS = RULE_CONFIG["labels"]["bins"]
+LABELS = RULE_CONFIG["labels"]["names"]
+
+@traced()
 def calculate_quality_score(df):
-    weights = {
-        "Completeness": 40,
-        "CountryValid": 15,
-        "DateConsistent": 15,
-        "UniqueLEI": 15,
-        "NotExpired": 15,
-    }
-    
-    score = pd.Series(0, index=df.index)
-    for check, weight in weights.items():
-        score += df[check].astype(int) * weight
+    score = np.zeros(len(df), dtype=np.int64)
+    for check, weight in WEIGHTS.items():
+        score += df[check].to_numpy(dtype=bool) * weight
     
     df["QualityScore"] = score
     df["QualityLabel"] = pd.cut(
         df["QualityScore"],
-        bins=[-1, 60, 80, 100],
-        labels=["Poor", "Moderate", "Good"]
+        bins=LABEL_BINS,
+        labels=LABELS
     )
     
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.cache import CACHE_DIR, evict_snapshots, read_arrow_file, write_arrow_file
+from utils.tracing import traced
+
+LEGAL_NAME = "entity.legalName.name"
+TRANSLITERATED_NAME = "entity.transliteratedOtherNames.1.name"
+
+# Kinds of index entries, which are stored sorted by kind and key
+LEI, NAME, TOKEN = 0, 1, 2
+_AFTER_PREFIX = "\U0010ffff"
+# Names split into words at anything but Unicode letters and digits, as RE2's \W is ASCII-only
+TOKEN_SEPARATORS = r"[^\p{L}\p{N}]+"
+
+
+def display_names(df, legal=LEGAL_NAME, transliterated=TRANSLITERATED_NAME):
+    """Preferred name of every record: the first transliterated name, else the legal name."""
+    names = df[legal] if legal in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if transliterated not in df.columns:
+        return names
+    return df[transliterated].fillna(names)
+
+
+def _normalize(series):
+    """Lower-cased, trimmed Arrow strings of `series`."""
+    values = pa.array(series.astype("string").to_numpy(dtype=object, na_value=None), pa.string())
+    return pc.utf8_trim_whitespace(pc.utf8_lower(values))
+
+
+def _tokens(names):
+    """Words of every name of the Arrow strings `names`, as a list array."""
+    return pc.split_pattern_regex(names, TOKEN_SEPARATORS)
+
+
+def _entries(kind, keys, rows):
+    """Index entries of `keys`, pointing at `rows`, without missing or empty keys."""
+    keep = pc.fill_null(pc.not_equal(keys, ""), False)
+    keys, rows = keys.filter(keep), rows.filter(keep)
+    return pa.table({"kind": pa.array(np.full(len(keys), kind, dtype=np.int8)), "key": keys, "row": rows})
+
+
+class LeiSearchIndex:
+    """
+    Typeahead search over the LEIs, legal names and first transliterated names of a frame.
+
+    Every LEI, full name and name token is an entry in one table sorted by (kind, key), so a
+    prefix match is a binary search for the range of keys starting with the query. Rows are
+    the frame's index labels. LEI lookups go through a hashed index.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        kinds = entries["kind"].to_numpy()
+        bounds = np.searchsorted(kinds, [LEI, NAME, TOKEN, TOKEN + 1])
+        keys = entries["key"].to_numpy(dtype=object)
+        rows = entries["row"].to_numpy()
+        self._keys = {kind: keys[bounds[kind]:bounds[kind + 1]] for kind in (LEI, NAME, TOKEN)}
+        self._rows = {kind: rows[bounds[kind]:bounds[kind + 1]] for kind in (LEI, NAME, TOKEN)}
+        # Duplicate LEIs resolve to their first row
+        first = ~pd.Index(self._keys[LEI]).duplicated()
+        self._lei_index = pd.Index(self._keys[LEI][first])
+        self._lei_rows = self._rows[LEI][first]
+
+    @classmethod
+    @traced("build_search_index")
+    def from_frame(cls, df):
+        """Build the index over a frame with the flattened `lei` and name columns."""
+        labels = pa.array(df.index.to_numpy(dtype=np.int64))
+        tables = [_entries(LEI, _normalize(df["lei"]), labels)]
+        for col in (LEGAL_NAME, TRANSLITERATED_NAME):
+            if col not in df.columns:
+                continue
+            names = _normalize(df[col])
+            words = _tokens(names)
+            tables.append(_entries(NAME, names, labels))
+            tables.append(_entries(TOKEN, pc.list_flatten(words), labels.take(pc.list_parent_indices(words))))
+
+        entries = pa.concat_tables(tables)
+        # Keys are ranked through their dictionary, so the sort itself only compares integers
+        encoded = entries["key"].combine_chunks().dictionary_encode()
+        rank = np.empty(len(encoded.dictionary), dtype=np.int64)
+        rank[pc.sort_indices(encoded.dictionary).to_numpy()] = np.arange(len(rank))
+        kind = entries["kind"].to_numpy()
+        key_rank = rank[encoded.indices.to_numpy(zero_copy_only=False)]
+        row = entries["row"].to_numpy()
+        order = np.lexsort((row, key_rank, kind))
+        # A name and its transliteration often share tokens; keep one entry per key and row
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (np.diff(kind[order]) != 0) | (np.diff(key_rank[order]) != 0) | (np.diff(row[order]) != 0)
+        return cls(entries.take(order[keep]).to_pandas())
+
+    def lookup(self, lei):
+        """Row of the record with LEI `lei`, or None."""
+        position = self._lei_index.get_indexer([str(lei).lower().strip()])[0]
+        return None if position < 0 else self._lei_rows[position]
+
+    def _prefix(self, kind, prefix):
+        keys = self._keys[kind]
+        start = np.searchsorted(keys, prefix, side="left")
+        stop = np.searchsorted(keys, prefix + _AFTER_PREFIX, side="left")
+        return self._rows[kind][start:stop]
+
+    def _candidates(self, query):
+        """Candidate rows for `query` in rank order, computed lazily."""
+        if not query:
+            yield self._rows[LEI]
+            return
+        exact = self.lookup(query)
+        if exact is not None:
+            yield [exact]
+        yield self._prefix(LEI, query)
+        yield self._prefix(NAME, query)
+        # Split like the indexed names, so every word of a name can be found
+        words = [word for word in _tokens(pa.array([query]))[0].as_py() if word]
+        if words:
+            postings = sorted((self._prefix(TOKEN, word) for word in words), key=len)
+            matched = np.unique(postings[0])
+            for posting in postings[1:]:
+                matched = np.intersect1d(matched, posting)
+            yield matched
+
+    def search(self, query, k=20, rows=None):
+        """
+        Rows of the top `k` matches for `query`, best first: the exact LEI, LEIs starting with
+        the query, names starting with it, then names with a word starting with each of the
+        query's words. `rows` restricts the matches to those index labels.
+        """
+        allowed = None
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            allowed = np.zeros(max(rows.max(initial=-1), self.entries["row"].max()) + 1, dtype=bool)
+            allowed[rows] = True
+
+        # Stops as soon as k rows are found, so broad queries never rank whole postings
+        found = {}
+        for candidate in self._candidates(str(query).lower().strip()):
+            for row in candidate:
+                if row in found or (allowed is not None and not allowed[row]):
+                    continue
+                found[row] = None
+                if len(found) == k:
+                    return np.array(list(found), dtype=np.int64)
+        return np.array(list(found), dtype=np.int64)
+
+    def save(self, path):
+        write_arrow_file(pa.Table.from_pandas(self.entries, preserve_index=False), path)
+
+    @classmethod
+    def load(cls, path):
+        table = read_arrow_file(path)
+        return None if table is None else cls(table.to_pandas())
+
+
+def search_index_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.search.arrow")
+
+
+def cached_search_index(key, df, cache_dir=CACHE_DIR):
+    """The search index kept next to snapshot `key`, built from `df` and stored on a miss."""
+    path = search_index_path(key, cache_dir)
+    index = LeiSearchIndex.load(path)
+    if index is None:
+        index = LeiSearchIndex.from_frame(df)
+        index.save(path)
+        evict_snapshots(cache_dir)
+    return index
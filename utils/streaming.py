@@ -0,0 +1,212 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.cache import CACHE_DIR, _snapshot_path, chunk_schema, evict_snapshots
+from utils.rollup import build_rollup, update_rollup
+from utils.rules import active_rules, evaluate_rules
+from utils.scoring import calculate_quality_score
+from utils.tracing import span, traced
+from utils.utils import dashboard_columns
+
+STREAM_CHUNK_ROWS = 100000
+# Uploads from this size are streamed by default; smaller ones keep every column in memory
+STREAM_MIN_BYTES = int(os.environ.get("LEI_STREAM_MIN_BYTES", 256 * 1024 ** 2))
+
+
+def read_csv_chunks(stream, columns=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    DataFrames of `chunk_rows` records of a flattened CSV, reading only `columns` (the
+    dashboard columns by default) as strings. Columns missing from the file are empty.
+    """
+    columns = dashboard_columns() if columns is None else list(columns)
+    wanted = set(columns)
+    reader = pd.read_csv(stream, usecols=lambda col: col in wanted, dtype=str, chunksize=chunk_rows)
+    for chunk in reader:
+        missing = {col: object for col in columns if col not in chunk.columns}
+        yield chunk.reindex(columns=columns).astype(missing)
+
+
+def read_csv_row(stream, row, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Every column of record `row` (counted from 0) of a flattened CSV `stream`, as a one-row
+    DataFrame of strings labelled `row`. The file is read chunk by chunk up to that record.
+    """
+    start = 0
+    for chunk in pd.read_csv(stream, dtype=str, chunksize=chunk_rows):
+        if row < start + len(chunk):
+            return chunk.iloc[[row - start]].set_axis([row])
+        start += len(chunk)
+    raise IndexError(f"Record {row} is past the end of the file ({start} records)")
+
+
+class _ArrowSpill:
+    """Record batches appended to an Arrow IPC file, written under a temporary name."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.sink = None
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        if self.writer is None:
+            self.schema = chunk_schema(df)
+            self.sink = pa.OSFile(self.tmp_path, "wb")
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+            self.writer = self.sink = None
+
+    def commit(self):
+        self.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _read_columns(path, columns):
+    """
+    The `columns` of the Arrow IPC file at `path`. The file is memory-mapped, so only the
+    pages of those columns are ever read.
+    """
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().select(list(columns))
+
+
+def _partitioned_outcome(r, path, rows, chunk_rows):
+    """
+    Outcome of global rule `r` with a partition over the records spilled to `path`, a group
+    of partitions at a time. The rule's inputs are split by partition into about as many
+    bucket files as there were chunks, each bucket holding whole partitions in record order,
+    so only a bucket's inputs are in memory at once.
+    """
+    n_buckets = max(-(-rows // chunk_rows), 1)
+    buckets = [_ArrowSpill(f"{path}.{r.name}.{i}") for i in range(n_buckets)]
+    outcome = np.zeros(rows, dtype=bool)
+    try:
+        # Read, not memory-mapped, so the pages of each batch are released once it is split
+        with pa.OSFile(path) as source:
+            reader = pa.ipc.open_file(source)
+            start = 0
+            for i in range(reader.num_record_batches):
+                inputs = reader.get_batch(i).select(list(r.inputs)).to_pandas(types_mapper=pd.ArrowDtype)
+                keys = pa.array(r.partition(inputs)).to_numpy(zero_copy_only=False)
+                bucket = pd.util.hash_array(keys, categorize=False) % np.uint64(n_buckets)
+                inputs["_row"] = np.arange(start, start + len(inputs))
+                start += len(inputs)
+                for b in np.unique(bucket):
+                    buckets[b].write(inputs[bucket == b])
+        for bucket in buckets:
+            bucket.close()
+            if bucket.schema is None:
+                continue
+            inputs = _read_columns(bucket.tmp_path, list(r.inputs) + ["_row"]).to_pandas(types_mapper=pd.ArrowDtype)
+            outcome[inputs["_row"].to_numpy(dtype=np.int64)] = evaluate_rules(inputs, [r])[r.name]
+            bucket.discard()
+    finally:
+        for bucket in buckets:
+            bucket.discard()
+    return outcome
+
+
+@traced("global_rules")
+def _global_outcomes(rules, partials, path, rows, chunk_rows):
+    """
+    Outcomes of the global rules over every record spilled to `path`, from the partial
+    results of each chunk. Only the inputs of each rule are read back, as Arrow columns.
+    """
+    outcomes = {}
+    for r in rules:
+        if r.shard_reduce is None and r.partition is not None:
+            outcomes[r.name] = _partitioned_outcome(r, path, rows, chunk_rows)
+            continue
+        inputs = _read_columns(path, r.inputs).to_pandas(types_mapper=pd.ArrowDtype)
+        if r.shard_reduce is not None:
+            outcomes[r.name] = np.asarray(r.shard_reduce(partials[r.name], inputs), dtype=bool)
+        else:
+            # No map/reduce split nor partition: the rule reads its inputs for all records at once
+            outcomes[r.name] = evaluate_rules(inputs, [r])[r.name]
+    return outcomes
+
+
+@traced()
+def stream_csv_snapshot(stream, key, chunk_rows=STREAM_CHUNK_ROWS, progress=None, cache_dir=CACHE_DIR):
+    """
+    Score a flattened CSV `stream` chunk by chunk into the snapshot stored under `key`, so
+    memory is bounded by a chunk rather than the file. Returns the rollup cube of the records.
+
+    The first pass reads each chunk, runs the row rules and appends it to a spill file; global
+    rules only keep their per-chunk partial results (8 bytes per record for uniqueness). Once
+    every record has been seen, the second pass adds the global outcomes, scores each chunk,
+    writes it to the snapshot and adds it to the cube. `progress(fraction)` is called after
+    every chunk.
+    """
+    rules = active_rules()
+    row_rules = [r for r in rules if r.scope != "global"]
+    global_rules = [r for r in rules if r.scope == "global"]
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    spill = _ArrowSpill(os.path.join(cache_dir, f"{key}.spill.arrow"))
+    snapshot = _ArrowSpill(_snapshot_path(key, cache_dir))
+    try:
+        partials = {r.name: [] for r in global_rules if r.shard_map is not None}
+
+        def check(chunk):
+            for name, passed in evaluate_rules(chunk, row_rules).items():
+                chunk[name] = passed
+            for r in global_rules:
+                if r.shard_map is not None:
+                    partials[r.name].append(r.shard_map(chunk))
+            spill.write(chunk)
+
+        with span("check_chunks") as checked:
+            rows = 0
+            for chunk in read_csv_chunks(stream, chunk_rows=chunk_rows):
+                check(chunk)
+                rows += len(chunk)
+                if progress:
+                    progress(0.5 * stream.tell() / max(size, 1))
+            if spill.writer is None:
+                check(pd.DataFrame({col: pd.Series(dtype=object) for col in dashboard_columns()}))
+            spill.close()
+            checked.set(rows=rows)
+
+        outcomes = _global_outcomes(global_rules, partials, spill.tmp_path, rows, chunk_rows)
+        cube = None
+        # Read, not memory-mapped, so each batch is released once it is scored
+        with pa.OSFile(spill.tmp_path) as source, span("score_chunks") as scored:
+            reader = pa.ipc.open_file(source)
+            n_batches = reader.num_record_batches
+            start = 0
+            # An empty spill file has no batches, but still gives an empty snapshot
+            for i in range(max(n_batches, 1)):
+                chunk = (reader.get_batch(i) if n_batches else reader.schema.empty_table()).to_pandas()
+                for name, passed in outcomes.items():
+                    chunk[name] = passed[start:start + len(chunk)]
+                start += len(chunk)
+                chunk = calculate_quality_score(chunk[dashboard_columns() + [r.name for r in rules]])
+                snapshot.write(chunk)
+                cube = build_rollup(chunk) if cube is None else update_rollup(cube, added=chunk)
+                if progress:
+                    progress(0.5 + 0.5 * (i + 1) / max(n_batches, 1))
+            scored.set(rows=start)
+        snapshot.commit()
+    finally:
+        spill.discard()
+        snapshot.discard()
+    evict_snapshots(cache_dir)
+    return cube
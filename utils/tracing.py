@@ -0,0 +1,207 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+import uuid
+
+import pandas as pd
+
+# Tracing is on unless LEI_TRACING=0; when off, spans and traced functions do nothing
+TRACING_ENABLED = os.environ.get("LEI_TRACING", "1") != "0"
+
+logger = logging.getLogger("lei.trace")
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024 ** 2 if hasattr(os, "sysconf") else None
+
+# (trace id, spans of the active recording or None, parent span id)
+_context = contextvars.ContextVar("lei_trace", default=(None, None, None))
+
+
+def set_tracing(enabled):
+    global TRACING_ENABLED
+    TRACING_ENABLED = bool(enabled)
+
+
+def tracing_enabled():
+    return TRACING_ENABLED
+
+
+def _rss_mb():
+    """Resident set size of the process in MB, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        return None
+
+
+def _rows(*values):
+    """Length of the first frame or array among `values`, if any."""
+    for value in values:
+        shape = getattr(value, "shape", None)
+        if shape:
+            return shape[0]
+    return None
+
+
+class Span:
+    """
+    One timed stage, OpenTelemetry style: trace and span ids, the parent span, start time,
+    duration, rows processed, RSS delta and free-form attributes.
+    """
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration_ms",
+                 "rows", "rss_delta_mb", "attributes", "_clock", "_rss", "_token")
+
+    def __init__(self, name, rows=None, attributes=None):
+        self.name = name
+        self.rows = rows
+        self.attributes = attributes or {}
+        self.duration_ms = self.rss_delta_mb = None
+
+    def set(self, rows=None, **attributes):
+        """Record the rows processed and other attributes once they are known."""
+        if rows is not None:
+            self.rows = rows
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        trace_id, spans, parent_id = _context.get()
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self._token = _context.set((self.trace_id, spans, self.span_id))
+        self.start = time.time()
+        self._rss = _rss_mb()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._clock) * 1000
+        rss = _rss_mb()
+        if rss is not None and self._rss is not None:
+            self.rss_delta_mb = rss - self._rss
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _context.reset(self._token)
+        _, spans, _ = _context.get()
+        if spans is not None:
+            spans.append(self)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(self.to_dict(), default=str))
+        return False
+
+    def to_dict(self):
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start": self.start, "duration_ms": self.duration_ms,
+                "rows": self.rows, "rss_delta_mb": self.rss_delta_mb, "attributes": self.attributes}
+
+
+class _NoSpan:
+    """Stand-in for Span while tracing is disabled."""
+
+    def set(self, rows=None, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, rows=None, **attributes):
+    """Context manager timing the enclosed block as the stage `name`."""
+    if not TRACING_ENABLED:
+        return _NO_SPAN
+    return Span(name, rows, attributes)
+
+
+def traced(name=None):
+    """
+    Decorator running the function inside a span named `name` (the function's name by
+    default). Rows are the length of the first frame argument, or else of the result.
+    """
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return func(*args, **kwargs)
+            with Span(span_name) as current:
+                result = func(*args, **kwargs)
+                current.rows = _rows(*args, result)
+            return result
+        return wrapper
+    return decorate
+
+
+class Recording:
+    """The spans finished while the recording is active, e.g. one run of the dashboard."""
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.root = None
+
+    def start(self):
+        self._token = _context.set((None, self.spans, None))
+        self.root = Span(self.name).__enter__() if TRACING_ENABLED else None
+        return self
+
+    def stop(self, *exc):
+        if self.root is not None:
+            self.root.__exit__(*(exc or (None, None, None)))
+            self.root = None
+        _context.reset(self._token)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop(*exc)
+        return False
+
+    def breakdown(self):
+        """
+        One row per stage, nested under the stage that called it and indented by depth:
+        calls, total time, rows and RSS delta. Stages called repeatedly from the same place,
+        such as per-chunk work, are summed.
+        """
+        if not self.spans:
+            return pd.DataFrame(columns=["stage", "calls", "time_ms", "rows", "rss_delta_mb"])
+        by_id = {s.span_id: s for s in self.spans}
+
+        def path(s):
+            names = [s.name]
+            while s.parent_id in by_id:
+                s = by_id[s.parent_id]
+                names.append(s.name)
+            return tuple(reversed(names))
+
+        frame = pd.DataFrame({
+            "path": [path(s) for s in self.spans],
+            "start": [s.start for s in self.spans],
+            "time_ms": [s.duration_ms for s in self.spans],
+            "rows": [s.rows for s in self.spans],
+            "rss_delta_mb": [s.rss_delta_mb for s in self.spans],
+        })
+        grouped = frame.groupby("path", sort=False).agg(
+            start=("start", "min"), calls=("start", "size"), time_ms=("time_ms", "sum"),
+            rows=("rows", lambda rows: rows.sum(min_count=1)),
+            rss_delta_mb=("rss_delta_mb", lambda delta: delta.sum(min_count=1)))
+        # Depth-first: each stage follows its parent, siblings in the order they first started
+        first = grouped["start"].to_dict()
+        order = sorted(grouped.index, key=lambda p: [first.get(p[:i + 1], 0) for i in range(len(p))])
+        grouped = grouped.reindex(order)
+        grouped.insert(0, "stage", ["· " * (len(p) - 1) + p[-1] for p in grouped.index])
+        return grouped.drop(columns="start").reset_index(drop=True)
+
+
+def recording(name="run"):
+    return Recording(name)
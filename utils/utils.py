@@ -1,66 +1,116 @@
-import os
 import re
-import pycountry
 import pandas as pd
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import inspect, text
 
-load_dotenv()
+from utils.db import get_engine, quote
+from utils.rules import active_rules, result_columns
+from utils.schema import apply_schema_dtypes, read_schema
+from utils.tracing import traced
 
-def fetch_data_from_db(table_name='test'):
+DEFAULT_CHUNKSIZE = 50000
+
+# Columns the dashboard shows or filters on, besides the inputs of the quality rules
+DISPLAY_COLUMNS = [
+    "lei",
+    "entity.legalName.name",
+    "entity.transliteratedOtherNames.1.name",
+    "entity.legalAddress.country",
+    "entity.jurisdiction",
+    "registration.status",
+    "registration.managingLou",
+]
+
+def dashboard_columns():
+    """Columns the dashboard needs: the display columns and everything the active rules read."""
+    return list(dict.fromkeys(DISPLAY_COLUMNS + [col for r in active_rules() for col in r.inputs]))
+
+def _build_query(table_name, columns, countries=None, statuses=None):
+    select = ", ".join(quote(col) for col in columns) if columns else "*"
+    conditions, params = [], {}
+    if countries:
+        conditions.append(f'{quote("entity.legalAddress.country")} = ANY(:countries)')
+        params["countries"] = list(countries)
+    if statuses:
+        conditions.append(f'{quote("registration.status")} = ANY(:statuses)')
+        params["statuses"] = list(statuses)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return text(f"SELECT {select} FROM {quote(table_name)}{where}"), params
+
+def iter_data_from_db(table_name='test', columns=None, countries=None, statuses=None,
+                      chunksize=DEFAULT_CHUNKSIZE):
     """
-    Returns: pandas DataFrame
+    Stream `table_name` through a server-side cursor as DataFrames of `chunksize` rows,
+    typed from the schema registry. `columns` limits the projection; requested columns the
+    table does not have are returned empty. `countries` and `statuses` filter on the legal
+    address country and the registration status.
     """
-    username = os.environ.get('POSTGRES_USERNAME')
-    username = 'postgres'
-    password = os.environ.get('POSTGRES_PASSWORD')
-    host = os.environ.get('POSTGRES_HOST')
-    port = os.environ.get('POSTGRES_PORT')
-    database = os.environ.get('POSTGRES_DB')
+    engine = get_engine()
+    with engine.connect() as conn:
+        schema = read_schema(conn, table_name)
+        available = [col["name"] for col in inspect(conn).get_columns(table_name)]
+        selected = [col for col in columns if col in available] if columns else available
+        query, params = _build_query(table_name, selected, countries, statuses)
 
-    query = f"SELECT * FROM {table_name}"
-    engine = create_engine(f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{database}")
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunksize):
+            if columns:
+                chunk = chunk.reindex(columns=list(columns))
+            # Tables loaded before the schema registry existed still store dates as text
+            yield apply_schema_dtypes(chunk, schema) if schema else check_for_timestamp(chunk)
 
-    with engine.connect() as conn:        
-        rows = conn.execute(text(query))
-        rows = rows.fetchall()
-        df = pd.DataFrame(rows)
-    
-    return df
+def _concat_chunks(chunks):
+    """Concatenate typed chunks, keeping categoricals whose categories differ between chunks."""
+    if len(chunks) == 1:
+        return chunks[0]
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([chunk[col] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
 
-def format_dataframe(df):
+@traced()
+def fetch_data_from_db(table_name='test', columns=None, countries=None, statuses=None,
+                       chunksize=DEFAULT_CHUNKSIZE):
     """
-    Format column names for visuality.
+    Returns: pandas DataFrame, typed from the schema registry and read in chunks through a
+    server-side cursor on the shared engine. See `iter_data_from_db` for the options.
     """
-    columns = []
+    chunks = list(iter_data_from_db(table_name, columns, countries, statuses, chunksize))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return _concat_chunks(chunks)
 
-    for col in df.columns[:-7]:
-        col = col.replace("entity.", "")  # remove redundant prefix
-        col = re.sub(r'\.addressLines\.(\d+)', r' → Address Line \1', col)
-        col = col.replace(".", " → ")  # convert dots to arrows
-        col = re.sub(r'([a-z])([A-Z])', r'\1 \2', col)  # split camelCase
-        col = col.replace("→ ", "→ ")  # clean spacing
-        col = col.title()
-        col = col.replace("Lei", "LEI")  # remove redundant prefix
-        columns.append(col)
+@traced()
+def fetch_record(lei, table_name='test'):
+    """All non-null fields of one LEI record, read through the unique index on `lei`."""
+    with get_engine().connect() as conn:
+        record = pd.read_sql_query(text(f"SELECT * FROM {quote(table_name)} WHERE lei = :lei"),
+                                   conn, params={"lei": lei})
+    return record.dropna(axis=1, how='all')
 
-    columns.extend(df.columns[-7:])
-    df.columns=columns
-    return df
+def format_column(col):
+    """
+    Readable name for a flattened column, e.g. `entity.legalAddress.country` -> `Legal Address → Country`.
+    """
+    col = col.replace("entity.", "")  # remove redundant prefix
+    col = re.sub(r'\.addressLines\.(\d+)', r' → Address Line \1', col)
+    col = col.replace(".", " → ")  # convert dots to arrows
+    col = re.sub(r'([a-z])([A-Z])', r'\1 \2', col)  # split camelCase
+    col = col.replace("→ ", "→ ")  # clean spacing
+    col = col.title()
+    col = col.replace("Lei", "LEI")  # remove redundant prefix
+    return col
 
-def get_display_name(row):
-    """Extract preferred name (fallback if null)"""
-    name = 'Legal Name → Name'
-    en_name = 'Transliterated Other Names → 1 → Name'
-    return row[en_name] if pd.notna(row[en_name]) else row[name]
+@traced()
+def format_dataframe(df):
+    """
+    Format column names for visuality. Check and score columns keep their names.
+    """
+    keep = set(result_columns())
+    df.columns = [col if col in keep else format_column(col) for col in df.columns]
+    return df
 
-def iso2_to_iso3(code):
-    """ Convert ISO-2 to ISO-3 """
-    try:
-        return pycountry.countries.get(alpha_2=code).alpha_3
-    except:
-        return None
-    
 def check_for_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     """
     Dynamically convert timestamps which are in TEXT format to actual timestamps by trial and error method.